@@ -2,37 +2,50 @@ from __future__ import annotations
 
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
 from fastapi.responses import Response
 from starlette import status
 
+from app.core.cancellation import (
+    ClientDisconnectedError,
+    DeadlineExceededError,
+    run_cancellable,
+)
+from app.core.config import settings
 from app.core.deps import get_image_pipeline
 from app.services.image_processing import (
     ImagePipeline,
     MaterialNotFoundError,
     ResampleAlgorithm,
 )
-from app.services.pack_ico import pack_ico
 
 router = APIRouter(prefix="/forge", tags=["forge"])
 
 
 @router.post("", response_class=Response)
 async def forge_icon(
+    request: Request,
     source_id: Annotated[str, Form(..., description="Material identifier")],
     mid_algo: Annotated[
         ResampleAlgorithm, Form(..., description="Resample algorithm for 48/32 previews")
     ],
-    tiny_icon: Annotated[UploadFile, File(..., description="16x16 PNG icon")],
     pipeline: Annotated[ImagePipeline, Depends(get_image_pipeline)],
+    tiny_icon: Annotated[
+        UploadFile | None,
+        File(description="16x16 PNG icon; optional for materials imported from an .ico"),
+    ] = None,
 ) -> Response:
-    tiny_bytes = await tiny_icon.read()
+    tiny_bytes = await tiny_icon.read() if tiny_icon is not None else None
 
     try:
-        base_bytes = await pipeline.get_material_bytes(source_id)
-        preview_48 = await pipeline.get_preview_bytes(source_id, mid_algo, 48)
-        preview_32 = await pipeline.get_preview_bytes(source_id, mid_algo, 32)
-        ico_bytes = pack_ico({256: base_bytes, 48: preview_48, 32: preview_32, 16: tiny_bytes})
+        ico_bytes = await run_cancellable(
+            request,
+            pipeline.forge_icon(source_id, mid_algo, tiny_bytes),
+            settings.forge_deadline_seconds,
+            settings.disconnect_poll_interval_seconds,
+        )
+    except (DeadlineExceededError, ClientDisconnectedError):
+        raise
     except MaterialNotFoundError as exc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
     except ValueError as exc:
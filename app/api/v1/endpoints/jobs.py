@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from typing import Annotated, AsyncIterator
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette import status
+
+from app.api.v1.endpoints.materials import build_job_response, build_material_response
+from app.core.config import settings
+from app.core.deps import get_image_pipeline, get_job_manager
+from app.models.responses import MaterialResponse, UploadJobResponse
+from app.services.image_processing import ImagePipeline, MaterialNotFoundError
+from app.services.jobs import JobManager, JobStatus, UploadJob
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+async def _job_response(pipeline: ImagePipeline, job: UploadJob) -> UploadJobResponse:
+    material: MaterialResponse | None = None
+    if job.status is JobStatus.SUCCEEDED and job.material_id:
+        try:
+            record = await pipeline.get_material(job.material_id)
+            material = await build_material_response(pipeline, record)
+        except MaterialNotFoundError:
+            material = None
+    return build_job_response(job, material)
+
+
+def _load_job(jobs: JobManager, pipeline: ImagePipeline, job_id: str) -> UploadJob:
+    job = jobs.get(pipeline, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown job {job_id}")
+    return job
+
+
+@router.get("/{job_id}", response_model=UploadJobResponse)
+async def get_job(
+    job_id: str,
+    pipeline: Annotated[ImagePipeline, Depends(get_image_pipeline)],
+    jobs: Annotated[JobManager, Depends(get_job_manager)],
+) -> UploadJobResponse:
+    return await _job_response(pipeline, _load_job(jobs, pipeline, job_id))
+
+
+@router.get("/{job_id}/events", response_class=StreamingResponse)
+async def stream_job_events(
+    job_id: str,
+    pipeline: Annotated[ImagePipeline, Depends(get_image_pipeline)],
+    jobs: Annotated[JobManager, Depends(get_job_manager)],
+) -> StreamingResponse:
+    """Stream job progress as Server-Sent Events until the job finishes."""
+
+    first = _load_job(jobs, pipeline, job_id)
+
+    async def events() -> AsyncIterator[str]:
+        job: UploadJob | None = first
+        last_seen: tuple[str, str | None, str | None] | None = None
+        while job is not None:
+            snapshot = (job.status.value, job.stage, job.material_id)
+            if snapshot != last_seen:
+                last_seen = snapshot
+                payload = (await _job_response(pipeline, job)).model_dump_json()
+                yield f"event: {job.status.value}\ndata: {payload}\n\n"
+            if job.status.finished:
+                return
+            await jobs.wait_for_update(job_id, settings.job_poll_interval_seconds)
+            job = jobs.get(pipeline, job_id)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,64 +1,165 @@
 from __future__ import annotations
 
-from typing import Annotated
+import asyncio
+import json
+import time
+from logging import getLogger
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import JSONResponse
 from starlette import status
 
-from app.core.deps import get_image_pipeline
-from app.models.responses import MaterialResponse, PreviewResponse
+from app.core.cancellation import (
+    ClientDisconnectedError,
+    DeadlineExceededError,
+    run_cancellable,
+)
+from app.core.config import settings
+from app.core.deps import get_image_pipeline, get_job_manager
+from app.core.fastjson import RawJSONResponse, json_object, json_string
+from app.models.responses import MaterialResponse, PreviewResponse, UploadJobResponse
+from app.services.executor import Lane, OverloadedError, get_scheduler
 from app.services.image_processing import (
     ImagePipeline,
+    MaterialNotFoundError,
+    MaterialRecord,
     ResampleAlgorithm,
-    encode_image_base64,
 )
+from app.services.jobs import JobManager, JobQueueFullError, UploadJob
+from app.services.live_preview import (
+    LIVE_PREVIEW_SIZES,
+    LatestCommand,
+    PreviewCommand,
+    PreviewSession,
+)
+from app.services.storage import StorageQuotaExceededError
 
 router = APIRouter(prefix="/materials", tags=["materials"])
+logger = getLogger(__name__)
+
+
+def _material_fields(material: MaterialRecord) -> dict:
+    return {
+        "material_id": material.material_id,
+        "width": material.width,
+        "height": material.height,
+        "crop_box": list(material.crop_box),
+        "padding": material.padding,
+    }
+
+
+async def build_material_response(
+    pipeline: ImagePipeline, material: MaterialRecord
+) -> MaterialResponse:
+    data_url = await pipeline.get_material_data_url(material.material_id)
+    return MaterialResponse(**_material_fields(material), image_base64=data_url.decode("ascii"))
+
+
+async def material_json_response(
+    pipeline: ImagePipeline, material: MaterialRecord, status_code: int = status.HTTP_200_OK
+) -> RawJSONResponse:
+    """Serialise a :class:`MaterialResponse` around the cached data URL.
+
+    Skips model validation and JSON escaping of the ~100 KB image string, so a
+    repeated ``GET`` costs a dict lookup and a few small dumps.
+    """
+
+    data_url = await pipeline.get_material_data_url(material.material_id)
+    body = json_object(_material_fields(material), {"image_base64": json_string(data_url)})
+    return RawJSONResponse(body, status_code=status_code)
 
 
-@router.post("/upload", response_model=MaterialResponse, status_code=status.HTTP_201_CREATED)
+def build_job_response(job: UploadJob, material: MaterialResponse | None = None) -> UploadJobResponse:
+    return UploadJobResponse(
+        job_id=job.job_id,
+        status=job.status.value,
+        stage=job.stage,
+        progress=job.progress,
+        error=job.error,
+        material=material,
+    )
+
+
+@router.post(
+    "/upload",
+    response_model=MaterialResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": UploadJobResponse}},
+)
 async def upload_material(
+    request: Request,
     file: Annotated[UploadFile, File(..., description="Source image")],
     pipeline: Annotated[ImagePipeline, Depends(get_image_pipeline)],
-) -> MaterialResponse:
+    jobs: Annotated[JobManager, Depends(get_job_manager)],
+    mode: Annotated[
+        Literal["sync", "async"],
+        Query(description="`async` returns 202 with a job id instead of waiting"),
+    ] = "sync",
+) -> RawJSONResponse | JSONResponse:
     content = await file.read()
+    filename = file.filename or "upload.png"
+
+    if mode == "async":
+        try:
+            job = await jobs.submit(pipeline, content, filename)
+        except JobQueueFullError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(exc),
+                headers={"Retry-After": str(max(1, round(settings.job_poll_interval_seconds)))},
+            ) from exc
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=build_job_response(job).model_dump(),
+            headers={"Location": f"{settings.api_prefix}/jobs/{job.job_id}"},
+        )
+
+    async def process() -> MaterialRecord:
+        async with get_scheduler().admit(Lane.HEAVY):
+            return await pipeline.process_upload(content, filename)
+
     try:
-        material = await pipeline.process_upload(content, file.filename or "upload.png")
-        image_bytes = await pipeline.get_material_bytes(material.material_id)
+        material = await run_cancellable(
+            request,
+            process(),
+            settings.upload_deadline_seconds,
+            settings.disconnect_poll_interval_seconds,
+        )
+        return await material_json_response(pipeline, material, status.HTTP_201_CREATED)
+    except (
+        OverloadedError,
+        DeadlineExceededError,
+        ClientDisconnectedError,
+        StorageQuotaExceededError,
+    ):
+        raise
     except ValueError as exc:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
     except Exception as exc:  # pragma: no cover - FastAPI converts to 500
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc)) from exc
 
-    return MaterialResponse(
-        material_id=material.material_id,
-        width=material.width,
-        height=material.height,
-        crop_box=list(material.crop_box),
-        padding=material.padding,
-        image_base64=encode_image_base64(image_bytes),
-    )
-
 
 @router.get("/{material_id}", response_model=MaterialResponse)
 async def get_material(
     material_id: str, pipeline: Annotated[ImagePipeline, Depends(get_image_pipeline)]
-) -> MaterialResponse:
+) -> RawJSONResponse:
     try:
         material = await pipeline.get_material(material_id)
-        image_bytes = await pipeline.get_material_bytes(material_id)
+        return await material_json_response(pipeline, material)
     except Exception as exc:  # pragma: no cover - FastAPI converts to 404/500
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
 
-    return MaterialResponse(
-        material_id=material.material_id,
-        width=material.width,
-        height=material.height,
-        crop_box=list(material.crop_box),
-        padding=material.padding,
-        image_base64=encode_image_base64(image_bytes),
-    )
-
 
 @router.get("/{material_id}/preview", response_model=PreviewResponse)
 async def get_preview(
@@ -66,20 +167,125 @@ async def get_preview(
     algo: ResampleAlgorithm,
     pipeline: Annotated[ImagePipeline, Depends(get_image_pipeline)],
     size: int = 48,
-) -> PreviewResponse:
+) -> RawJSONResponse:
     if size not in {32, 48}:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Preview size must be either 32 or 48 pixels",
         )
     try:
-        preview_bytes = await pipeline.get_preview_bytes(material_id, algo, size)
+        data_url = await pipeline.get_preview_data_url(material_id, algo, size)
     except Exception as exc:  # pragma: no cover - FastAPI converts to 404/500
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
 
-    return PreviewResponse(
-        material_id=material_id,
-        algorithm=algo.value,
-        size=size,
-        image_base64=encode_image_base64(preview_bytes),
-    )
+    fields = {"material_id": material_id, "algorithm": algo.value, "size": size}
+    return RawJSONResponse(json_object(fields, {"image_base64": json_string(data_url)}))
+
+
+@router.websocket("/{material_id}/live")
+async def live_preview(
+    websocket: WebSocket,
+    material_id: str,
+    pipeline: Annotated[ImagePipeline, Depends(get_image_pipeline)],
+) -> None:
+    """Render previews of one material on demand over a WebSocket.
+
+    The client sends JSON commands such as ``{"id": 3, "algo": "NEAREST",
+    "size": 32}`` and receives, per rendered command, a JSON ``frame``
+    header followed by the PNG as a binary message. Commands that arrive
+    while a frame is rendering replace any older command still waiting, and
+    a frame that is already stale when it finishes is not sent.
+    """
+
+    await websocket.accept()
+    try:
+        session = await PreviewSession.open(pipeline, material_id)
+    except MaterialNotFoundError:
+        await websocket.close(code=4404, reason=f"Unknown material {material_id}")
+        return
+
+    send_lock = asyncio.Lock()
+    mailbox = LatestCommand()
+
+    async def send_json(payload: dict[str, object]) -> None:
+        async with send_lock:
+            await websocket.send_text(json.dumps(payload))
+
+    async def render_latest() -> None:
+        while True:
+            command = await mailbox.get()
+            start = time.perf_counter()
+            try:
+                data = await session.render(command)
+            except Exception:
+                logger.exception("Live preview of %s failed", material_id)
+                await send_json(
+                    {"type": "error", "id": command.request_id, "detail": "Rendering failed"}
+                )
+                continue
+            if mailbox.pending():
+                continue  # superseded while rendering
+            async with send_lock:
+                await websocket.send_text(
+                    json.dumps(
+                        {
+                            "type": "frame",
+                            "id": command.request_id,
+                            "algo": command.algo.value,
+                            "size": command.size,
+                            "padding": command.padding,
+                            "bytes": len(data),
+                            "render_ms": round((time.perf_counter() - start) * 1000, 3),
+                        }
+                    )
+                )
+                await websocket.send_bytes(data)
+
+    closing: list[asyncio.Task] = []
+
+    def renderer_done(task: asyncio.Task) -> None:
+        # A failed send ends the renderer; without it the socket would keep
+        # accepting commands that are never answered.
+        if task.cancelled() or task.exception() is None:
+            return
+        logger.error(
+            "Live preview renderer of %s stopped", material_id, exc_info=task.exception()
+        )
+        closing.append(asyncio.ensure_future(close_socket(1011, "Rendering stopped")))
+
+    async def close_socket(code: int, reason: str) -> None:
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception:  # noqa: BLE001 - the connection may already be gone
+            pass
+
+    renderer = asyncio.create_task(render_latest())
+    renderer.add_done_callback(renderer_done)
+    try:
+        await send_json(
+            {
+                "type": "ready",
+                "material_id": material_id,
+                "width": session.record.width,
+                "height": session.record.height,
+                "sizes": list(LIVE_PREVIEW_SIZES),
+                "algorithms": [algo.value for algo in ResampleAlgorithm],
+            }
+        )
+        while True:
+            try:
+                async with asyncio.timeout(settings.live_preview_idle_timeout_seconds):
+                    raw = await websocket.receive_text()
+            except TimeoutError:
+                await websocket.close(code=1001, reason="Idle timeout")
+                return
+            try:
+                mailbox.put(PreviewCommand.parse(raw))
+            except ValueError as exc:
+                await send_json({"type": "error", "detail": str(exc)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        renderer.cancel()
+        await asyncio.gather(renderer, *closing, return_exceptions=True)
+        session.close()
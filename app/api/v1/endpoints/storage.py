@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import asyncio
+
+from fastapi import APIRouter, Depends
+
+from app.core.deps import get_image_pipeline
+from app.models.responses import StorageUsageResponse
+from app.services.image_processing import ImagePipeline
+
+router = APIRouter(prefix="/storage", tags=["storage"])
+
+
+@router.get("", response_model=StorageUsageResponse)
+async def get_storage_usage(
+    pipeline: ImagePipeline = Depends(get_image_pipeline),
+) -> StorageUsageResponse:
+    usage = await asyncio.to_thread(pipeline.storage_usage)
+    return StorageUsageResponse(**usage.as_dict())
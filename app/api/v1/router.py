@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import forge, materials
+from app.api.v1.endpoints import forge, jobs, materials, storage
 
 api_router = APIRouter()
 
@@ -12,3 +12,5 @@ async def ping() -> dict[str, str]:
 
 api_router.include_router(materials.router)
 api_router.include_router(forge.router)
+api_router.include_router(jobs.router)
+api_router.include_router(storage.router)
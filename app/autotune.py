@@ -0,0 +1,339 @@
+"""Host autotuning: ``python -m app.cli autotune``.
+
+Runs synthetic uploads through the real pipeline under a grid of worker
+processes, heavy-lane executor threads, rembg sessions and ONNX intra-op
+threads, then writes the fastest configuration as a dotenv profile that
+:class:`~app.core.config.Settings` loads (copy it to ``.env`` or point
+``ICONFORGE_ENV_FILE`` at it).
+
+Each configuration gets fresh processes, since ONNX Runtime fixes its
+thread pools when a session is created. Every process drives the same
+number of closed-loop clients, and all processes start together behind a
+barrier, so throughput is total uploads over the wall time of the slowest.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import itertools
+import math
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Sequence, TextIO
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class TuneConfig:
+    workers: int
+    executor_threads: int
+    rembg_sessions: int = 1
+    onnx_threads: int = 1
+
+    def label(self) -> str:
+        return (
+            f"workers={self.workers} executor={self.executor_threads} "
+            f"sessions={self.rembg_sessions} onnx={self.onnx_threads}"
+        )
+
+    def env(self, background_removal: bool) -> dict[str, str]:
+        values = {
+            "ICONFORGE_WORKERS": str(self.workers),
+            "ICONFORGE_HEAVY_MAX_CONCURRENCY": str(self.executor_threads),
+        }
+        if background_removal:
+            values["ICONFORGE_REMBG_SESSIONS"] = str(self.rembg_sessions)
+            values["ICONFORGE_ONNX_INTRA_OP_THREADS"] = str(self.onnx_threads)
+        return values
+
+
+@dataclass(frozen=True)
+class Workload:
+    requests: int
+    clients: int
+    image_size: int
+    background_removal: bool
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class TuneResult:
+    config: TuneConfig
+    requests: int
+    errors: int
+    seconds: float
+    p50_ms: float
+    p95_ms: float
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.seconds if self.seconds > 0 else 0.0
+
+
+def candidate_grid(
+    cpu_count: int,
+    background_removal: bool,
+    workers: Sequence[int] | None = None,
+    executor_threads: Sequence[int] | None = None,
+    rembg_sessions: Sequence[int] | None = None,
+    onnx_threads: Sequence[int] | None = None,
+) -> list[TuneConfig]:
+    """Configurations worth measuring on a host with ``cpu_count`` cores.
+
+    Defaults are powers of two up to the core count. Combinations that would
+    run more than twice as many busy threads as there are cores are skipped,
+    as are the rembg dimensions when background removal is off. With more
+    than one worker ONNX is pinned to one thread, as ``app.server`` does.
+    """
+
+    def powers(limit: int) -> list[int]:
+        return sorted({min(2**exponent, limit) for exponent in range(limit.bit_length())})
+
+    workers = workers or powers(cpu_count)
+    executor_threads = executor_threads or [value for value in powers(cpu_count) if value <= 8]
+    if background_removal:
+        rembg_sessions = rembg_sessions or [1, 2]
+        onnx_threads = onnx_threads or powers(cpu_count)
+    else:
+        rembg_sessions, onnx_threads = [1], [1]
+
+    grid = []
+    for worker_count, threads, sessions in itertools.product(
+        workers, executor_threads, rembg_sessions
+    ):
+        if sessions > threads:
+            continue  # a session per in-flight upload is the most that can be busy
+        # app.server forces single-threaded sessions for pre-forked workers.
+        for onnx in onnx_threads if worker_count == 1 else [1]:
+            busy = worker_count * threads * (onnx if background_removal else 1)
+            if busy > 2 * cpu_count and (worker_count, threads, onnx) != (1, 1, 1):
+                continue
+            grid.append(TuneConfig(worker_count, threads, sessions, onnx))
+    return grid
+
+
+def synthetic_upload(size: int, seed: int) -> bytes:
+    """A PNG with a few solid shapes on a flat background, unique per ``seed``."""
+
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    background = tuple(rng.randrange(180, 256) for _ in range(3)) + (255,)
+    image = Image.new("RGBA", (size, size), background)
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randrange(2, 6)):
+        left, top = rng.randrange(size // 2), rng.randrange(size // 2)
+        right = left + rng.randrange(size // 8, size // 2)
+        bottom = top + rng.randrange(size // 8, size // 2)
+        fill = tuple(rng.randrange(0, 160) for _ in range(3)) + (255,)
+        shape = draw.ellipse if rng.random() < 0.5 else draw.rectangle
+        shape((left, top, right, bottom), fill=fill)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+async def _drive(pipeline, payloads: list[bytes], clients: int) -> list[float]:
+    """Upload ``payloads`` from ``clients`` closed-loop clients; return successful latencies."""
+
+    from app.services.executor import Lane, get_scheduler
+
+    pending = iter(payloads)
+    latencies: list[float] = []
+
+    async def client() -> None:
+        for content in pending:
+            started = time.perf_counter()
+            try:
+                async with get_scheduler().admit(Lane.HEAVY, shed=False):
+                    await pipeline.process_upload(content, "autotune.png")
+            except Exception:  # noqa: BLE001 - failures are counted by the parent
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies
+
+
+def _bench_worker(config: TuneConfig, workload: Workload, index: int, barrier, results) -> None:
+    """Run one worker's share of ``workload`` and report its timings to ``results``."""
+
+    from app.services.executor import get_scheduler
+    from app.services.image_processing import ImagePipeline
+    from app.services.material_store import MemoryMaterialStore
+
+    try:
+        if workload.background_removal:
+            os.environ["OMP_NUM_THREADS"] = str(config.onnx_threads)
+        settings.heavy_max_concurrency = config.executor_threads
+        settings.rembg_sessions = config.rembg_sessions
+        settings.onnx_intra_op_threads = config.onnx_threads
+        # Distinct synthetic uploads must each pay for rembg.
+        settings.enable_matte_reuse = False
+        get_scheduler.cache_clear()
+        pipeline = ImagePipeline(
+            background_removal_enabled=workload.background_removal,
+            store=MemoryMaterialStore(settings.temp_dir),
+        )
+        pipeline.warm_up()
+        share = range(index, workload.requests, config.workers)
+        payloads = [synthetic_upload(workload.image_size, workload.seed + n) for n in share]
+        clients = max(1, round(workload.clients / config.workers))
+        barrier.wait()
+    except BaseException:
+        # Release the other workers and tell the parent this one is out.
+        barrier.abort()
+        results.put(None)
+        raise
+    started = time.time()
+    latencies = asyncio.run(_drive(pipeline, payloads, clients))
+    results.put((started, time.time(), latencies))
+
+
+def measure(config: TuneConfig, workload: Workload, timeout: float = 600.0) -> TuneResult:
+    """Benchmark ``config`` in fresh worker processes."""
+
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(method)
+    barrier = context.Barrier(config.workers)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_bench_worker, args=(config, workload, index, barrier, results), daemon=True
+        )
+        for index in range(config.workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = []
+    received = 0
+    deadline = time.monotonic() + timeout
+    try:
+        while received < len(processes) and time.monotonic() < deadline:
+            try:
+                report = results.get(timeout=0.5)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    break  # a worker died without reporting
+                continue
+            received += 1
+            if report is not None:
+                reports.append(report)
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    latencies = [latency for report in reports for latency in report[2]]
+    seconds = (
+        max(report[1] for report in reports) - min(report[0] for report in reports)
+        if reports
+        else 0.0
+    )
+    return TuneResult(
+        config=config,
+        requests=len(latencies),
+        # Failed uploads plus the share of any worker that never reported.
+        errors=workload.requests - len(latencies),
+        seconds=seconds,
+        p50_ms=percentile(latencies, 0.5),
+        p95_ms=percentile(latencies, 0.95),
+    )
+
+
+def choose_best(results: Iterable[TuneResult], max_p95_ms: float | None = None) -> TuneResult:
+    """Highest throughput among error-free runs within the p95 budget.
+
+    Falls back to the lowest p95 when no run meets the budget. Ties go to the
+    configuration using fewer processes and threads.
+    """
+
+    clean = [result for result in results if result.errors == 0 and result.requests]
+    if not clean:
+        raise ValueError("Every configuration failed; nothing to recommend")
+
+    def cost(result: TuneResult) -> tuple[int, int, int, int]:
+        config = result.config
+        return (config.workers, config.executor_threads, config.onnx_threads, config.rembg_sessions)
+
+    within = [
+        result for result in clean if max_p95_ms is None or result.p95_ms <= max_p95_ms
+    ]
+    if not within:
+        return min(clean, key=lambda result: (result.p95_ms, cost(result)))
+    best = max(result.throughput for result in within)
+    # Within 2% of the best counts as a tie: prefer the cheaper configuration.
+    return min(
+        (result for result in within if result.throughput >= best * 0.98),
+        key=lambda result: (cost(result), result.p95_ms),
+    )
+
+
+def format_result(result: TuneResult) -> str:
+    return (
+        f"{result.config.label():<44} {result.throughput:7.2f} uploads/s  "
+        f"p50 {result.p50_ms:7.1f} ms  p95 {result.p95_ms:7.1f} ms  errors {result.errors}"
+    )
+
+
+def write_profile(
+    path: Path,
+    best: TuneResult,
+    results: Sequence[TuneResult],
+    workload: Workload,
+    cpu_count: int,
+) -> None:
+    generated = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    lines = [
+        f"# IconForge autotune profile for a {cpu_count}-core host, generated {generated}.",
+        f"# Workload: {workload.requests} uploads of {workload.image_size}px from "
+        f"{workload.clients} clients, background removal "
+        f"{'on' if workload.background_removal else 'off'}.",
+        "# Measured:",
+        *(f"#   {format_result(result)}" for result in results),
+        f"# Recommended: {format_result(best)}",
+    ]
+    env = best.config.env(workload.background_removal)
+    lines += [f"{key}={value}" for key, value in env.items()]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def autotune(
+    grid: Sequence[TuneConfig],
+    workload: Workload,
+    output: Path,
+    max_p95_ms: float | None = None,
+    cpu_count: int | None = None,
+    out: TextIO | None = None,
+) -> TuneResult:
+    """Measure every configuration in ``grid`` and write the winner to ``output``."""
+
+    out = out or sys.stdout
+    results = []
+    for config in grid:
+        result = measure(config, workload)
+        results.append(result)
+        print(format_result(result), file=out, flush=True)
+    best = choose_best(results, max_p95_ms)
+    write_profile(output, best, results, workload, cpu_count or os.cpu_count() or 1)
+    print(f"recommended {best.config.label()}; profile written to {output}", file=out, flush=True)
+    return best
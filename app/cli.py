@@ -0,0 +1,358 @@
+"""Offline batch forging: ``python -m app.cli forge <input_dir> <output_dir>``.
+
+``python -m app.cli autotune`` benchmarks worker, executor and ONNX thread
+settings on this host instead; see :mod:`app.autotune`.
+
+Every image under the input directory goes through the same stages as an
+upload (validate, decode, rembg, smart crop, resize) and is packed into an
+``.ico`` at the mirrored path under the output directory. Work is spread
+over a process pool with one rembg session per worker process. Finished
+images are appended to ``manifest.jsonl`` in the output directory, so an
+interrupted run picks up where it stopped.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterator, Sequence, TextIO
+
+from app.core.config import settings
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+@dataclass(frozen=True)
+class ForgeOptions:
+    mid_algo: str
+    tiny_algo: str
+    background_removal: bool
+
+    def key(self) -> str:
+        return f"{self.mid_algo}:{self.tiny_algo}:{int(self.background_removal)}"
+
+
+@dataclass
+class ForgeResult:
+    source: str
+    digest: str
+    options: str
+    status: str
+    output: str | None = None
+    seconds: float = 0.0
+    timings_ms: dict[str, float] = field(default_factory=dict)
+    error: str | None = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+
+def discover_images(input_dir: Path, output_dir: Path | None = None) -> list[Path]:
+    """Images under ``input_dir``, leaving out anything under ``output_dir``.
+
+    ``.ico`` files are valid inputs, so an output directory nested in the
+    input would otherwise feed a run's own icons into the next one.
+    """
+
+    extensions = {extension.lower() for extension in settings.allowed_image_extensions}
+    excluded = output_dir.resolve() if output_dir is not None else None
+    return sorted(
+        path
+        for path in input_dir.rglob("*")
+        if path.is_file()
+        and path.suffix.lower() in extensions
+        and path.name != MANIFEST_NAME
+        and (excluded is None or not path.resolve().is_relative_to(excluded))
+    )
+
+
+def load_manifest(path: Path) -> dict[str, ForgeResult]:
+    """Return the latest entry per source; a torn last line is ignored."""
+
+    entries: dict[str, ForgeResult] = {}
+    try:
+        lines = path.read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        return entries
+    for line in lines:
+        try:
+            entry = ForgeResult(**json.loads(line))
+        except (TypeError, ValueError):
+            continue
+        entries[entry.source] = entry
+    return entries
+
+
+def is_done(
+    entry: ForgeResult | None, digest: str, options: ForgeOptions, output_dir: Path
+) -> bool:
+    return (
+        entry is not None
+        and entry.status == "ok"
+        and entry.digest == digest
+        and entry.options == options.key()
+        and entry.output is not None
+        and (output_dir / entry.output).is_file()
+    )
+
+
+# Per-process state, created once by ``_init_worker``.
+_pipeline = None
+
+
+def _init_worker(background_removal: bool) -> None:
+    global _pipeline
+
+    from app.services.image_processing import ImagePipeline
+    from app.services.material_store import MemoryMaterialStore
+
+    if background_removal:
+        # One single-threaded ONNX session per process; the pool provides the parallelism.
+        os.environ.setdefault("OMP_NUM_THREADS", "1")
+    _pipeline = ImagePipeline(
+        background_removal_enabled=background_removal,
+        store=MemoryMaterialStore(settings.temp_dir),
+    )
+    _pipeline.warm_up()
+
+
+def forge_file(
+    source: Path, input_dir: Path, output_dir: Path, digest: str, options: ForgeOptions
+) -> ForgeResult:
+    """Forge one image into ``output_dir``; errors are reported, not raised."""
+
+    from PIL import Image
+
+    from app.services.image_processing import (
+        ResampleAlgorithm,
+        encode_png,
+        resize_images,
+        smart_crop,
+    )
+    from app.services.pack_ico import is_ico, pack_ico, parse_ico
+
+    assert _pipeline is not None, "worker not initialised"
+    relative = source.relative_to(input_dir)
+    result = ForgeResult(
+        source=relative.as_posix(), digest=digest, options=options.key(), status="ok"
+    )
+    timings = result.timings_ms
+    started = time.perf_counter()
+
+    def stage(name: str, func, *args):
+        stage_start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = (time.perf_counter() - stage_start) * 1000
+            timings[name] = round(timings.get(name, 0.0) + elapsed, 3)
+
+    try:
+        content = stage("read", source.read_bytes)
+        image = _pipeline.prepare_image(content, source.name, stage)
+        cropped, _, _ = stage("smart_crop", smart_crop, image)
+        processed = stage("resize", cropped.resize, (256, 256), Image.LANCZOS)
+        mid_algo = ResampleAlgorithm(options.mid_algo)
+        tiny_algo = ResampleAlgorithm(options.tiny_algo)
+        frames = {256: processed}
+        if mid_algo is tiny_algo:
+            frames.update(stage("resize", resize_images, processed, (48, 32, 16), mid_algo))
+        else:
+            frames.update(stage("resize", resize_images, processed, (48, 32), mid_algo))
+            frames.update(stage("resize", resize_images, processed, (16,), tiny_algo))
+        encoded = {size: stage("png_encode", encode_png, frame) for size, frame in frames.items()}
+        # Sizes we do not regenerate survive re-forging an existing .ico untouched.
+        keep = stage("ico_parse", parse_ico, content) if is_ico(content) else ()
+        ico_bytes = stage("pack_ico", pack_ico, encoded, keep)
+        target = (output_dir / relative).with_suffix(".ico")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.tmp")
+        stage("write", tmp.write_bytes, ico_bytes)
+        os.replace(tmp, target)
+        result.output = target.relative_to(output_dir).as_posix()
+    except (ValueError, OSError) as exc:
+        result.status = "failed"
+        result.error = str(exc)
+    except Exception as exc:  # noqa: BLE001 - one bad image must not abort the batch
+        result.status = "failed"
+        result.error = f"{type(exc).__name__}: {exc}"
+    result.seconds = round(time.perf_counter() - started, 6)
+    return result
+
+
+def _format(result: ForgeResult) -> str:
+    stages = ", ".join(f"{name} {ms:.1f}" for name, ms in result.timings_ms.items())
+    line = f"{result.status:<6} {result.source}  {result.seconds * 1000:.1f} ms"
+    if stages:
+        line += f"  ({stages})"
+    if result.error:
+        line += f"  error: {result.error}"
+    return line
+
+
+def _iter_results(
+    jobs: list[tuple[Path, str]],
+    input_dir: Path,
+    output_dir: Path,
+    options: ForgeOptions,
+    workers: int,
+) -> Iterator[ForgeResult]:
+    if workers == 1:
+        _init_worker(options.background_removal)
+        for source, digest in jobs:
+            yield forge_file(source, input_dir, output_dir, digest, options)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(options.background_removal,)
+    ) as pool:
+        futures: list[Future[ForgeResult]] = [
+            pool.submit(forge_file, source, input_dir, output_dir, digest, options)
+            for source, digest in jobs
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def forge_directory(
+    input_dir: Path,
+    output_dir: Path,
+    options: ForgeOptions,
+    workers: int,
+    force: bool = False,
+    out: TextIO | None = None,
+) -> dict[str, int]:
+    """Forge every image under ``input_dir``; return ok/failed/skipped counts."""
+
+    from app.services.blobs import content_digest
+
+    out = out or sys.stdout
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+    done = {} if force else load_manifest(manifest_path)
+    counts = {"ok": 0, "failed": 0, "skipped": 0}
+    jobs = []
+    for source in discover_images(input_dir, output_dir):
+        digest = content_digest(source.read_bytes())
+        if is_done(done.get(source.relative_to(input_dir).as_posix()), digest, options, output_dir):
+            counts["skipped"] += 1
+        else:
+            jobs.append((source, digest))
+
+    started = time.perf_counter()
+    with open(manifest_path, "a", encoding="utf-8") as manifest:
+        for result in _iter_results(jobs, input_dir, output_dir, options, workers):
+            # One flushed line per image keeps the manifest resumable after a crash.
+            manifest.write(result.to_json() + "\n")
+            manifest.flush()
+            counts[result.status] += 1
+            print(_format(result), file=out, flush=True)
+    elapsed = time.perf_counter() - started
+    processed = counts["ok"] + counts["failed"]
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(
+        f"forged {counts['ok']}, failed {counts['failed']}, skipped {counts['skipped']} "
+        f"in {elapsed:.2f}s ({rate:.1f} images/s, {workers} workers)",
+        file=out,
+        flush=True,
+    )
+    return counts
+
+
+def _int_list(raw: str) -> list[int]:
+    try:
+        values = [int(value) for value in raw.split(",") if value.strip()]
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {raw!r}") from exc
+    if not values or min(values) < 1:
+        raise argparse.ArgumentTypeError("values must be positive integers")
+    return values
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    from app.services.image_processing import ResampleAlgorithm
+
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    forge = commands.add_parser("forge", help="forge every image in a directory into .ico files")
+    forge.add_argument("input_dir", type=Path)
+    forge.add_argument("output_dir", type=Path)
+    forge.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    algorithms = [algo.value for algo in ResampleAlgorithm]
+    forge.add_argument("--mid-algo", choices=algorithms, default=ResampleAlgorithm.LANCZOS.value)
+    forge.add_argument("--tiny-algo", choices=algorithms, default=ResampleAlgorithm.AREA.value)
+    forge.add_argument(
+        "--background-removal",
+        action=argparse.BooleanOptionalAction,
+        default=settings.enable_background_removal,
+    )
+    forge.add_argument(
+        "--force", action="store_true", help="ignore the manifest and forge everything again"
+    )
+
+    tune = commands.add_parser(
+        "autotune", help="benchmark worker/thread settings and write a recommended .env profile"
+    )
+    tune.add_argument("--output", type=Path, default=Path("iconforge-autotune.env"))
+    tune.add_argument("--workers", type=_int_list, help="e.g. 1,2,4 (default: powers of two)")
+    tune.add_argument("--executor-threads", type=_int_list, help="heavy-lane thread counts")
+    tune.add_argument("--rembg-sessions", type=_int_list, help="rembg sessions per worker")
+    tune.add_argument("--onnx-threads", type=_int_list, help="ONNX intra-op threads per session")
+    tune.add_argument("--requests", type=int, default=48, help="uploads per configuration")
+    tune.add_argument("--clients", type=int, default=(os.cpu_count() or 1) * 2)
+    tune.add_argument("--image-size", type=int, default=512)
+    tune.add_argument("--max-p95-ms", type=float, help="latency budget for the recommendation")
+    tune.add_argument(
+        "--background-removal",
+        action=argparse.BooleanOptionalAction,
+        default=settings.enable_background_removal,
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "autotune":
+        return _autotune(parser, args)
+    if not args.input_dir.is_dir():
+        parser.error(f"{args.input_dir} is not a directory")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    options = ForgeOptions(args.mid_algo, args.tiny_algo, args.background_removal)
+    counts = forge_directory(args.input_dir, args.output_dir, options, args.workers, args.force)
+    return 1 if counts["failed"] else 0
+
+
+def _autotune(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+    import importlib.util
+
+    from app.autotune import Workload, autotune, candidate_grid
+
+    if args.requests < 1 or args.clients < 1 or args.image_size < 16:
+        parser.error("--requests and --clients must be at least 1, --image-size at least 16")
+    if args.background_removal and importlib.util.find_spec("rembg") is None:
+        parser.error("rembg is not installed; pass --no-background-removal")
+    cpu_count = os.cpu_count() or 1
+    grid = candidate_grid(
+        cpu_count,
+        args.background_removal,
+        workers=args.workers,
+        executor_threads=args.executor_threads,
+        rembg_sessions=args.rembg_sessions,
+        onnx_threads=args.onnx_threads,
+    )
+    if not grid:
+        parser.error("the requested grid oversubscribes this host; widen or lower the values")
+    workload = Workload(args.requests, args.clients, args.image_size, args.background_removal)
+    try:
+        autotune(grid, workload, args.output, args.max_p95_ms, cpu_count)
+    except ValueError as exc:
+        print(f"autotune failed: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Protocol, TypeVar
+
+from app.core.metrics import CANCELLED_OPERATIONS
+
+T = TypeVar("T")
+
+
+class DisconnectAware(Protocol):
+    async def is_disconnected(self) -> bool: ...
+
+
+class ClientDisconnectedError(RuntimeError):
+    """Raised when the client went away before the work finished."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when work did not finish within its deadline."""
+
+
+async def _cancel_on_disconnect(
+    request: DisconnectAware, task: asyncio.Future[T], poll_interval: float
+) -> None:
+    while not task.done():
+        if await request.is_disconnected():
+            task.cancel()
+            return
+        await asyncio.sleep(poll_interval)
+
+
+async def run_cancellable(
+    request: DisconnectAware,
+    work: Awaitable[T],
+    deadline_seconds: float | None,
+    poll_interval: float = 0.1,
+) -> T:
+    """Await ``work`` but cancel it on client disconnect or deadline.
+
+    Cancellation reaches the pipeline at its next ``await``: stages already
+    running in a thread finish, queued executor jobs are dropped and later
+    stages never start.
+    """
+
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, task, poll_interval))
+    try:
+        async with asyncio.timeout(deadline_seconds):
+            return await task
+    except TimeoutError as exc:
+        CANCELLED_OPERATIONS.inc(reason="deadline")
+        raise DeadlineExceededError(
+            f"Processing exceeded the {deadline_seconds:g}s deadline"
+        ) from exc
+    except asyncio.CancelledError:
+        if watcher.done() and task.cancelled():
+            CANCELLED_OPERATIONS.inc(reason="disconnect")
+            raise ClientDisconnectedError("Client closed the connection") from None
+        raise
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
@@ -1,6 +1,7 @@
+import os
 from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -13,14 +14,55 @@ class Settings(BaseSettings):
     temp_dir: Path = Path("/tmp/iconforge/temp")
     model_cache_dir: Path = Path("/tmp/iconforge/models")
     max_upload_size_bytes: int = 10 * 1024 * 1024
-    allowed_image_extensions: tuple[str, ...] = (".png", ".jpg", ".jpeg", ".webp")
-    allowed_image_formats: tuple[str, ...] = ("PNG", "JPEG", "WEBP")
+    allowed_image_extensions: tuple[str, ...] = (".png", ".jpg", ".jpeg", ".webp", ".ico")
+    allowed_image_formats: tuple[str, ...] = ("PNG", "JPEG", "WEBP", "ICO")
     material_ttl_seconds: int = 60 * 60
+    storage_quota_bytes: int | None = None
+    material_store: Literal["disk", "memory"] = "disk"
+    memory_store_max_bytes: int = 512 * 1024 * 1024
+    state_backend: Literal["memory", "sqlite", "redis"] = "memory"
+    state_sqlite_path: Path | None = None
+    state_redis_url: str = "redis://localhost:6379/0"
+    state_redis_prefix: str = "iconforge"
     enable_background_removal: bool = True
+    rembg_sessions: int = 1
+    onnx_intra_op_threads: int | None = None
+    enable_matte_reuse: bool = True
+    matte_reuse_max_distance: int = 10
+    matte_reuse_index_size: int = 1024
+    enable_warmup: bool = True
+    warmup_retry_initial_seconds: float = 1.0
+    warmup_retry_max_seconds: float = 60.0
+    workers: int = 1
+    worker_shutdown_timeout_seconds: float = 30.0
+    memory_report_interval_seconds: float = 60.0
+    readiness_probe_timeout_seconds: float = 1.0
+    heavy_max_concurrency: int = 2
+    heavy_max_queue: int = 8
+    interactive_max_concurrency: int = 4
+    overload_retry_after_seconds: int = 5
+    upload_deadline_seconds: float | None = 120.0
+    forge_deadline_seconds: float | None = 30.0
+    disconnect_poll_interval_seconds: float = 0.1
+    job_workers: int = 2
+    job_queue_size: int = 100
+    job_ttl_seconds: int = 60 * 60
+    job_poll_interval_seconds: float = 0.5
+    live_preview_idle_timeout_seconds: float = 300.0
     request_id_header: str = "X-Request-ID"
+    access_log_sample_rate: float = 1.0
     enable_rate_limit: bool = False
     rate_limit_per_minute: int = 120
+    rate_limit_costs: dict[str, float] = {"/materials/upload": 10.0, "/forge": 5.0}
     require_api_key: str | None = None
+    enable_metrics: bool = True
+    enable_server_timing: bool = True
+    enable_memory_tracing: bool = False
+    memory_tracing_frames: int = 1
+    enable_profiling: bool = False
+    profile_header: str = "X-IconForge-Profile"
+    profile_dir: Path = Path("/tmp/iconforge/profiles")
+    profile_max_files: int = 20
 
     model_config = SettingsConfigDict(
         env_file=".env", env_prefix="ICONFORGE_", extra="ignore"
@@ -33,9 +75,13 @@ class Settings(BaseSettings):
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    """Return cached settings instance."""
+    """Return cached settings instance.
 
-    return Settings()
+    ``ICONFORGE_ENV_FILE`` points at another dotenv file, such as a profile
+    written by ``python -m app.cli autotune``.
+    """
+
+    return Settings(_env_file=os.environ.get("ICONFORGE_ENV_FILE", ".env"))
 
 
 settings = get_settings()
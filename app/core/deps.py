@@ -2,8 +2,24 @@ from functools import lru_cache
 
 from app.core.config import settings
 from app.services.image_processing import ImagePipeline
+from app.services.jobs import JobManager
+from app.services.material_store import create_material_store
+from app.services.state import create_state_backend
 
 
 @lru_cache(maxsize=1)
 def get_image_pipeline() -> ImagePipeline:
-    return ImagePipeline(background_removal_enabled=settings.enable_background_removal)
+    return ImagePipeline(
+        background_removal_enabled=settings.enable_background_removal,
+        state=create_state_backend(settings),
+        store=create_material_store(settings),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_job_manager() -> JobManager:
+    return JobManager(
+        workers=settings.job_workers,
+        max_queue=settings.job_queue_size,
+        ttl_seconds=settings.job_ttl_seconds,
+    )
@@ -0,0 +1,55 @@
+"""JSON responses assembled from pre-encoded fragments.
+
+Image payloads are base64 data URLs, whose characters never need JSON
+escaping. Once encoded they can be spliced into the response body verbatim,
+so only the handful of small scalar fields are serialised per request.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Mapping
+
+from fastapi.responses import Response
+
+try:  # pragma: no cover - exercised when the optional speedup is installed
+    import orjson
+except ImportError:  # pragma: no cover - default in minimal installs
+    orjson = None
+
+
+def dumps_bytes(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def json_object(fields: Mapping[str, Any], raw: Mapping[str, bytes] | None = None) -> bytes:
+    """Serialise ``fields`` and append each ``raw`` value as-is.
+
+    Values in ``raw`` must already be valid JSON (e.g. from
+    :func:`json_string`); they are not parsed or escaped again.
+    """
+
+    body = dumps_bytes(dict(fields))
+    if not raw:
+        return body
+    parts = [body[:-1]]
+    separator = b"," if fields else b""
+    for key, value in raw.items():
+        parts += [separator, dumps_bytes(key), b":", value]
+        separator = b","
+    parts.append(b"}")
+    return b"".join(parts)
+
+
+def json_string(ascii_text: bytes) -> bytes:
+    """Quote text that needs no escaping (base64, data URLs) as a JSON string."""
+
+    return b'"' + ascii_text + b'"'
+
+
+class RawJSONResponse(Response):
+    """A JSON response whose body is already encoded."""
+
+    media_type = "application/json"
@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+import atexit
+import copy
 import json
 import logging
+import os
+import queue
 from contextvars import ContextVar
 from datetime import datetime, timezone
-from typing import Any
+from logging.handlers import QueueHandler, QueueListener
+from typing import IO, Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
 
 request_id_ctx_var: ContextVar[str] = ContextVar("request_id", default="-")
 
@@ -36,19 +46,96 @@ class JsonFormatter(logging.Formatter):
             "logger": record.name,
             "request_id": getattr(record, "request_id", "-"),
         }
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
         if record.exc_info:
             payload["exc_info"] = self.formatException(record.exc_info)
-        return json.dumps(payload, ensure_ascii=False)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return dumps_json(payload)
+
+
+def dumps_json(payload: Any) -> str:
+    """Serialize ``payload`` with orjson when installed, else the stdlib."""
+
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode()
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class QueueLogHandler(QueueHandler):
+    """Hand records to the background writer without formatting them.
+
+    The message is rendered and any traceback captured in the emitting
+    thread (arguments may change later), but JSON encoding and the write to
+    the stream happen on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_traceback_formatter = logging.Formatter()
+_listener: QueueListener | None = None
+
 
+def configure_logging(level: int | str = logging.INFO, stream: IO[str] | None = None) -> None:
+    """Configure application-wide structured logging.
 
-def configure_logging(level: int | str = logging.INFO) -> None:
-    """Configure application-wide structured logging."""
+    Log calls only enqueue the record; a listener thread formats it and
+    writes to ``stream`` (stderr by default), so slow output never blocks
+    the event loop.
+    """
 
-    handler = logging.StreamHandler()
-    handler.setFormatter(JsonFormatter())
+    global _listener
+
+    stop_logging()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    handler = QueueLogHandler(queue.SimpleQueue())
     handler.addFilter(RequestIdFilter())
 
     root_logger = logging.getLogger()
     root_logger.setLevel(level)
     root_logger.handlers.clear()
     root_logger.addHandler(handler)
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the background writer."""
+
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_listener_after_fork() -> None:
+    # The writer thread does not survive fork; give the child its own.
+    global _listener
+
+    if _listener is None:
+        return
+    fresh: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, QueueLogHandler):
+            handler.queue = fresh
+    _listener = QueueListener(fresh, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+atexit.register(stop_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
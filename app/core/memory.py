@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from app.core.metrics import PROCESS_SHARED_MEMORY, PROCESS_UNIQUE_MEMORY
+
+_SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared_clean",
+    "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean",
+    "Private_Dirty": "private_dirty",
+}
+
+
+@dataclass(frozen=True)
+class ProcessMemory:
+    """Memory of one process split by whether its pages are shared.
+
+    ``unique`` (USS) is what the process would free on exit; ``shared`` covers
+    pages also mapped by other processes, such as model weights inherited
+    copy-on-write from a pre-fork master.
+    """
+
+    pid: int
+    rss: int
+    pss: int
+    shared: int
+    unique: int
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+def parse_smaps_rollup(pid: int, text: str) -> ProcessMemory:
+    """Build a :class:`ProcessMemory` from ``/proc/<pid>/smaps_rollup`` text."""
+
+    values = dict.fromkeys(_SMAPS_FIELDS.values(), 0)
+    for line in text.splitlines():
+        key, _, rest = line.partition(":")
+        name = _SMAPS_FIELDS.get(key.strip())
+        if name is not None:
+            values[name] = int(rest.split()[0]) * 1024
+    return ProcessMemory(
+        pid=pid,
+        rss=values["rss"],
+        pss=values["pss"],
+        shared=values["shared_clean"] + values["shared_dirty"],
+        unique=values["private_clean"] + values["private_dirty"],
+    )
+
+
+def read_process_memory(pid: int | None = None) -> ProcessMemory | None:
+    """Return memory usage for ``pid`` (default: this process), or ``None``.
+
+    Only Linux exposes the per-page sharing information needed here; other
+    platforms and vanished processes yield ``None``.
+    """
+
+    pid = os.getpid() if pid is None else pid
+    try:
+        text = Path(f"/proc/{pid}/smaps_rollup").read_text()
+    except OSError:
+        return None
+    return parse_smaps_rollup(pid, text)
+
+
+def update_process_memory_metrics() -> ProcessMemory | None:
+    usage = read_process_memory()
+    if usage is not None:
+        PROCESS_UNIQUE_MEMORY.set(usage.unique)
+        PROCESS_SHARED_MEMORY.set(usage.shared)
+    return usage
@@ -0,0 +1,387 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Sequence
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+MEMORY_BUCKETS: tuple[float, ...] = tuple(float(2**power) for power in range(16, 32, 2))
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """Base class for thread-safe metrics rendered in Prometheus text format."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            expected = ", ".join(self.labelnames) or "no labels"
+            raise ValueError(f"Metric {self.name} expects {expected}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> list[str]:  # pragma: no cover - overridden
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            return sum(self._counts.get(self._key(labels), ()))
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines: list[str] = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames + ("le",), key + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics exposed together on the scrape endpoint."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.register(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self.register(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.register(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    "iconforge_stage_duration_seconds",
+    "Time spent in each image pipeline stage.",
+    ("stage",),
+)
+STAGE_PEAK_ALLOCATION = REGISTRY.histogram(
+    "iconforge_stage_peak_allocation_bytes",
+    "Peak bytes allocated while each pipeline stage ran (only while tracemalloc traces).",
+    ("stage",),
+    buckets=MEMORY_BUCKETS,
+)
+REQUEST_PEAK_ALLOCATION = REGISTRY.histogram(
+    "iconforge_request_peak_allocation_bytes",
+    "Peak bytes allocated above the level at request start (only while tracemalloc traces).",
+    buckets=MEMORY_BUCKETS,
+)
+CACHE_HITS = REGISTRY.counter(
+    "iconforge_cache_hits_total", "Cache lookups served from memory.", ("cache",)
+)
+CACHE_MISSES = REGISTRY.counter(
+    "iconforge_cache_misses_total", "Cache lookups that had to recompute.", ("cache",)
+)
+CACHE_EVICTIONS = REGISTRY.counter(
+    "iconforge_cache_evictions_total", "Cache entries dropped by eviction.", ("cache",)
+)
+MATERIAL_EVICTIONS = REGISTRY.counter(
+    "iconforge_material_evictions_total", "Materials removed from temp storage.", ("reason",)
+)
+MATERIALS_LIVE = REGISTRY.gauge(
+    "iconforge_materials_live", "Materials currently held by the pipeline."
+)
+STORAGE_USED_BYTES = REGISTRY.gauge(
+    "iconforge_storage_used_bytes", "Bytes charged to live materials against the quota."
+)
+STORAGE_QUOTA_BYTES = REGISTRY.gauge(
+    "iconforge_storage_quota_bytes", "Configured material storage quota in bytes."
+)
+TEMP_DIR_BYTES = REGISTRY.gauge(
+    "iconforge_temp_dir_bytes", "Bytes used by files under the temp directory."
+)
+EXECUTOR_QUEUE_DEPTH = REGISTRY.gauge(
+    "iconforge_executor_queue_depth", "Blocking jobs waiting for an executor thread.", ("lane",)
+)
+EXECUTOR_ACTIVE = REGISTRY.gauge(
+    "iconforge_executor_active",
+    "Blocking jobs currently running on an executor thread.",
+    ("lane",),
+)
+LIVE_PREVIEW_SESSIONS = REGISTRY.gauge(
+    "iconforge_live_preview_sessions", "Open live-preview WebSocket sessions."
+)
+HEAVY_WAITING = REGISTRY.gauge(
+    "iconforge_heavy_admission_waiting", "Heavy operations waiting for an admission slot."
+)
+CANCELLED_OPERATIONS = REGISTRY.counter(
+    "iconforge_cancelled_operations_total",
+    "Operations abandoned before completion.",
+    ("reason",),
+)
+ADMISSION_REJECTIONS = REGISTRY.counter(
+    "iconforge_admission_rejections_total", "Operations shed by admission control.", ("lane",)
+)
+WARMUP_READY = REGISTRY.gauge(
+    "iconforge_warmup_ready", "1 once model warm-up finished successfully, else 0."
+)
+STARTUP_SECONDS = REGISTRY.gauge(
+    "iconforge_startup_seconds", "Seconds from application import until warm-up finished."
+)
+PROCESS_UNIQUE_MEMORY = REGISTRY.gauge(
+    "iconforge_process_unique_memory_bytes", "Private (unshared) memory of this worker process."
+)
+PROCESS_SHARED_MEMORY = REGISTRY.gauge(
+    "iconforge_process_shared_memory_bytes",
+    "Memory of this worker process shared with other processes.",
+)
+
+
+class StageTimings:
+    """Per-request accumulator of time spent in each pipeline stage.
+
+    While tracemalloc is tracing it also keeps each stage's peak allocation
+    and the request's peak above the traced memory at its start.
+    """
+
+    def __init__(self) -> None:
+        self._durations: dict[str, float] = {}
+        self._peaks: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.base_bytes = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self.peak_bytes = 0
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._durations[stage] = self._durations.get(stage, 0.0) + seconds
+
+    def add_allocation(self, stage: str, peak_bytes: int, stage_base_bytes: int) -> None:
+        with self._lock:
+            self._peaks[stage] = max(self._peaks.get(stage, 0), peak_bytes)
+            if self.base_bytes is not None:
+                held = max(0, stage_base_bytes - self.base_bytes)
+                self.peak_bytes = max(self.peak_bytes, held + peak_bytes)
+
+    def allocation_peaks(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._peaks)
+
+    def as_milliseconds(self) -> dict[str, float]:
+        with self._lock:
+            return {stage: round(seconds * 1000, 3) for stage, seconds in self._durations.items()}
+
+    def server_timing(self, total_seconds: float | None = None) -> str:
+        """Render the timings as a ``Server-Timing`` header value."""
+
+        entries = [f"{stage};dur={ms}" for stage, ms in self.as_milliseconds().items()]
+        if total_seconds is not None:
+            entries.append(f"total;dur={round(total_seconds * 1000, 3)}")
+        return ", ".join(entries)
+
+
+stage_timings_ctx_var: ContextVar[StageTimings | None] = ContextVar(
+    "stage_timings", default=None
+)
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """Observe the wall time of the wrapped block under ``stage``.
+
+    Durations feed the global histogram and, when a request is being served,
+    the request's :class:`StageTimings`. While tracemalloc is tracing, the
+    stage's peak allocation is recorded the same way. tracemalloc keeps one
+    process-wide peak, so stages running concurrently (or nested) can
+    under-report each other; numbers are exact when stages run one at a time.
+    """
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage=stage)
+        timings = stage_timings_ctx_var.get()
+        if timings is not None:
+            timings.add(stage, elapsed)
+        if tracing and tracemalloc.is_tracing():
+            peak = max(0, tracemalloc.get_traced_memory()[1] - base)
+            STAGE_PEAK_ALLOCATION.observe(peak, stage=stage)
+            if timings is not None:
+                timings.add_allocation(stage, peak, base)
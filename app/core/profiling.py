@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import cProfile
+import pstats
+import sys
+import threading
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+from uuid import uuid4
+
+T = TypeVar("T")
+
+# Only one deterministic profiler can be attached to the event-loop thread.
+_loop_profiler_lock = threading.Lock()
+
+# From Python 3.12 cProfile runs on sys.monitoring: only one profiler can be
+# enabled per process, and it observes every thread. The loop profiler then
+# already covers executor work, and a second profiler would fail to start.
+PROCESS_WIDE_PROFILER = sys.version_info >= (3, 12)
+
+
+class RequestProfile:
+    """Collect cProfile data for one request across the loop and executor threads.
+
+    Executor work is profiled per call (profilers are per-thread), while the
+    event-loop portion is profiled only when no other request holds the loop
+    profiler, since it also observes whatever else the loop runs meanwhile.
+    With a process-wide profiler (Python 3.12+) only the loop profiler runs;
+    it records executor threads too, and a request that cannot take it is
+    not profiled.
+    """
+
+    def __init__(self) -> None:
+        self.profile_id = uuid4().hex
+        self._profiles: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._loop_profile: cProfile.Profile | None = None
+
+    def start_loop(self) -> bool:
+        if not _loop_profiler_lock.acquire(blocking=False):
+            return False
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiling tool (e.g. a debugger) is active
+            _loop_profiler_lock.release()
+            return False
+        self._loop_profile = profile
+        return True
+
+    def stop_loop(self) -> None:
+        if self._loop_profile is None:
+            return
+        self._loop_profile.disable()
+        self._add(self._loop_profile)
+        self._loop_profile = None
+        _loop_profiler_lock.release()
+
+    def call(self, func: Callable[..., T], *args: Any) -> T:
+        if PROCESS_WIDE_PROFILER:
+            return func(*args)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            self._add(profile)
+
+    def _add(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def dump(self, directory: Path, max_files: int) -> Path | None:
+        """Write merged stats as ``<profile_id>.prof`` and prune old profiles."""
+
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+
+        directory.mkdir(parents=True, exist_ok=True)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        path = directory / f"{self.profile_id}.prof"
+        stats.dump_stats(str(path))
+        prune_profiles(directory, max_files)
+        return path
+
+
+profile_ctx_var: ContextVar[RequestProfile | None] = ContextVar("request_profile", default=None)
+
+
+def prune_profiles(directory: Path, max_files: int) -> None:
+    """Keep only the ``max_files`` most recent profiles in ``directory``."""
+
+    files = sorted(
+        directory.glob("*.prof"), key=lambda path: path.stat().st_mtime, reverse=True
+    )
+    for stale in files[max(max_files, 0) :]:
+        stale.unlink(missing_ok=True)
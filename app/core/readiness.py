@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from enum import Enum
+from logging import getLogger
+from typing import Awaitable, Callable
+
+from app.core.metrics import STARTUP_SECONDS, WARMUP_READY
+
+logger = getLogger(__name__)
+
+# Taken when the application package is first imported, which is as close to
+# process start as the app itself can observe.
+IMPORTED_AT = time.perf_counter()
+
+
+class WarmupStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    READY = "ready"
+    FAILED = "failed"
+
+
+class Readiness:
+    """Track the background warm-up that gates ``/readyz``.
+
+    The server starts accepting connections immediately; heavy models are
+    loaded by :meth:`run` afterwards and readiness flips once they are warm.
+    A failed warm-up is retried with capped exponential backoff; the status
+    stays ``failed`` (not ready) until an attempt succeeds.
+    """
+
+    def __init__(self, started_at: float = IMPORTED_AT) -> None:
+        self.started_at = started_at
+        self.status = WarmupStatus.PENDING
+        self.error: str | None = None
+        self.warmup_seconds: float | None = None
+        self.startup_seconds: float | None = None
+        self.attempts = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.status is WarmupStatus.READY
+
+    def reset(self) -> None:
+        self.status = WarmupStatus.PENDING
+        self.error = None
+        self.warmup_seconds = None
+        self.startup_seconds = None
+        self.attempts = 0
+        WARMUP_READY.set(0)
+
+    async def run(
+        self,
+        warm_up: Callable[[], Awaitable[object]],
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 60.0,
+        max_attempts: int | None = None,
+    ) -> None:
+        """Await ``warm_up`` until it succeeds; failures never propagate.
+
+        The delay between attempts starts at ``retry_delay`` and doubles up to
+        ``max_retry_delay``. With ``max_attempts`` set, gives up after that
+        many failures and stays ``failed``.
+        """
+
+        self.status = WarmupStatus.RUNNING
+        delay = retry_delay
+        while True:
+            self.attempts += 1
+            start = time.perf_counter()
+            try:
+                await warm_up()
+                break
+            except Exception as exc:
+                logger.exception("Warm-up attempt %d failed", self.attempts)
+                self.status = WarmupStatus.FAILED
+                self.error = f"{type(exc).__name__}: {exc}"
+                WARMUP_READY.set(0)
+            if max_attempts is not None and self.attempts >= max_attempts:
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_retry_delay)
+        finished = time.perf_counter()
+        self.error = None
+        self.warmup_seconds = finished - start
+        self.startup_seconds = finished - self.started_at
+        self.status = WarmupStatus.READY
+        WARMUP_READY.set(1)
+        STARTUP_SECONDS.set(self.startup_seconds)
+        logger.info(
+            "Warm-up finished in %.3fs (%.3fs since import)",
+            self.warmup_seconds,
+            self.startup_seconds,
+        )
+
+    def as_dict(self) -> dict[str, object]:
+        return {
+            "status": self.status.value,
+            "error": self.error,
+            "attempts": self.attempts,
+            "warmup_seconds": self.warmup_seconds,
+            "startup_seconds": self.startup_seconds,
+        }
+
+
+readiness = Readiness()
@@ -1,51 +1,120 @@
 from __future__ import annotations
 
-import asyncio
+import math
+import threading
 import time
-from collections import deque
-from typing import Deque, Dict
+from typing import Callable, Dict
 
-from fastapi import Header, HTTPException, Request, status
+from fastapi import Header, HTTPException, status
+from starlette.requests import HTTPConnection
 
 from app.core.config import settings
 
 
-class SimpleRateLimiter:
-    """In-memory rate limiter with fixed window semantics."""
-
-    def __init__(self, limit: int, window_seconds: int = 60):
+class TokenBucketRateLimiter:
+    """Token-bucket rate limiter implemented with GCRA.
+
+    Each client costs one float (its theoretical arrival time) regardless of
+    traffic, keys are spread over striped locks so unrelated clients never
+    contend, and keys whose bucket has refilled are swept periodically.
+    A bucket holds ``limit`` tokens and refills fully over ``window_seconds``.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        window_seconds: float = 60,
+        stripes: int = 64,
+        sweep_interval_seconds: float = 60,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if limit <= 0:
+            raise ValueError("Rate limit must be positive")
         self.limit = limit
         self.window_seconds = window_seconds
-        self._events: Dict[str, Deque[float]] = {}
-        self._lock = asyncio.Lock()
-
-    async def allow(self, key: str) -> bool:
-        async with self._lock:
-            now = time.time()
-            events = self._events.setdefault(key, deque())
-            while events and now - events[0] >= self.window_seconds:
-                events.popleft()
-            if len(events) >= self.limit:
-                return False
-            events.append(now)
-            return True
-
-
-_rate_limiter = SimpleRateLimiter(limit=settings.rate_limit_per_minute)
-
-
-async def enforce_rate_limit(request: Request) -> None:
-    """Raise an HTTP 429 error when requests exceed the configured limit."""
+        self.emission_interval = window_seconds / limit
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._clock = clock
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._buckets: list[Dict[str, float]] = [{} for _ in range(stripes)]
+        self._sweep_lock = threading.Lock()
+        self._next_sweep = clock() + sweep_interval_seconds
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for buckets in self._buckets)
+
+    def consume(self, key: str, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens for ``key``.
+
+        Returns ``0.0`` when admitted, otherwise the seconds until enough
+        tokens will be available (``inf`` when ``cost`` exceeds the bucket).
+        """
+
+        if cost > self.limit:
+            return math.inf
+
+        now = self._clock()
+        index = hash(key) % len(self._locks)
+        increment = cost * self.emission_interval
+        with self._locks[index]:
+            buckets = self._buckets[index]
+            arrival = max(buckets.get(key, now), now)
+            new_arrival = arrival + increment
+            wait = new_arrival - now - self.window_seconds
+            if wait > 1e-9:  # tolerate float drift so exactly `limit` fit
+                return wait
+            buckets[key] = new_arrival
+
+        if now >= self._next_sweep:
+            self._sweep(now)
+        return 0.0
+
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        return self.consume(key, cost) == 0.0
+
+    def _sweep(self, now: float) -> None:
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = now + self.sweep_interval_seconds
+            for lock, buckets in zip(self._locks, self._buckets):
+                with lock:
+                    idle = [key for key, arrival in buckets.items() if arrival <= now]
+                    for key in idle:
+                        del buckets[key]
+        finally:
+            self._sweep_lock.release()
+
+
+_rate_limiter = TokenBucketRateLimiter(limit=settings.rate_limit_per_minute)
+
+
+def _route_cost(request: HTTPConnection) -> float:
+    route = request.scope.get("route")
+    path = getattr(route, "path", request.url.path)
+    if path.startswith(settings.api_prefix):
+        path = path[len(settings.api_prefix) :]
+    return settings.rate_limit_costs.get(path, 1.0)
+
+
+async def enforce_rate_limit(request: HTTPConnection) -> None:
+    """Raise an HTTP 429 error when requests exceed the configured limit.
+
+    WebSocket sessions are charged once, when they connect.
+    """
 
     if not settings.enable_rate_limit:
         return
 
     client_host = request.client.host if request.client else "anonymous"
-    allowed = await _rate_limiter.allow(client_host)
-    if not allowed:
+    wait = _rate_limiter.consume(client_host, _route_cost(request))
+    if wait:
+        if not math.isfinite(wait):
+            wait = _rate_limiter.window_seconds
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Rate limit exceeded. Please retry later.",
+            headers={"Retry-After": str(math.ceil(wait))},
         )
 
 
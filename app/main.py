@@ -1,6 +1,10 @@
 from __future__ import annotations
 
-import os
+import asyncio
+import hmac
+import random
+import time
+import tracemalloc
 from contextlib import asynccontextmanager
 from http import HTTPStatus
 from logging import getLogger
@@ -9,49 +13,194 @@ from uuid import uuid4
 from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import JSONResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.api.v1.router import api_router
+from app.core.cancellation import ClientDisconnectedError, DeadlineExceededError
 from app.core.config import settings
+from app.core.deps import get_image_pipeline, get_job_manager
 from app.core.logging import configure_logging, get_request_id, request_id_ctx_var
+from app.core.memory import update_process_memory_metrics
+from app.core.metrics import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    REQUEST_PEAK_ALLOCATION,
+    StageTimings,
+    stage_timings_ctx_var,
+)
+from app.core.profiling import RequestProfile, profile_ctx_var
+from app.core.readiness import readiness
 from app.core.security import enforce_rate_limit, verify_api_key
+from app.services.executor import Lane, OverloadedError, get_scheduler, run_stage
+from app.services.image_processing import ImagePipeline
+from app.services.storage import StorageQuotaExceededError
+
+
+async def _warm_up(pipeline: ImagePipeline) -> None:
+    async with get_scheduler().admit(Lane.HEAVY, shed=False):
+        await run_stage("warmup", pipeline.warm_up)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Application lifespan hook for model preload and setup."""
+    """Application lifespan hook for setup and background model warm-up.
 
-    if settings.enable_background_removal:
-        from rembg import new_session
+    The model is loaded after startup so the server answers ``/livez`` right
+    away; ``/readyz`` reports 503 until the warm-up inference has finished.
+    """
 
-        os.environ.setdefault("U2NET_HOME", str(settings.model_cache_dir))
-        settings.model_cache_dir.mkdir(parents=True, exist_ok=True)
-        new_session("u2net")
     configure_logging()
+    readiness.reset()
+    started_tracing = settings.enable_memory_tracing and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(settings.memory_tracing_frames)
+    warmup_task = None
+    if settings.enable_warmup:
+        pipeline = app.dependency_overrides.get(get_image_pipeline, get_image_pipeline)()
+        warmup_task = asyncio.create_task(
+            readiness.run(
+                lambda: _warm_up(pipeline),
+                retry_delay=settings.warmup_retry_initial_seconds,
+                max_retry_delay=settings.warmup_retry_max_seconds,
+            )
+        )
     yield
+    if warmup_task is not None:
+        warmup_task.cancel()
+        await asyncio.gather(warmup_task, return_exceptions=True)
+    await get_job_manager().shutdown()
+    if started_tracing:
+        tracemalloc.stop()
 
 
 app = FastAPI(title=settings.project_name, lifespan=lifespan)
 
 
-class RequestContextMiddleware(BaseHTTPMiddleware):
-    """Inject request ID into request state and logging context."""
+logger = getLogger(__name__)
+access_logger = getLogger("app.access")
+
+
+class RequestContextMiddleware:
+    """Inject request ID into request state and logging context.
+
+    Also collects per-stage timings for the request, returns them in a
+    ``Server-Timing`` header and writes them to the access log. Implemented
+    as plain ASGI so requests are not re-wrapped in an extra task and body
+    stream.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
 
-    async def dispatch(self, request: Request, call_next):  # type: ignore[override]
-        request_id = request.headers.get(settings.request_id_header) or str(uuid4())
-        request.state.request_id = request_id
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header_name = settings.request_id_header
+        request_id = Headers(scope=scope).get(header_name) or str(uuid4())
+        scope.setdefault("state", {})["request_id"] = request_id
         token = request_id_ctx_var.set(request_id)
+        timings = StageTimings()
+        timings_token = stage_timings_ctx_var.set(timings)
+        start = time.perf_counter()
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+
+        async def send_with_context(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers[header_name] = request_id
+                if settings.enable_server_timing:
+                    elapsed = time.perf_counter() - start
+                    headers["Server-Timing"] = timings.server_timing(elapsed)
+            await send(message)
+
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, send_with_context)
         finally:
+            fields = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "timings_ms": timings.as_milliseconds(),
+            }
+            if timings.base_bytes is not None:
+                REQUEST_PEAK_ALLOCATION.observe(timings.peak_bytes)
+                fields["peak_alloc_bytes"] = timings.peak_bytes
+                fields["stage_peak_alloc_bytes"] = timings.allocation_peaks()
+            if status_code >= 500 or random.random() < settings.access_log_sample_rate:
+                access_logger.info(
+                    "%s %s", scope["method"], scope["path"], extra={"fields": fields}
+                )
+            stage_timings_ctx_var.reset(timings_token)
             request_id_ctx_var.reset(token)
-        response.headers[settings.request_id_header] = request_id
-        return response
 
 
-logger = getLogger(__name__)
+class ProfilingMiddleware:
+    """Run requests carrying the profile header under cProfile.
+
+    Only active when profiling is enabled and an API key is configured; the
+    caller must present that key. The merged profile is written to
+    ``settings.profile_dir`` once the response has been sent, under the id
+    returned in ``X-Profile-ID``.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.enable_profiling:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if settings.profile_header not in headers:
+            await self.app(scope, receive, send)
+            return
+
+        api_key = headers.get("X-API-Key", "")
+        if settings.require_api_key is None or not hmac.compare_digest(
+            api_key.encode(), settings.require_api_key.encode()
+        ):
+            response = problem_response(
+                Request(scope),
+                status_code=status.HTTP_403_FORBIDDEN,
+                title="Forbidden",
+                detail="Profiling requires a valid API key.",
+            )
+            await response(scope, receive, send)
+            return
 
+        # Messages go straight through so streaming (SSE) responses are not
+        # held back; the profile id is known up front, and the file is
+        # written once the response has finished.
+        profile = RequestProfile()
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-ID"] = profile.profile_id
+            await send(message)
+
+        token = profile_ctx_var.set(profile)
+        profile.start_loop()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.stop_loop()
+            profile_ctx_var.reset(token)
+
+        path = await asyncio.to_thread(
+            profile.dump, settings.profile_dir, settings.profile_max_files
+        )
+        if path is not None:
+            logger.info("Stored request profile %s", path.name)
+
+
+app.add_middleware(ProfilingMiddleware)
 app.add_middleware(RequestContextMiddleware)
 
 app.add_middleware(
@@ -76,11 +225,59 @@ async def health_check() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/livez", tags=["health"])
+async def liveness_check() -> dict[str, str]:
+    """Report that the process is up and serving the event loop."""
+
+    return {"status": "ok"}
+
+
+@app.get("/readyz", tags=["health"])
+async def readiness_check() -> JSONResponse:
+    """Report whether warm-up finished and the interactive executor responds."""
+
+    body: dict[str, object] = {"warmup": readiness.as_dict()}
+    ready = readiness.ready or not settings.enable_warmup
+    try:
+        async with asyncio.timeout(settings.readiness_probe_timeout_seconds):
+            await run_stage("readiness_probe", lambda: None)
+        body["executor"] = "ok"
+    except TimeoutError:
+        body["executor"] = "unresponsive"
+        ready = False
+    body["status"] = "ready" if ready else "unavailable"
+    return JSONResponse(
+        body,
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@app.get(
+    "/metrics",
+    tags=["health"],
+    include_in_schema=False,
+    dependencies=[Depends(verify_api_key)],
+)
+async def metrics(pipeline: ImagePipeline = Depends(get_image_pipeline)) -> Response:
+    """Expose pipeline metrics in the Prometheus text format.
+
+    Requires the API key when ``require_api_key`` is configured.
+    """
+
+    if not settings.enable_metrics:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+
+    await asyncio.to_thread(pipeline.collect_metrics)
+    await asyncio.to_thread(update_process_memory_metrics)
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE_LATEST)
+
+
 def problem_response(
     request: Request,
     status_code: int,
     title: str,
     detail: str | None = None,
+    headers: dict[str, str] | None = None,
 ) -> JSONResponse:
     request_id = getattr(request.state, "request_id", None) or get_request_id()
     response = JSONResponse(
@@ -93,6 +290,7 @@ def problem_response(
             "instance": str(request.url),
             "request_id": request_id,
         },
+        headers=headers,
     )
     response.headers[settings.request_id_header] = request_id
     return response
@@ -110,9 +308,53 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> JSONRe
         status_code=exc.status_code,
         title=title,
         detail=exc.detail if isinstance(exc.detail, str) else str(exc.detail),
+        headers=exc.headers,
+    )
+
+
+@app.exception_handler(OverloadedError)
+async def overloaded_exception_handler(request: Request, exc: OverloadedError) -> JSONResponse:
+    return problem_response(
+        request,
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        title="Service Unavailable",
+        detail=str(exc),
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
+
+@app.exception_handler(StorageQuotaExceededError)
+async def storage_quota_exception_handler(
+    request: Request, exc: StorageQuotaExceededError
+) -> JSONResponse:
+    return problem_response(
+        request,
+        status_code=status.HTTP_507_INSUFFICIENT_STORAGE,
+        title="Insufficient Storage",
+        detail=str(exc),
     )
 
 
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exception_handler(
+    request: Request, exc: DeadlineExceededError
+) -> JSONResponse:
+    return problem_response(
+        request,
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        title="Deadline Exceeded",
+        detail=str(exc),
+    )
+
+
+@app.exception_handler(ClientDisconnectedError)
+async def client_disconnected_handler(
+    request: Request, exc: ClientDisconnectedError
+) -> JSONResponse:
+    # Nobody is listening any more; 499 mirrors the nginx convention for access logs.
+    return problem_response(request, status_code=499, title="Client Closed Request", detail=str(exc))
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(
     request: Request, exc: RequestValidationError
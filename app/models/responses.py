@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -19,3 +19,23 @@ class PreviewResponse(BaseModel):
     algorithm: str
     size: int
     image_base64: str
+
+
+class UploadJobResponse(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    stage: Optional[str] = Field(None, description="Pipeline stage currently running")
+    progress: float = Field(..., description="Fraction of upload stages completed (0-1)")
+    error: Optional[str] = None
+    material: Optional[MaterialResponse] = Field(
+        None, description="Processed material once the job has succeeded"
+    )
+
+
+class StorageUsageResponse(BaseModel):
+    materials: int
+    used_bytes: int = Field(..., description="Bytes charged to live materials")
+    reserved_bytes: int = Field(..., description="Bytes held for uploads still being written")
+    quota_bytes: Optional[int] = Field(None, description="Configured quota; null when unlimited")
+    available_bytes: Optional[int] = None
+    pinned_materials: int = Field(..., description="Materials in use and exempt from eviction")
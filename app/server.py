@@ -0,0 +1,231 @@
+"""Pre-fork launcher: ``python -m app.server --workers 8``.
+
+The master imports the application and, with several workers, loads the
+rembg model once before forking them. Model weights and other warm state are
+inherited copy-on-write, so every additional worker only costs its private
+memory. Shared sessions are single-threaded; a single worker loads its own
+model after the fork and keeps ``ICONFORGE_ONNX_INTRA_OP_THREADS``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+from logging import getLogger
+from typing import Sequence
+
+from app.core.config import settings
+from app.core.logging import configure_logging
+from app.core.memory import ProcessMemory, read_process_memory
+
+logger = getLogger("app.server")
+
+
+def check_onnx_threads(workers: int) -> str | None:
+    """Return why ``onnx_intra_op_threads`` cannot be used with ``workers``, if it cannot."""
+
+    threads = settings.onnx_intra_op_threads
+    if settings.enable_background_removal and workers > 1 and threads and threads > 1:
+        return (
+            f"ICONFORGE_ONNX_INTRA_OP_THREADS={threads} cannot be combined with "
+            f"{workers} pre-forked workers: ONNX Runtime thread pools do not survive fork"
+        )
+    return None
+
+
+def preload(workers: int = 1) -> None:
+    """Load everything the workers should share, then freeze it for the GC."""
+
+    from app.main import app  # noqa: F401 - import the whole application once
+    from app.services.image_processing import ImagePipeline
+
+    if settings.enable_background_removal and workers > 1:
+        # ONNX Runtime thread pools do not survive fork, so sessions shared by
+        # several workers must be single-threaded; the workers provide the
+        # parallelism. This is a hard rule: the session loader must not
+        # override it (``check_onnx_threads`` rejects the conflicting setting).
+        os.environ["OMP_NUM_THREADS"] = "1"
+        settings.onnx_intra_op_threads = 1
+        ImagePipeline(background_removal_enabled=True).warm_up()
+    else:
+        # Nothing to share with a single worker: it loads the model after the
+        # fork (in its lifespan warm-up), with the configured ONNX threads.
+        ImagePipeline(background_removal_enabled=False).warm_up()
+    # Keep the collector from touching (and so copying) the preloaded objects.
+    gc.collect()
+    gc.freeze()
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def memory_report(pids: Sequence[int]) -> list[ProcessMemory]:
+    return [usage for usage in map(read_process_memory, pids) if usage is not None]
+
+
+class Arbiter:
+    """Fork, supervise and stop the worker processes."""
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        workers: int,
+        report_interval: float,
+        shutdown_timeout: float,
+    ):
+        self.sock = sock
+        self.workers = workers
+        self.report_interval = report_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.children: set[int] = set()
+        self._stopping = False
+        self._report_requested = False
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGUSR1, self._request_report)
+        for _ in range(self.workers):
+            self._spawn()
+        next_report = time.monotonic() + self.report_interval
+        while not self._stopping:
+            self._reap(respawn=True)
+            now = time.monotonic()
+            if self._report_requested or (self.report_interval > 0 and now >= next_report):
+                self._report_requested = False
+                next_report = now + self.report_interval
+                self.log_memory()
+            time.sleep(0.2)
+        return self._stop()
+
+    def log_memory(self) -> list[ProcessMemory]:
+        report = memory_report(sorted(self.children))
+        master = read_process_memory()
+        for usage in report:
+            logger.info("Worker memory", extra={"fields": {"role": "worker", **usage.as_dict()}})
+        if master is not None:
+            logger.info("Master memory", extra={"fields": {"role": "master", **master.as_dict()}})
+        return report
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self.children.add(pid)
+            logger.info("Started worker %d", pid)
+            return
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+            _serve(self.sock)
+        except BaseException:
+            logger.exception("Worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _reap(self, respawn: bool) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            self.children.discard(pid)
+            if respawn and not self._stopping:
+                logger.warning("Worker %d exited with status %d; restarting", pid, status)
+                self._spawn()
+
+    def _stop(self) -> int:
+        for pid in list(self.children):
+            _signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap(respawn=False)
+            time.sleep(0.05)
+        for pid in list(self.children):
+            logger.warning("Worker %d did not stop in time; killing it", pid)
+            _signal(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.children.clear()
+        return 0
+
+    def _request_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _request_report(self, signum, frame) -> None:
+        self._report_requested = True
+
+
+def _signal(pid: int, signum: int) -> None:
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def _serve(sock: socket.socket) -> None:
+    import uvicorn
+
+    from app.main import app
+
+    config = uvicorn.Config(app, log_config=None, access_log=False, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.server", description=__doc__)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.workers)
+    parser.add_argument(
+        "--memory-report-interval",
+        type=float,
+        default=settings.memory_report_interval_seconds,
+        help="seconds between per-worker memory reports (0 disables; SIGUSR1 forces one)",
+    )
+    args = parser.parse_args(argv)
+    if not hasattr(os, "fork"):
+        parser.error("the pre-fork launcher requires a platform with os.fork()")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    problem = check_onnx_threads(args.workers)
+    if problem:
+        parser.error(problem)
+
+    configure_logging()
+    if args.workers > 1 and settings.state_backend == "memory":
+        logger.warning(
+            "Running %d workers with the in-memory state backend; materials are not "
+            "shared between workers. Set ICONFORGE_STATE_BACKEND=sqlite or redis.",
+            args.workers,
+        )
+    start = time.perf_counter()
+    preload(args.workers)
+    logger.info("Preloaded application in %.3fs", time.perf_counter() - start)
+    sock = bind_socket(args.host, args.port)
+    arbiter = Arbiter(
+        sock,
+        workers=args.workers,
+        report_interval=args.memory_report_interval,
+        shutdown_timeout=settings.worker_shutdown_timeout_seconds,
+    )
+    return arbiter.run()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
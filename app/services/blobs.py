@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+from uuid import uuid4
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """Content-addressed files under ``root``, reference-counted per owner.
+
+    Each blob lives at ``<root>/<aa>/<digest>`` and is kept as-is. References
+    are marker files in ``<digest>.refs/<owner>``, so every worker process that
+    shares the directory sees the same counts. Derived data (such as the rembg
+    matte) sits next to its source as ``<digest>.<kind>`` and goes away with
+    the last reference to the source.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def derived_path(self, digest: str, kind: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.{kind}"
+
+    def put(self, data: bytes, owner: str, digest: str | None = None) -> Path:
+        """Store ``data`` once and record that ``owner`` references it."""
+
+        digest = digest or content_digest(data)
+        path = self.path_for(digest)
+        with self._locked():
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _write_atomic(path, data)
+            refs = self._refs_dir(digest)
+            refs.mkdir(exist_ok=True)
+            (refs / owner).touch()
+        return path
+
+    def release(self, digest: str, owner: str) -> bool:
+        """Drop ``owner``'s reference; return ``True`` if the blob was deleted."""
+
+        refs = self._refs_dir(digest)
+        with self._locked():
+            (refs / owner).unlink(missing_ok=True)
+            if refs.exists() and any(refs.iterdir()):
+                return False
+            shutil.rmtree(refs, ignore_errors=True)
+            for path in self.path_for(digest).parent.glob(f"{digest}*"):
+                path.unlink(missing_ok=True)
+        return True
+
+    def ref_count(self, digest: str) -> int:
+        try:
+            return sum(1 for _ in self._refs_dir(digest).iterdir())
+        except FileNotFoundError:
+            return 0
+
+    def get(self, digest: str) -> bytes | None:
+        try:
+            return self.path_for(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def get_derived(self, digest: str, kind: str) -> bytes | None:
+        try:
+            return self.derived_path(digest, kind).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put_derived(self, digest: str, kind: str, data: bytes) -> Path | None:
+        """Store data derived from a referenced blob; skipped once it is gone."""
+
+        path = self.derived_path(digest, kind)
+        with self._locked():
+            if self.ref_count(digest) == 0:
+                return None
+            _write_atomic(path, data)
+        return path
+
+    def _refs_dir(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.refs"
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            try:
+                import fcntl
+            except ImportError:  # pragma: no cover - non-POSIX platforms
+                yield
+                return
+            with open(self.root / ".lock", "a+") as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class MemoryBlobStore:
+    """In-process counterpart of :class:`BlobStore` that never touches the disk.
+
+    Paths are only used as keys so records look the same in both modes.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._blobs: dict[str, bytes] = {}
+        self._refs: dict[str, set[str]] = {}
+        self._derived: dict[tuple[str, str], bytes] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, data: bytes, owner: str, digest: str | None = None) -> Path:
+        digest = digest or content_digest(data)
+        with self._lock:
+            self._blobs.setdefault(digest, data)
+            self._refs.setdefault(digest, set()).add(owner)
+        return self.path_for(digest)
+
+    def release(self, digest: str, owner: str) -> bool:
+        with self._lock:
+            refs = self._refs.get(digest, set())
+            refs.discard(owner)
+            if refs:
+                return False
+            self._refs.pop(digest, None)
+            self._blobs.pop(digest, None)
+            for key in [key for key in self._derived if key[0] == digest]:
+                del self._derived[key]
+        return True
+
+    def ref_count(self, digest: str) -> int:
+        with self._lock:
+            return len(self._refs.get(digest, ()))
+
+    def get(self, digest: str) -> bytes | None:
+        return self._blobs.get(digest)
+
+    def get_derived(self, digest: str, kind: str) -> bytes | None:
+        return self._derived.get((digest, kind))
+
+    def put_derived(self, digest: str, kind: str, data: bytes) -> Path | None:
+        with self._lock:
+            if not self._refs.get(digest):
+                return None
+            self._derived[(digest, kind)] = data
+        return self.root / digest[:2] / f"{digest}.{kind}"
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(map(len, self._blobs.values())) + sum(map(len, self._derived.values()))
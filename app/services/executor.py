@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Any, AsyncIterator, Callable, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import (
+    ADMISSION_REJECTIONS,
+    EXECUTOR_ACTIVE,
+    EXECUTOR_QUEUE_DEPTH,
+    HEAVY_WAITING,
+    track_stage,
+)
+from app.core.profiling import profile_ctx_var
+
+T = TypeVar("T")
+
+
+class Lane(str, Enum):
+    """Executor lanes; interactive work never queues behind heavy work."""
+
+    HEAVY = "heavy"
+    INTERACTIVE = "interactive"
+
+
+lane_ctx_var: contextvars.ContextVar[Lane] = contextvars.ContextVar(
+    "executor_lane", default=Lane.INTERACTIVE
+)
+
+
+class OverloadedError(RuntimeError):
+    """Raised when heavy work is shed because its queue is full."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class StageScheduler:
+    """Run blocking stages on per-lane thread pools with admission control.
+
+    Heavy operations (uploads) must be admitted first: at most
+    ``heavy_concurrency`` run at once and at most ``heavy_max_queue`` wait;
+    beyond that they are shed with :class:`OverloadedError`. Interactive work
+    (previews, forge) runs on its own pool so upload bursts cannot starve it.
+    """
+
+    def __init__(
+        self,
+        heavy_concurrency: int,
+        heavy_max_queue: int,
+        interactive_concurrency: int,
+        retry_after_seconds: float = 5,
+    ):
+        self.heavy_concurrency = heavy_concurrency
+        self.heavy_max_queue = heavy_max_queue
+        self.retry_after_seconds = retry_after_seconds
+        self._executors = {
+            Lane.HEAVY: ThreadPoolExecutor(heavy_concurrency, thread_name_prefix="iconforge-heavy"),
+            Lane.INTERACTIVE: ThreadPoolExecutor(
+                interactive_concurrency, thread_name_prefix="iconforge-interactive"
+            ),
+        }
+        self._heavy_waiting = 0
+        self._heavy_slots: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def heavy_waiting(self) -> int:
+        return self._heavy_waiting
+
+    def executor(self, lane: Lane) -> ThreadPoolExecutor:
+        return self._executors[lane]
+
+    def _slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._heavy_slots is None or self._loop is not loop:
+            self._loop = loop
+            self._heavy_slots = asyncio.Semaphore(self.heavy_concurrency)
+        return self._heavy_slots
+
+    @asynccontextmanager
+    async def admit(self, lane: Lane, shed: bool = True) -> AsyncIterator[None]:
+        """Admit one operation into ``lane`` and route its stages there.
+
+        With ``shed=False`` heavy work waits for a slot instead of being
+        rejected, which suits callers that already queue (upload jobs).
+        """
+
+        if lane is not Lane.HEAVY:
+            token = lane_ctx_var.set(lane)
+            try:
+                yield
+            finally:
+                lane_ctx_var.reset(token)
+            return
+
+        slots = self._slots()
+        if shed and slots.locked() and self._heavy_waiting >= self.heavy_max_queue:
+            ADMISSION_REJECTIONS.inc(lane=lane.value)
+            raise OverloadedError(
+                "Server is busy processing uploads. Please retry later.",
+                retry_after=self.retry_after_seconds,
+            )
+        self._heavy_waiting += 1
+        HEAVY_WAITING.set(self._heavy_waiting)
+        try:
+            await slots.acquire()
+        finally:
+            self._heavy_waiting -= 1
+            HEAVY_WAITING.set(self._heavy_waiting)
+        token = lane_ctx_var.set(lane)
+        try:
+            yield
+        finally:
+            lane_ctx_var.reset(token)
+            slots.release()
+
+    def shutdown(self) -> None:
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+@functools.lru_cache(maxsize=1)
+def get_scheduler() -> StageScheduler:
+    return StageScheduler(
+        heavy_concurrency=settings.heavy_max_concurrency,
+        heavy_max_queue=settings.heavy_max_queue,
+        interactive_concurrency=settings.interactive_max_concurrency,
+        retry_after_seconds=settings.overload_retry_after_seconds,
+    )
+
+
+async def run_stage(stage: str, func: Callable[..., T], *args: Any) -> T:
+    """Run blocking ``func`` on the current lane's pool and record it as ``stage``.
+
+    The queue-depth gauge counts jobs submitted but not yet picked up by a
+    thread; work cancelled before it starts is removed from the gauge too.
+    When the request is being profiled the call runs under its own profiler.
+    """
+
+    lane = lane_ctx_var.get().value
+    claim = threading.Lock()
+    EXECUTOR_QUEUE_DEPTH.inc(lane=lane)
+
+    def _call() -> T:
+        if claim.acquire(blocking=False):
+            EXECUTOR_QUEUE_DEPTH.dec(lane=lane)
+        EXECUTOR_ACTIVE.inc(lane=lane)
+        profile = profile_ctx_var.get()
+        try:
+            with track_stage(stage):
+                if profile is not None:
+                    return profile.call(func, *args)
+                return func(*args)
+        finally:
+            EXECUTOR_ACTIVE.dec(lane=lane)
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    executor = get_scheduler().executor(Lane(lane))
+    try:
+        return await loop.run_in_executor(executor, functools.partial(context.run, _call))
+    finally:
+        if claim.acquire(blocking=False):
+            EXECUTOR_QUEUE_DEPTH.dec(lane=lane)
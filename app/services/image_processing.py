@@ -2,26 +2,56 @@ from __future__ import annotations
 
 import asyncio
 import base64
+import hashlib
 import io
 import math
-import shutil
+import os
+import threading
 import time
-from dataclasses import dataclass
+from contextlib import contextmanager
 from enum import Enum
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Any, Callable, Iterator, Mapping, Sequence
 from uuid import uuid4
 
-import numpy as np
 from PIL import Image, UnidentifiedImageError
 
 from app.core.config import settings
+from app.core.metrics import (
+    CACHE_EVICTIONS,
+    CACHE_HITS,
+    CACHE_MISSES,
+    MATERIAL_EVICTIONS,
+    MATERIALS_LIVE,
+    STORAGE_QUOTA_BYTES,
+    STORAGE_USED_BYTES,
+    TEMP_DIR_BYTES,
+    track_stage,
+)
+from app.services import resampling
+from app.services.blobs import BlobStore, MemoryBlobStore, content_digest
+from app.services.executor import run_stage
+from app.services.material_store import DiskMaterialStore, MaterialStore
+from app.services.pack_ico import (
+    IcoEntry,
+    decode_entry,
+    is_ico,
+    largest_entry,
+    pack_ico,
+    parse_ico,
+)
+from app.services.perceptual import ImageHashes, PerceptualIndex, compute_hashes
+from app.services.state import MaterialRecord, MemoryStateBackend, OwnedCache, StateBackend
+from app.services.storage import MaterialNotFoundError, StorageManager, StorageUsage
 
 
 class ResampleAlgorithm(str, Enum):
     LANCZOS = "LANCZOS"
     NEAREST = "NEAREST"
     BILINEAR = "BILINEAR"
+    AREA = "AREA"
+    MITCHELL = "MITCHELL"
+    MAJORITY = "MAJORITY"
 
     @property
     def pillow_filter(self) -> int:
@@ -29,98 +59,355 @@ class ResampleAlgorithm(str, Enum):
             ResampleAlgorithm.LANCZOS: Image.LANCZOS,
             ResampleAlgorithm.NEAREST: Image.NEAREST,
             ResampleAlgorithm.BILINEAR: Image.BILINEAR,
+            ResampleAlgorithm.AREA: Image.BOX,
+            ResampleAlgorithm.MITCHELL: Image.BICUBIC,
+            ResampleAlgorithm.MAJORITY: Image.NEAREST,
         }
         return mapping[self]
 
+    @property
+    def kernel(self) -> str | None:
+        """Kernel name in :mod:`app.services.resampling`, or ``None`` to use Pillow."""
+
+        mapping = {
+            ResampleAlgorithm.LANCZOS: "lanczos",
+            ResampleAlgorithm.BILINEAR: "bilinear",
+            ResampleAlgorithm.AREA: "box",
+            ResampleAlgorithm.MITCHELL: "mitchell",
+            ResampleAlgorithm.MAJORITY: "majority",
+        }
+        return mapping.get(self)
+
 
-@dataclass
-class MaterialRecord:
-    material_id: str
-    original_path: Path
-    processed_path: Path
-    width: int
-    height: int
-    crop_box: Tuple[int, int, int, int]
-    padding: int
-    created_at: float
-    last_access: float
+MATTE_KIND = "matte.png"
 
+# Tags a cached ICO packed without an uploaded 16px icon (sha256-sized).
+ICO_SOURCE_TAG = bytes(32)
 
-class MaterialNotFoundError(KeyError):
-    """Raised when a material id cannot be resolved."""
+# Reads only rewrite a shared last_access once it is older than this share of the TTL.
+TOUCH_TTL_FRACTION = 0.05
+
+# Coarse upload phases reported to progress callbacks, in order.
+UPLOAD_STAGES = ("validate", "decode", "rembg", "smart_crop", "resize", "encode", "store")
 
 
 class ImagePipeline:
-    def __init__(self, background_removal_enabled: bool = True):
+    def __init__(
+        self,
+        background_removal_enabled: bool = True,
+        state: StateBackend | None = None,
+        store: MaterialStore | None = None,
+    ):
         self.background_removal_enabled = background_removal_enabled
-        self.materials: Dict[str, MaterialRecord] = {}
-        self.preview_cache: Dict[tuple[str, ResampleAlgorithm, int], bytes] = {}
-        self._rembg_session = None
-        settings.temp_dir.mkdir(parents=True, exist_ok=True)
-
-    async def process_upload(self, content: bytes, filename: str) -> MaterialRecord:
-        self._validate_size(content)
-        self._validate_image_type(content, filename)
-        self._evict_expired()
-        image = await asyncio.to_thread(self._load_image, content)
+        self.state = state or MemoryStateBackend()
+        # Process-local preview cache in front of the (possibly shared) state backend.
+        self.preview_cache: OwnedCache[tuple[str, ResampleAlgorithm, int], bytes] = OwnedCache()
+        # Base64 data URLs of the material (algo ``None``) and its previews.
+        self.data_url_cache: OwnedCache[tuple[str, ResampleAlgorithm | None, int], bytes] = (
+            OwnedCache()
+        )
+        self._rembg_sessions: list[Any] = []
+        self._rembg_turn = 0
+        self._rembg_lock = threading.Lock()
+        self.store = store or DiskMaterialStore(settings.temp_dir, settings.storage_quota_bytes)
+        self.storage = StorageManager(self.store.capacity_bytes)
+        self.perceptual_index = PerceptualIndex(settings.matte_reuse_index_size)
+
+    @property
+    def blobs(self) -> BlobStore | MemoryBlobStore:
+        return self.store.blobs
+
+    @property
+    def materials(self) -> Mapping[str, MaterialRecord]:
+        return self.state.materials
+
+    async def process_upload(
+        self,
+        content: bytes,
+        filename: str,
+        progress: Callable[[str], None] | None = None,
+    ) -> MaterialRecord:
+        report = progress or (lambda stage: None)
+
+        report("validate")
+        with track_stage("validate"):
+            self._validate_size(content)
+            self._validate_image_type(content, filename)
+        await run_stage("evict", self._evict_expired)
+        report("decode")
+        digest = content_digest(content)
+        image = await run_stage("decode", self._load_image, content)
+        new_matte: Image.Image | None = None
+        hashes: ImageHashes | None = None
         if self.background_removal_enabled:
-            image = await asyncio.to_thread(self._remove_background, image)
-        cropped, crop_box, padding = await asyncio.to_thread(smart_crop, image)
-        processed = cropped.resize((256, 256), Image.LANCZOS)
+            report("rembg")
+            matte = await run_stage("matte_read", self._read_matte, digest, image.size)
+            if matte is None and settings.enable_matte_reuse:
+                hashes = await run_stage("phash", compute_hashes, image)
+                matte = new_matte = await run_stage(
+                    "matte_reuse", self._reuse_matte, hashes, image.size
+                )
+                if matte is not None:
+                    hashes = None  # only index mattes rembg actually computed
+            if matte is None:
+                matte = new_matte = await run_stage("rembg", self._compute_matte, image)
+            image = await run_stage("apply_matte", apply_matte, image, matte)
+        report("smart_crop")
+        cropped, crop_box, padding = await run_stage("smart_crop", smart_crop, image)
+        report("resize")
+        processed = await run_stage("resize", cropped.resize, (256, 256), Image.LANCZOS)
 
         material_id = uuid4().hex
         material_dir = settings.temp_dir / material_id
-        material_dir.mkdir(parents=True, exist_ok=True)
+        self.store.prepare_dir(material_dir)
 
-        original_path = material_dir / Path(filename).name
         processed_path = material_dir / "processed_256.png"
+        blob_put: asyncio.Future[Path] | None = None
+        reserved = 0
 
-        await asyncio.to_thread(self._save_image, image, original_path)
-        await asyncio.to_thread(self._save_image, processed, processed_path)
-
-        record = MaterialRecord(
-            material_id=material_id,
-            original_path=original_path,
-            processed_path=processed_path,
-            width=processed.width,
-            height=processed.height,
-            crop_box=crop_box,
-            padding=padding,
-            created_at=time.time(),
-            last_access=time.time(),
-        )
-        self.materials[material_id] = record
+        try:
+            report("encode")
+            processed_bytes = await run_stage("png_encode", encode_png, processed)
+            raw_bytes = processed.tobytes()
+            matte_bytes = b""
+            if new_matte is not None:
+                matte_bytes = await run_stage("png_encode", encode_matte, new_matte)
+            size_bytes = len(content) + len(processed_bytes) + len(raw_bytes) + len(matte_bytes)
+            report("store")
+            victims = self.storage.reserve(self.state.records_by_last_access(), size_bytes)
+            reserved = size_bytes
+            if victims:
+                await run_stage("quota_evict", self._evict_for_quota, victims)
+            # The upload is kept verbatim; identical uploads share one blob. The put
+            # is shielded so a cancelled upload can still release it once it lands.
+            blob_put = asyncio.ensure_future(
+                run_stage("disk_write", self.blobs.put, content, material_id, digest)
+            )
+            original_path = await asyncio.shield(blob_put)
+            await run_stage("disk_write", self._write_bytes, processed_path, processed_bytes)
+            await run_stage(
+                "disk_write", self._write_bytes, processed_path.with_suffix(".rgba"), raw_bytes
+            )
+            if matte_bytes:
+                await run_stage("disk_write", self._store_matte, digest, matte_bytes)
+            if hashes is not None:
+                self.perceptual_index.add(digest, hashes)
+
+            record = MaterialRecord(
+                material_id=material_id,
+                original_path=original_path,
+                processed_path=processed_path,
+                width=processed.width,
+                height=processed.height,
+                crop_box=crop_box,
+                padding=padding,
+                created_at=time.time(),
+                last_access=time.time(),
+                size_bytes=size_bytes,
+                source_icon_sizes=icon_sizes(content),
+            )
+            self.state.put_material(record)
+        except BaseException:
+            # Cancelled or failed mid-write: never leave a half-written material behind.
+            self.store.remove_dir(material_dir)
+            if blob_put is not None:
+                blob_put.add_done_callback(
+                    lambda put: self._release_blob(put, digest, material_id)
+                )
+            raise
+        finally:
+            if reserved:
+                self.storage.release(reserved)
         return record
 
     async def get_material(self, material_id: str) -> MaterialRecord:
+        # The state backend may be SQLite or Redis: keep its I/O off the loop.
+        record = await run_stage("state_read", self._open_material, material_id)
+        if record is None:
+            self._drop_local_previews(material_id)
+            raise MaterialNotFoundError(material_id)
+        return record
+
+    def _open_material(self, material_id: str) -> MaterialRecord | None:
+        """Sweep expired materials, then look up and touch ``material_id``."""
+
         self._evict_expired()
-        try:
-            record = self.materials[material_id]
-        except KeyError as exc:  # pragma: no cover - defensive
-            raise MaterialNotFoundError(material_id) from exc
-        record.last_access = time.time()
+        record = self.state.get_material(material_id)
+        if record is None:
+            return None
+        now, previous = time.time(), record.last_access
+        record.last_access = now
+        # Shared backends only need last_access to within a fraction of the
+        # TTL, so most reads skip the write; process-local state stays exact.
+        stale = now - previous >= settings.material_ttl_seconds * TOUCH_TTL_FRACTION
+        if stale or not self.state.shared:
+            self.state.touch_material(material_id, now)
         return record
 
+    @contextmanager
+    def lease(self, material_id: str) -> Iterator[MaterialRecord]:
+        """Pin ``material_id`` so no eviction deletes its files until the block exits.
+
+        Raises :class:`MaterialNotFoundError` if the material is gone or is
+        being deleted right now. Cache hits skip this; only paths that touch
+        the material's files or fill its caches take a lease.
+        """
+
+        with self.storage.pin(material_id):
+            record = self.state.get_material(material_id)
+            if record is None:
+                raise MaterialNotFoundError(material_id)
+            yield record
+
     async def get_material_bytes(self, material_id: str) -> bytes:
+        await self.get_material(material_id)
+        with self.lease(material_id) as record:
+            return await run_stage("disk_read", self._read_bytes, record.processed_path)
+
+    async def get_material_data_url(self, material_id: str) -> bytes:
+        """Return the 256px PNG as an ASCII ``data:`` URL, encoded once per material."""
+
         record = await self.get_material(material_id)
-        return await asyncio.to_thread(self._read_bytes, record.processed_path)
+        key = (material_id, None, record.width)
+        with track_stage("cache_lookup"):
+            cached = self.data_url_cache.get(key)
+        if cached is not None:
+            CACHE_HITS.inc(cache="data_url")
+            return cached
+        CACHE_MISSES.inc(cache="data_url")
+        with self.lease(material_id):
+            data = await run_stage("disk_read", self._read_bytes, record.processed_path)
+            encoded = await run_stage("base64_encode", encode_data_url, data)
+            self.data_url_cache[key] = encoded
+            self._charge(material_id, ("data_url", *key[1:]), encoded)
+        return encoded
+
+    async def get_preview_data_url(
+        self, material_id: str, algo: ResampleAlgorithm, size: int
+    ) -> bytes:
+        await self.get_material(material_id)
+        key = (material_id, algo, size)
+        with track_stage("cache_lookup"):
+            cached = self.data_url_cache.get(key)
+        if cached is not None:
+            CACHE_HITS.inc(cache="data_url")
+            return cached
+        CACHE_MISSES.inc(cache="data_url")
+        with self.lease(material_id):
+            data = await self.get_preview_bytes(material_id, algo, size)
+            encoded = await run_stage("base64_encode", encode_data_url, data)
+            self.data_url_cache[key] = encoded
+            self._charge(material_id, ("data_url", *key[1:]), encoded)
+        return encoded
 
     async def get_preview_bytes(
         self, material_id: str, algo: ResampleAlgorithm, size: int
     ) -> bytes:
-        cache_key = (material_id, algo, size)
-        if cache_key in self.preview_cache:
-            return self.preview_cache[cache_key]
+        previews = await self.get_previews(material_id, algo, (size,))
+        return previews[size]
+
+    async def get_previews(
+        self, material_id: str, algo: ResampleAlgorithm, sizes: Sequence[int]
+    ) -> dict[int, bytes]:
+        """Return PNG previews for ``sizes``, resizing all cache misses in one pass."""
+
+        await self.get_material(material_id)
+        previews: dict[int, bytes] = {}
+        with track_stage("cache_lookup"):
+            for size in sizes:
+                cache_key = (material_id, algo, size)
+                cached = self.preview_cache.get(cache_key)
+                if cached is None and self.state.shared:
+                    cached = self.state.get_cache("preview", f"{material_id}:{algo.value}:{size}")
+                    if cached is not None:
+                        self.preview_cache[cache_key] = cached
+                if cached is not None:
+                    previews[size] = cached
+        missing = [size for size in sizes if size not in previews]
+        if previews:
+            CACHE_HITS.inc(len(previews), cache="preview")
+        if not missing:
+            return previews
+        CACHE_MISSES.inc(len(missing), cache="preview")
+
+        with self.lease(material_id) as record:
+            processed = await self.load_frame(record)
+            resized = await run_stage("resize", resize_images, processed, missing, algo)
+            for size in missing:
+                data = await run_stage("png_encode", encode_png, resized[size])
+                self.preview_cache[(material_id, algo, size)] = data
+                self._charge(material_id, ("preview", algo, size), data)
+                if self.state.shared:
+                    self.state.set_cache(
+                        "preview", f"{material_id}:{algo.value}:{size}", data, owner=material_id
+                    )
+                previews[size] = data
+        return previews
+
+    async def forge_icon(
+        self, material_id: str, mid_algo: ResampleAlgorithm, tiny_bytes: bytes | None
+    ) -> bytes:
+        """Pack the material, its mid-size previews and a 16px icon into an ICO.
+
+        For materials imported from an ``.ico``, every source entry whose size
+        is not regenerated is copied over verbatim, including the 16px one
+        when ``tiny_bytes`` is ``None``.
+        """
+
+        await self.get_material(material_id)
+        # One entry per material and algorithm, tagged with the 16px icon it
+        # was packed with: forging with another tiny icon replaces it, so
+        # hand-edited icons cannot pile up entries in the shared state.
+        tiny_tag = ICO_SOURCE_TAG if tiny_bytes is None else hashlib.sha256(tiny_bytes).digest()
+        cache_key = f"{material_id}:{mid_algo.value}"
+        with track_stage("cache_lookup"):
+            cached = self.state.get_cache("ico", cache_key)
+        if cached is not None and cached[: len(tiny_tag)] == tiny_tag:
+            CACHE_HITS.inc(cache="ico")
+            return cached[len(tiny_tag) :]
+        CACHE_MISSES.inc(cache="ico")
+
+        with self.lease(material_id) as record:
+            base_bytes = await self.get_material_bytes(material_id)
+            previews = await self.get_previews(material_id, mid_algo, (48, 32))
+            keep = await run_stage("ico_parse", self._source_icon_entries, record)
+            icons = {256: base_bytes, 48: previews[48], 32: previews[32]}
+            if tiny_bytes is not None:
+                icons[16] = tiny_bytes
+            ico_bytes = await run_stage("pack_ico", pack_ico, icons, keep)
+            entry = tiny_tag + ico_bytes
+            self.state.set_cache("ico", cache_key, entry, owner=material_id)
+            if not self.state.shared:
+                self._charge(material_id, ("ico", mid_algo), entry)
+        return ico_bytes
+
+    async def load_frame(self, record: MaterialRecord) -> Image.Image:
+        """Return the 256px frame, memory-mapped from its raw sidecar if possible.
+
+        Materials written before the sidecar existed (or whose sidecar is
+        missing or truncated) fall back to decoding the PNG.
+        """
+
+        frame = await run_stage(
+            "mmap_read", self.store.open_frame, record.raw_path, record.width, record.height
+        )
+        if frame is not None:
+            return frame
+        raw = await run_stage("disk_read", self._read_bytes, record.processed_path)
+        return await run_stage("decode", self._load_image, raw)
 
-        record = await self.get_material(material_id)
-        processed = await asyncio.to_thread(Image.open, record.processed_path)
-        preview = await asyncio.to_thread(resize_image, processed, size, algo)
+    def storage_usage(self) -> StorageUsage:
+        return self.storage.usage(self.state.records_by_last_access())
 
-        buffer = io.BytesIO()
-        await asyncio.to_thread(preview.save, buffer, format="PNG")
-        data = buffer.getvalue()
-        self.preview_cache[cache_key] = data
-        return data
+    def collect_metrics(self) -> None:
+        """Refresh gauges that are sampled at scrape time."""
+
+        usage = self.storage_usage()
+        MATERIALS_LIVE.set(usage.materials)
+        STORAGE_USED_BYTES.set(usage.used_bytes)
+        if usage.quota_bytes is not None:
+            STORAGE_QUOTA_BYTES.set(usage.quota_bytes)
+        TEMP_DIR_BYTES.set(self.store.usage_bytes())
 
     def _validate_size(self, content: bytes) -> None:
         if len(content) > settings.max_upload_size_bytes:
@@ -132,12 +419,17 @@ class ImagePipeline:
             allowed = ", ".join(settings.allowed_image_extensions)
             raise ValueError(f"Unsupported file extension. Allowed: {allowed}")
 
-        try:
-            with Image.open(io.BytesIO(content)) as image:
-                image.verify()
-                detected_format = image.format
-        except UnidentifiedImageError as exc:
-            raise ValueError("Uploaded file is not a valid image") from exc
+        if is_ico(content):
+            # Only the directory is checked here; entries are decoded lazily.
+            parse_ico(content)
+            detected_format = "ICO"
+        else:
+            try:
+                with Image.open(io.BytesIO(content)) as image:
+                    image.verify()
+                    detected_format = image.format
+            except UnidentifiedImageError as exc:
+                raise ValueError("Uploaded file is not a valid image") from exc
 
         if detected_format not in settings.allowed_image_formats:
             allowed = ", ".join(settings.allowed_image_formats)
@@ -148,6 +440,7 @@ class ImagePipeline:
             ".jpg": "JPEG",
             ".jpeg": "JPEG",
             ".webp": "WEBP",
+            ".ico": "ICO",
         }.get(extension)
 
         if expected_format and detected_format != expected_format:
@@ -156,61 +449,213 @@ class ImagePipeline:
             )
 
     def _load_image(self, content: bytes) -> Image.Image:
+        if is_ico(content):
+            return decode_entry(largest_entry(parse_ico(content)))
         image = Image.open(io.BytesIO(content))
         return image.convert("RGBA")
 
+    def prepare_image(
+        self,
+        content: bytes,
+        filename: str,
+        stage: Callable[..., Any] | None = None,
+    ) -> Image.Image:
+        """Validate and decode one image and remove its background, synchronously.
+
+        The blocking counterpart of the first upload stages, for callers
+        without an event loop such as the batch CLI. Each step runs as
+        ``stage(name, func, *args)`` so callers can time it; by default the
+        steps are called directly. Invalid input raises ``ValueError``.
+        """
+
+        run = stage or (lambda name, func, *args: func(*args))
+        run("validate", self._validate_size, content)
+        run("validate", self._validate_image_type, content, filename)
+        image = run("decode", self._load_image, content)
+        if self.background_removal_enabled:
+            matte = run("rembg", self._compute_matte, image)
+            image = run("apply_matte", apply_matte, image, matte)
+        return image
+
+    def warm_up(self) -> None:
+        """Load heavy modules and run one dummy pass so first requests are fast."""
+
+        dummy = Image.new("RGBA", (64, 64), (255, 255, 255, 255))
+        dummy.paste((0, 0, 0, 255), (16, 16, 48, 48))
+        if self.background_removal_enabled:
+            self._remove_background(dummy)
+        smart_crop(dummy)
+
+    def _get_rembg_session(self):
+        """Hand out the ``settings.rembg_sessions`` sessions in turn.
+
+        ONNX Runtime sessions are safe to share between threads, so callers
+        never wait for one; more sessions only spread concurrent inferences
+        over more intra-op thread pools.
+        """
+
+        with self._rembg_lock:
+            if not self._rembg_sessions:
+                self._rembg_sessions = [
+                    load_rembg_session(index=index)
+                    for index in range(max(1, settings.rembg_sessions))
+                ]
+            session = self._rembg_sessions[self._rembg_turn % len(self._rembg_sessions)]
+            self._rembg_turn += 1
+            return session
+
     def _remove_background(self, image: Image.Image) -> Image.Image:
-        from rembg import new_session, remove
+        return apply_matte(image, self._compute_matte(image))
+
+    def _compute_matte(self, image: Image.Image) -> Image.Image:
+        """Run rembg and return its foreground mask as an ``L`` image."""
+
+        from rembg import remove
+
+        session = self._get_rembg_session()
+        # Passing the image itself skips a PNG encode/decode round trip.
+        result = remove(image, session=session, only_mask=True)
+        return result if result.mode == "L" else result.convert("L")
+
+    def _read_matte(self, digest: str, size: tuple[int, int]) -> Image.Image | None:
+        matte = self._load_matte(digest)
+        if matte is None or matte.size != size:
+            return None
+        return matte
+
+    def _load_matte(self, digest: str) -> Image.Image | None:
+        data = self.blobs.get_derived(digest, MATTE_KIND)
+        if data is None:
+            return None
+        try:
+            matte = Image.open(io.BytesIO(data))
+            matte.load()
+        except (OSError, UnidentifiedImageError):
+            return None
+        return matte if matte.mode == "L" else None
 
-        if not self._rembg_session:
-            self._rembg_session = new_session("u2net")
-        buffer = io.BytesIO()
-        image.save(buffer, format="PNG")
-        result = remove(buffer.getvalue(), session=self._rembg_session)
-        return Image.open(io.BytesIO(result)).convert("RGBA")
+    def _reuse_matte(self, hashes: ImageHashes, size: tuple[int, int]) -> Image.Image | None:
+        """Rescale the matte of a perceptually identical earlier upload, if any.
 
-    def _save_image(self, image: Image.Image, path: Path) -> None:
-        image.save(path, format="PNG")
+        Entries whose matte has since been evicted are dropped from the index.
+        """
+
+        candidates = self.perceptual_index.closest(hashes, settings.matte_reuse_max_distance)
+        for digest in candidates:
+            matte = self._load_matte(digest)
+            if matte is None:
+                self.perceptual_index.discard(digest)
+                continue
+            CACHE_HITS.inc(cache="perceptual_matte")
+            return matte if matte.size == size else matte.resize(size, Image.BILINEAR)
+        CACHE_MISSES.inc(cache="perceptual_matte")
+        return None
+
+    def _store_matte(self, digest: str, matte_bytes: bytes) -> None:
+        self.blobs.put_derived(digest, MATTE_KIND, matte_bytes)
+
+    def _charge(self, material_id: str, key: tuple[Any, ...], data: bytes) -> None:
+        """Count bytes cached in process memory against the memory store's cap."""
+
+        if self.store.in_memory:
+            self.storage.charge(material_id, key, len(data))
+
+    def _write_bytes(self, path: Path, data: bytes) -> None:
+        self.store.write(path, data)
+
+    def _release_blob(self, put: asyncio.Future[Path], digest: str, owner: str) -> None:
+        """Drop ``owner``'s reference once its (possibly still running) put is done."""
+
+        if not put.cancelled():
+            put.exception()  # retrieved so a failed put is not reported as unhandled
+        self.blobs.release(digest, owner)
 
     def _read_bytes(self, path: Path) -> bytes:
-        return path.read_bytes()
+        return self.store.read(path)
 
-    def _evict_expired(self) -> None:
-        now = time.time()
-        expired = [
-            material_id
-            for material_id, record in self.materials.items()
-            if now - record.last_access > settings.material_ttl_seconds
-        ]
-        for material_id in expired:
-            self._delete_material(material_id)
-
-    def _delete_material(self, material_id: str) -> None:
-        record = self.materials.pop(material_id, None)
-        if not record:
-            return
-
-        self.preview_cache = {
-            key: value for key, value in self.preview_cache.items() if key[0] != material_id
-        }
+    def _source_icon_entries(self, record: MaterialRecord) -> tuple[IcoEntry, ...]:
+        if not record.source_icon_sizes:
+            return ()
+        source = self.blobs.get(record.original_path.name)
+        return parse_ico(source) if source is not None else ()
 
-        material_dir = record.original_path.parent
-        shutil.rmtree(material_dir, ignore_errors=True)
+    def _evict_expired(self) -> None:
+        cutoff = time.time() - settings.material_ttl_seconds
+        with self.state.eviction_lock() as acquired:
+            if not acquired:
+                return
+            for material_id in self.state.expired_material_ids(cutoff):
+                if self._delete_material(material_id):
+                    MATERIAL_EVICTIONS.inc(reason="expired")
+
+    def _evict_for_quota(self, material_ids: list[str]) -> None:
+        for material_id in material_ids:
+            if self._delete_material(material_id):
+                MATERIAL_EVICTIONS.inc(reason="quota")
+
+    def _delete_material(self, material_id: str) -> bool:
+        """Delete an unpinned material; ``False`` if it is in use or already gone."""
+
+        with self.storage.evicting(material_id) as claimed:
+            if not claimed:
+                return False
+            record = self.state.pop_material(material_id)
+            self._drop_local_previews(material_id)
+            self.storage.discharge(material_id)
+            if not record:
+                return False
+
+            self.store.remove_dir(record.processed_path.parent)
+            if record.original_path.parent.parent == self.blobs.root:
+                self.blobs.release(record.original_path.name, material_id)
+        return True
+
+    def _drop_local_previews(self, material_id: str) -> None:
+        dropped = self.preview_cache.drop_owner(material_id)
+        if dropped:
+            CACHE_EVICTIONS.inc(dropped, cache="preview")
+        self.data_url_cache.drop_owner(material_id)
+
+
+_rembg_sessions: dict[tuple[str, int], Any] = {}
+_rembg_sessions_lock = threading.Lock()
+
+
+def load_rembg_session(model_name: str = "u2net", index: int = 0) -> Any:
+    """Return this process's ``index``-th rembg session for ``model_name``, creating it once.
+
+    Sessions are shared by every pipeline in the process. A session created
+    before ``fork`` is inherited by the children, so pre-forked workers map
+    the same weight pages instead of loading their own copy.
+    """
+
+    with _rembg_sessions_lock:
+        session = _rembg_sessions.get((model_name, index))
+        if session is None:
+            from rembg import new_session
+
+            os.environ.setdefault("U2NET_HOME", str(settings.model_cache_dir))
+            if settings.onnx_intra_op_threads:
+                # rembg sizes the session's ONNX thread pools from OMP_NUM_THREADS.
+                os.environ["OMP_NUM_THREADS"] = str(settings.onnx_intra_op_threads)
+            settings.model_cache_dir.mkdir(parents=True, exist_ok=True)
+            session = _rembg_sessions[(model_name, index)] = new_session(model_name)
+        return session
 
 
 def smart_crop(image: Image.Image) -> tuple[Image.Image, tuple[int, int, int, int], int]:
     """Crop to non-transparent content, recentre, and add 10% padding."""
 
-    array = np.array(image)
-    alpha = array[:, :, 3]
-    non_zero = np.argwhere(alpha > 0)
+    # Pillow scans the alpha band in C; no full-frame array or per-pixel
+    # coordinate list is materialised.
+    bbox = image.getchannel("A").getbbox()
 
-    if non_zero.size == 0:
+    if bbox is None:
         padding = max(2, math.ceil(max(image.size) * 0.1))
         box = (0, 0, image.width, image.height)
         return image, box, padding
 
-    (ymin, xmin), (ymax, xmax) = non_zero.min(axis=0), non_zero.max(axis=0)
+    xmin, ymin, xmax, ymax = bbox[0], bbox[1], bbox[2] - 1, bbox[3] - 1
     padding = max(2, math.ceil(max(xmax - xmin + 1, ymax - ymin + 1) * 0.10))
 
     left = max(0, xmin - padding)
@@ -234,9 +679,56 @@ def resize_image(
 ) -> Image.Image:
     """Resize image to the requested size using the specified algorithm."""
 
-    return image.resize((size, size), algo.pillow_filter)
+    return resize_images(image, (size,), algo)[size]
+
+
+def resize_images(
+    image: Image.Image, sizes: Sequence[int], algo: ResampleAlgorithm
+) -> dict[int, Image.Image]:
+    """Resize ``image`` to every square size in ``sizes``.
+
+    Filtering kernels run on the NumPy engine, which shares one
+    premultiplied source and cached weights across sizes; nearest neighbour
+    stays on Pillow, which is faster for a pure pixel pick.
+    """
+
+    if algo.kernel is None:
+        return {size: image.resize((size, size), algo.pillow_filter) for size in sizes}
+    return resampling.resize_many(image, sizes, algo.kernel)
+
+
+def apply_matte(image: Image.Image, matte: Image.Image) -> Image.Image:
+    """Cut ``image`` out with an ``L`` mask, matching rembg's naive cutout."""
+
+    empty = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    return Image.composite(image, empty, matte)
+
+
+def encode_png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def encode_matte(matte: Image.Image) -> bytes:
+    # Masks are mostly flat, so a fast zlib level keeps this cheap.
+    buffer = io.BytesIO()
+    matte.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def icon_sizes(content: bytes) -> tuple[int, ...]:
+    """Square entry sizes of an ``.ico`` upload, largest first; ``()`` otherwise."""
+
+    if not is_ico(content):
+        return ()
+    sizes = {entry.square_size for entry in parse_ico(content)} - {None}
+    return tuple(sorted(sizes, reverse=True))
 
 
 def encode_image_base64(image_bytes: bytes) -> str:
-    encoded = base64.b64encode(image_bytes).decode("ascii")
-    return f"data:image/png;base64,{encoded}"
+    return encode_data_url(image_bytes).decode("ascii")
+
+
+def encode_data_url(image_bytes: bytes) -> bytes:
+    return b"data:image/png;base64," + base64.b64encode(image_bytes)
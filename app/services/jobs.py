@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from dataclasses import asdict, dataclass
+from enum import Enum
+from logging import getLogger
+from typing import TYPE_CHECKING
+from uuid import uuid4
+
+from app.core.config import settings
+from app.core.metrics import CANCELLED_OPERATIONS
+from app.services.executor import Lane, get_scheduler
+from app.services.image_processing import UPLOAD_STAGES
+from app.services.storage import StorageQuotaExceededError
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from app.services.image_processing import ImagePipeline
+
+logger = getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    @property
+    def finished(self) -> bool:
+        return self in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+
+@dataclass
+class UploadJob:
+    job_id: str
+    status: JobStatus
+    filename: str
+    stage: str | None
+    progress: float
+    material_id: str | None
+    error: str | None
+    created_at: float
+    updated_at: float
+
+    def to_json(self) -> bytes:
+        payload = asdict(self)
+        payload["status"] = self.status.value
+        return json.dumps(payload).encode()
+
+    @classmethod
+    def from_json(cls, raw: bytes) -> "UploadJob":
+        payload = json.loads(raw)
+        payload["status"] = JobStatus(payload["status"])
+        return cls(**payload)
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when no more upload jobs can be queued."""
+
+
+class JobManager:
+    """Run uploads on background workers and publish their progress.
+
+    Job snapshots are written to the pipeline's state backend so any worker
+    process sharing that backend can answer status requests. Each write
+    renews the snapshot's TTL, so it outlives the job by ``ttl_seconds`` even
+    if this process exits. Local waiters are woken on every update; remote
+    ones fall back to polling.
+    """
+
+    def __init__(self, workers: int, max_queue: int, ttl_seconds: float):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.ttl_seconds = ttl_seconds
+        self._queue: asyncio.Queue[tuple[ImagePipeline, UploadJob, bytes]] | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._updates: dict[str, asyncio.Event] = {}
+
+    def _ensure_workers(self) -> asyncio.Queue[tuple[ImagePipeline, UploadJob, bytes]]:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._updates = {}
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        return self._queue
+
+    async def submit(self, pipeline: ImagePipeline, content: bytes, filename: str) -> UploadJob:
+        queue = self._ensure_workers()
+        now = time.time()
+        job = UploadJob(
+            job_id=uuid4().hex,
+            status=JobStatus.QUEUED,
+            filename=filename,
+            stage=None,
+            progress=0.0,
+            material_id=None,
+            error=None,
+            created_at=now,
+            updated_at=now,
+        )
+        try:
+            queue.put_nowait((pipeline, job, content))
+        except asyncio.QueueFull as exc:
+            raise JobQueueFullError("Upload queue is full. Please retry later.") from exc
+        self._publish(pipeline, job)
+        return job
+
+    def get(self, pipeline: ImagePipeline, job_id: str) -> UploadJob | None:
+        raw = pipeline.state.get_cache("job", job_id)
+        return UploadJob.from_json(raw) if raw is not None else None
+
+    async def wait_for_update(self, job_id: str, timeout: float) -> None:
+        """Wait until ``job_id`` changes locally or ``timeout`` elapses."""
+
+        event = self._updates.get(job_id)
+        if event is None:
+            await asyncio.sleep(timeout)
+            return
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def shutdown(self) -> None:
+        """Stop the workers; jobs that never finished are published as failed."""
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while self._queue is not None and not self._queue.empty():
+            pipeline, job, _ = self._queue.get_nowait()
+            self._abandon(pipeline, job)
+        self._queue = None
+
+    def _abandon(self, pipeline: ImagePipeline, job: UploadJob) -> None:
+        job.status = JobStatus.FAILED
+        job.error = "The server shut down before the upload finished. Please retry."
+        try:
+            self._publish(pipeline, job)
+        except Exception:  # noqa: BLE001 - shutting down; the TTL still cleans up
+            logger.exception("Could not publish the final status of job %s", job.job_id)
+
+    def _publish(self, pipeline: ImagePipeline, job: UploadJob) -> None:
+        job.updated_at = time.time()
+        pipeline.state.set_cache("job", job.job_id, job.to_json(), ttl=self.ttl_seconds)
+        previous = self._updates.get(job.job_id)
+        if job.status.finished:
+            self._updates.pop(job.job_id, None)
+        else:
+            self._updates[job.job_id] = asyncio.Event()
+        if previous is not None:
+            previous.set()
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            pipeline, job, content = await queue.get()
+            try:
+                await self._run(pipeline, job, content)
+            finally:
+                queue.task_done()
+
+    async def _run(self, pipeline: ImagePipeline, job: UploadJob, content: bytes) -> None:
+        def report(stage: str) -> None:
+            job.status = JobStatus.RUNNING
+            job.stage = stage
+            job.progress = round(UPLOAD_STAGES.index(stage) / len(UPLOAD_STAGES), 3)
+            self._publish(pipeline, job)
+
+        try:
+            async with get_scheduler().admit(Lane.HEAVY, shed=False):
+                # Queued jobs only start their deadline once admitted.
+                async with asyncio.timeout(settings.upload_deadline_seconds):
+                    record = await pipeline.process_upload(
+                        content, job.filename, progress=report
+                    )
+        except asyncio.CancelledError:
+            self._abandon(pipeline, job)
+            raise
+        except TimeoutError:
+            CANCELLED_OPERATIONS.inc(reason="deadline")
+            job.status = JobStatus.FAILED
+            job.error = f"Processing exceeded the {settings.upload_deadline_seconds:g}s deadline"
+        except (ValueError, StorageQuotaExceededError) as exc:
+            job.status = JobStatus.FAILED
+            job.error = str(exc)
+        except Exception:
+            logger.exception("Upload job %s failed", job.job_id)
+            job.status = JobStatus.FAILED
+            job.error = "An unexpected error occurred while processing the upload."
+        else:
+            job.status = JobStatus.SUCCEEDED
+            job.material_id = record.material_id
+            job.progress = 1.0
+        self._publish(pipeline, job)
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Any
+
+from PIL import Image
+
+from app.core.metrics import CACHE_HITS, CACHE_MISSES, LIVE_PREVIEW_SESSIONS
+from app.services.executor import run_stage
+from app.services.image_processing import (
+    ImagePipeline,
+    MaterialRecord,
+    ResampleAlgorithm,
+    encode_png,
+    resize_images,
+)
+
+LIVE_PREVIEW_SIZES = (48, 32, 16)
+MAX_PADDING = 64
+
+
+@dataclass(frozen=True)
+class PreviewCommand:
+    """One client request: render the session's material at ``size`` with ``algo``.
+
+    ``padding`` shrinks the 256px frame by that many pixels on every side
+    before resizing, to try out looser crops without re-uploading.
+    """
+
+    request_id: int | None
+    algo: ResampleAlgorithm
+    size: int
+    padding: int = 0
+
+    @classmethod
+    def parse(cls, raw: str) -> "PreviewCommand":
+        try:
+            payload: Any = json.loads(raw)
+        except ValueError as exc:
+            raise ValueError("Commands must be JSON objects") from exc
+        if not isinstance(payload, dict):
+            raise ValueError("Commands must be JSON objects")
+        try:
+            algo = ResampleAlgorithm(payload.get("algo", ResampleAlgorithm.LANCZOS.value))
+        except ValueError as exc:
+            allowed = ", ".join(algo.value for algo in ResampleAlgorithm)
+            raise ValueError(f"Unknown algorithm. Allowed: {allowed}") from exc
+        size = payload.get("size", 48)
+        if not _is_int(size) or size not in LIVE_PREVIEW_SIZES:
+            allowed = ", ".join(map(str, LIVE_PREVIEW_SIZES))
+            raise ValueError(f"Preview size must be one of {allowed} pixels")
+        padding = payload.get("padding", 0)
+        if not _is_int(padding) or not 0 <= padding <= MAX_PADDING:
+            raise ValueError(f"Padding must be an integer between 0 and {MAX_PADDING}")
+        request_id = payload.get("id")
+        if request_id is not None and not _is_int(request_id):
+            raise ValueError("Command id must be an integer")
+        return cls(request_id=request_id, algo=algo, size=size, padding=padding)
+
+    @property
+    def cache_key(self) -> tuple[ResampleAlgorithm, int, int]:
+        return (self.algo, self.size, self.padding)
+
+
+def _is_int(value: Any) -> bool:
+    # JSON ``true`` decodes to a bool (an int subclass) and ``48.0`` compares
+    # equal to 48; neither is an integer field.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class PreviewSession:
+    """A material's decoded 256px frame held for one live-preview connection.
+
+    The material is pinned against quota and expiry eviction until
+    :meth:`close`, and rendered frames are cached for the session, so
+    toggling back and forth between algorithms is served from memory.
+    """
+
+    def __init__(self, pipeline: ImagePipeline, record: MaterialRecord, frame: Image.Image):
+        self.pipeline = pipeline
+        self.record = record
+        self.frame = frame
+        self._frames: dict[tuple[ResampleAlgorithm, int, int], bytes] = {}
+        self._pin = ExitStack()
+        self._pin.enter_context(pipeline.lease(record.material_id))
+        LIVE_PREVIEW_SESSIONS.inc()
+
+    @classmethod
+    async def open(cls, pipeline: ImagePipeline, material_id: str) -> "PreviewSession":
+        record = await pipeline.get_material(material_id)
+        with pipeline.lease(material_id):
+            frame = await pipeline.load_frame(record)
+            # Materialise the frame so renders never touch the store again.
+            frame = await run_stage("decode", frame.copy)
+            return cls(pipeline, record, frame)
+
+    async def render(self, command: PreviewCommand) -> bytes:
+        cached = self._frames.get(command.cache_key)
+        if cached is not None:
+            CACHE_HITS.inc(cache="live_preview")
+            return cached
+        CACHE_MISSES.inc(cache="live_preview")
+        source = self.frame
+        if command.padding:
+            source = await run_stage("pad", pad_frame, source, command.padding)
+        resized = await run_stage("resize", resize_images, source, (command.size,), command.algo)
+        data = await run_stage("png_encode", encode_png, resized[command.size])
+        self._frames[command.cache_key] = data
+        return data
+
+    def close(self) -> None:
+        if self._frames is not None:
+            self._pin.close()
+            self._frames = None  # type: ignore[assignment]
+            LIVE_PREVIEW_SESSIONS.dec()
+            self.record.last_access = time.time()
+            self.pipeline.state.touch_material(self.record.material_id, self.record.last_access)
+
+
+def pad_frame(frame: Image.Image, padding: int) -> Image.Image:
+    width, height = frame.size
+    inner = frame.resize((width - 2 * padding, height - 2 * padding), Image.LANCZOS)
+    padded = Image.new("RGBA", frame.size, (0, 0, 0, 0))
+    padded.paste(inner, (padding, padding))
+    return padded
+
+
+class LatestCommand:
+    """Single-slot mailbox: a newer command replaces one not yet picked up."""
+
+    def __init__(self) -> None:
+        self._command: PreviewCommand | None = None
+        self._ready = asyncio.Event()
+        self.superseded = 0
+
+    def put(self, command: PreviewCommand) -> None:
+        if self._command is not None:
+            self.superseded += 1
+        self._command = command
+        self._ready.set()
+
+    def pending(self) -> bool:
+        return self._command is not None
+
+    async def get(self) -> PreviewCommand:
+        await self._ready.wait()
+        self._ready.clear()
+        command, self._command = self._command, None
+        assert command is not None
+        return command
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import mmap
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from PIL import Image
+
+from app.services.blobs import BlobStore, MemoryBlobStore
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from app.core.config import Settings
+
+
+class MaterialStore(ABC):
+    """Where material bytes live: files under ``root`` or process memory.
+
+    The pipeline addresses everything by path; the memory store only uses
+    those paths as keys, so records and caches look identical in both modes.
+    ``capacity_bytes`` is the default byte budget enforced for this store.
+    For ``in_memory`` stores that budget also covers outputs the pipeline
+    caches in process memory, since they compete for the same RAM.
+    """
+
+    root: Path
+    blobs: BlobStore | MemoryBlobStore
+    capacity_bytes: int | None = None
+    in_memory = False
+
+    @abstractmethod
+    def prepare_dir(self, path: Path) -> None: ...
+
+    @abstractmethod
+    def write(self, path: Path, data: bytes) -> None: ...
+
+    @abstractmethod
+    def read(self, path: Path) -> bytes:
+        """Return the bytes at ``path``; raise ``FileNotFoundError`` if absent."""
+
+    @abstractmethod
+    def open_frame(self, path: Path, width: int, height: int) -> Image.Image | None:
+        """Wrap a raw RGBA frame as a read-only image without copying it."""
+
+    @abstractmethod
+    def remove_dir(self, path: Path) -> None: ...
+
+    @abstractmethod
+    def usage_bytes(self) -> int: ...
+
+
+class DiskMaterialStore(MaterialStore):
+    def __init__(self, root: Path, capacity_bytes: int | None = None):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.blobs = BlobStore(root / "blobs")
+        self.capacity_bytes = capacity_bytes
+
+    def prepare_dir(self, path: Path) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+
+    def write(self, path: Path, data: bytes) -> None:
+        path.write_bytes(data)
+
+    def read(self, path: Path) -> bytes:
+        return path.read_bytes()
+
+    def open_frame(self, path: Path, width: int, height: int) -> Image.Image | None:
+        return open_raw_rgba(path, width, height)
+
+    def remove_dir(self, path: Path) -> None:
+        shutil.rmtree(path, ignore_errors=True)
+
+    def usage_bytes(self) -> int:
+        return directory_size(self.root)
+
+
+class MemoryMaterialStore(MaterialStore):
+    """Keep every material in process memory; no filesystem calls at all.
+
+    Only suitable with the in-memory state backend, since other workers
+    cannot see this process's memory.
+    """
+
+    in_memory = True
+
+    def __init__(self, root: Path, capacity_bytes: int | None = None):
+        self.root = root
+        self.blobs = MemoryBlobStore(root / "blobs")
+        self.capacity_bytes = capacity_bytes
+        self._files: dict[Path, bytes] = {}
+        self._lock = threading.Lock()
+
+    def prepare_dir(self, path: Path) -> None:
+        pass
+
+    def write(self, path: Path, data: bytes) -> None:
+        with self._lock:
+            self._files[path] = bytes(data)
+
+    def read(self, path: Path) -> bytes:
+        try:
+            return self._files[path]
+        except KeyError:
+            raise FileNotFoundError(str(path)) from None
+
+    def open_frame(self, path: Path, width: int, height: int) -> Image.Image | None:
+        data = self._files.get(path)
+        if data is None or len(data) != width * height * 4:
+            return None
+        return Image.frombuffer("RGBA", (width, height), data, "raw", "RGBA", 0, 1)
+
+    def remove_dir(self, path: Path) -> None:
+        with self._lock:
+            for key in [key for key in self._files if key.parent == path]:
+                del self._files[key]
+
+    def usage_bytes(self) -> int:
+        with self._lock:
+            files = sum(map(len, self._files.values()))
+        return files + self.blobs.total_bytes()
+
+
+def create_material_store(settings: Settings) -> MaterialStore:
+    if settings.material_store == "memory":
+        if settings.state_backend != "memory":
+            raise ValueError(
+                "ICONFORGE_MATERIAL_STORE=memory requires ICONFORGE_STATE_BACKEND=memory"
+            )
+        return MemoryMaterialStore(settings.temp_dir, settings.memory_store_max_bytes)
+    return DiskMaterialStore(settings.temp_dir, settings.storage_quota_bytes)
+
+
+def map_raw_rgba(path: Path, width: int, height: int) -> mmap.mmap | None:
+    """Memory-map a raw RGBA sidecar read-only, or ``None`` if it is unusable."""
+
+    try:
+        with open(path, "rb") as handle:
+            if os.fstat(handle.fileno()).st_size != width * height * 4:
+                return None
+            return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+def open_raw_rgba(path: Path, width: int, height: int) -> Image.Image | None:
+    """Wrap a raw RGBA sidecar as a read-only PIL image without decoding or copying."""
+
+    buffer = map_raw_rgba(path, width, height)
+    if buffer is None:
+        return None
+    return Image.frombuffer("RGBA", (width, height), buffer, "raw", "RGBA", 0, 1)
+
+
+def raw_rgba_array(path: Path, width: int, height: int):
+    """Return a read-only ``(height, width, 4)`` uint8 NumPy view of a sidecar."""
+
+    import numpy as np
+
+    buffer = map_raw_rgba(path, width, height)
+    if buffer is None:
+        return None
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 4)
+
+
+def directory_size(path: Path) -> int:
+    """Return the total size in bytes of regular files below ``path``."""
+
+    total = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
+    return total
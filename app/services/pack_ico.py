@@ -2,11 +2,108 @@ from __future__ import annotations
 
 import io
 import struct
-from typing import Mapping
+from dataclasses import dataclass
+from typing import Mapping, Sequence
 
 from PIL import Image
 
 EXPECTED_ICON_SIZES = (256, 48, 32, 16)
+ICO_SIGNATURE = b"\x00\x00\x01\x00"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+MAX_ICO_ENTRIES = 64
+_HEADER = struct.Struct("<HHH")
+_ENTRY = struct.Struct("<BBBBHHII")
+_BITMAPINFOHEADER_SIZE = 40
+
+
+@dataclass(frozen=True)
+class IcoEntry:
+    """One ICONDIRENTRY and its image bytes, exactly as stored in the file."""
+
+    width: int
+    height: int
+    color_count: int
+    planes: int
+    bit_count: int
+    data: bytes
+
+    @property
+    def is_png(self) -> bool:
+        return self.data.startswith(PNG_SIGNATURE)
+
+    @property
+    def square_size(self) -> int | None:
+        return self.width if self.width == self.height else None
+
+
+def is_ico(content: bytes) -> bool:
+    return content[:4] == ICO_SIGNATURE
+
+
+def parse_ico(content: bytes) -> tuple[IcoEntry, ...]:
+    """Read the ICONDIR table of ``content`` without decoding any image.
+
+    Raises ``ValueError`` for anything but a well-formed icon directory:
+    wrong header, no or too many entries, entries pointing outside the file
+    or overlapping each other, or payloads that are neither PNG nor a DIB.
+    """
+
+    if len(content) < _HEADER.size:
+        raise ValueError("ICO file is truncated")
+    reserved, icon_type, count = _HEADER.unpack_from(content)
+    if reserved != 0 or icon_type != 1:
+        raise ValueError("File is not an ICO icon directory")
+    if not 0 < count <= MAX_ICO_ENTRIES:
+        raise ValueError(f"ICO files must contain between 1 and {MAX_ICO_ENTRIES} images")
+    directory_end = _HEADER.size + _ENTRY.size * count
+    if len(content) < directory_end:
+        raise ValueError("ICO directory is truncated")
+
+    entries = []
+    spans = []
+    for index in range(count):
+        width, height, color_count, _, planes, bit_count, size, offset = _ENTRY.unpack_from(
+            content, _HEADER.size + _ENTRY.size * index
+        )
+        if size == 0 or offset < directory_end or offset + size > len(content):
+            raise ValueError(f"ICO entry {index} points outside the file")
+        data = content[offset : offset + size]
+        is_dib = (
+            size >= _BITMAPINFOHEADER_SIZE
+            and int.from_bytes(data[:4], "little") == _BITMAPINFOHEADER_SIZE
+        )
+        if not (data.startswith(PNG_SIGNATURE) or is_dib):
+            raise ValueError(f"ICO entry {index} is neither a PNG nor a bitmap")
+        spans.append((offset, offset + size))
+        entries.append(
+            IcoEntry(width or 256, height or 256, color_count, planes, bit_count, data)
+        )
+    spans.sort()
+    if any(start < previous_end for (_, previous_end), (start, _) in zip(spans, spans[1:])):
+        raise ValueError("ICO entries overlap")
+    return tuple(entries)
+
+
+def largest_entry(entries: Sequence[IcoEntry]) -> IcoEntry:
+    """The entry with the most pixels, preferring the deepest colour at a tie."""
+
+    return max(entries, key=lambda entry: (entry.width * entry.height, entry.bit_count))
+
+
+def decode_entry(entry: IcoEntry) -> Image.Image:
+    """Decode a single entry to RGBA; no other entry of the file is touched."""
+
+    if entry.is_png:
+        source = io.BytesIO(entry.data)
+    else:
+        # Pillow only decodes bitmap entries (XOR image plus AND mask) inside
+        # an ICO container, so wrap this one entry in a directory of its own.
+        source = io.BytesIO(_pack_entries([entry]))
+    try:
+        with Image.open(source) as image:
+            return image.convert("RGBA")
+    except Exception as exc:  # pragma: no cover - Pillow already detailed
+        raise ValueError("Invalid image data in ICO entry") from exc
 
 
 def _load_icon_image(content: bytes, expected_size: int) -> Image.Image:
@@ -26,31 +123,50 @@ def _load_icon_image(content: bytes, expected_size: int) -> Image.Image:
     return image
 
 
-def pack_ico(icons: Mapping[int, bytes]) -> bytes:
-    """Validate provided icon sizes and pack them into a multi-size ICO byte stream."""
+def pack_ico(icons: Mapping[int, bytes], keep: Sequence[IcoEntry] = ()) -> bytes:
+    """Validate provided icon sizes and pack them into a multi-size ICO byte stream.
 
-    missing = set(EXPECTED_ICON_SIZES) - set(icons.keys())
+    Entries in ``keep`` (typically from :func:`parse_ico` of an imported icon)
+    are copied verbatim unless ``icons`` provides their size, and may stand
+    in for a required size the caller did not regenerate.
+    """
+
+    kept = [entry for entry in keep if entry.square_size not in icons]
+    missing = set(EXPECTED_ICON_SIZES) - set(icons.keys()) - {entry.square_size for entry in kept}
     if missing:
         missing_sizes = ", ".join(map(str, sorted(missing)))
         raise ValueError(f"Icon sizes must include {missing_sizes} pixels")
 
-    validated = []
+    entries = list(kept)
     for size in EXPECTED_ICON_SIZES:
+        if size not in icons:
+            continue
         image = _load_icon_image(icons[size], size)
         buffer = io.BytesIO()
         image.save(buffer, format="PNG")
-        validated.append((size, buffer.getvalue()))
+        entries.append(IcoEntry(size, size, 0, 1, 32, buffer.getvalue()))
+
+    entries.sort(key=lambda entry: entry.width * entry.height, reverse=True)
+    return _pack_entries(entries)
+
 
-    header = struct.pack("<HHH", 0, 1, len(validated))
-    offset = 6 + 16 * len(validated)
+def _pack_entries(entries: Sequence[IcoEntry]) -> bytes:
+    header = _HEADER.pack(0, 1, len(entries))
+    offset = _HEADER.size + _ENTRY.size * len(entries)
     directories = []
-    for size, data in validated:
-        width = 0 if size == 256 else size
-        height = 0 if size == 256 else size
-        entry = struct.pack(
-            "<BBBBHHII", width, height, 0, 0, 1, 32, len(data), offset
+    for entry in entries:
+        directories.append(
+            _ENTRY.pack(
+                0 if entry.width == 256 else entry.width,
+                0 if entry.height == 256 else entry.height,
+                entry.color_count,
+                0,
+                entry.planes,
+                entry.bit_count,
+                len(entry.data),
+                offset,
+            )
         )
-        directories.append(entry)
-        offset += len(data)
+        offset += len(entry.data)
 
-    return header + b"".join(directories) + b"".join(data for _, data in validated)
+    return header + b"".join(directories) + b"".join(entry.data for entry in entries)
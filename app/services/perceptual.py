@@ -0,0 +1,141 @@
+"""Perceptual hashes for spotting near-duplicate uploads.
+
+Both hashes are 64-bit and computed with NumPy from one small grayscale
+thumbnail: dHash compares neighbouring pixels of a 9x8 thumbnail, pHash
+thresholds the low-frequency 8x8 block of a 32x32 DCT. Re-encoding,
+resizing or stripping metadata flips only a few bits, so a small Hamming
+distance on both means "the same picture".
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from PIL import Image
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    import numpy as np
+
+
+@dataclass(frozen=True)
+class ImageHashes:
+    dhash: int
+    phash: int
+    aspect: float
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(size: int) -> "np.ndarray":
+    import numpy as np
+
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def _pack(bits: "np.ndarray") -> int:
+    import numpy as np
+
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def _grayscale(image: Image.Image) -> Image.Image:
+    # Uploads re-saved as JPEG lose their alpha, usually flattened onto white;
+    # flatten transparent sources the same way so both hash alike.
+    if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+        rgba = image.convert("RGBA")
+        flattened = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        flattened.alpha_composite(rgba)
+        return flattened.convert("L")
+    return image.convert("L")
+
+
+def compute_hashes(image: Image.Image) -> ImageHashes:
+    import numpy as np
+
+    gray = _grayscale(image)
+    small = np.asarray(gray.resize((9, 8), Image.BOX), dtype=np.float32)
+    dhash = _pack(small[:, 1:] > small[:, :-1])
+    thumb = np.asarray(gray.resize((32, 32), Image.BOX), dtype=np.float64)
+    dct = _dct_matrix(32)
+    low = (dct @ thumb @ dct.T)[:8, :8]
+    phash = _pack(low > np.median(low.ravel()[1:]))
+    return ImageHashes(dhash=dhash, phash=phash, aspect=image.width / image.height)
+
+
+def hamming_distances(hashes: "np.ndarray", value: int) -> "np.ndarray":
+    """Bit distances between every uint64 in ``hashes`` and ``value``."""
+
+    import numpy as np
+
+    diff = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(diff.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class PerceptualIndex:
+    """Bounded, most-recent-first index of hashes keyed by upload digest.
+
+    Lookups compare against every entry at once with vectorised XOR and
+    popcount; the packed arrays are rebuilt only after the index changed.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries: OrderedDict[str, ImageHashes] = OrderedDict()
+        self._arrays: tuple[list[str], "np.ndarray", "np.ndarray", "np.ndarray"] | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, digest: str, hashes: ImageHashes) -> None:
+        with self._lock:
+            self._entries[digest] = hashes
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self._arrays = None
+
+    def discard(self, digest: str) -> None:
+        with self._lock:
+            if self._entries.pop(digest, None) is not None:
+                self._arrays = None
+
+    def closest(
+        self, hashes: ImageHashes, max_distance: int, aspect_tolerance: float = 0.02
+    ) -> list[str]:
+        """Digests whose dHash and pHash are both within ``max_distance`` bits.
+
+        Candidates must also share the aspect ratio (within
+        ``aspect_tolerance``), and come back best match first.
+        """
+
+        import numpy as np
+
+        with self._lock:
+            if not self._entries:
+                return []
+            if self._arrays is None:
+                digests = list(self._entries)
+                values = list(self._entries.values())
+                self._arrays = (
+                    digests,
+                    np.array([entry.dhash for entry in values], dtype=np.uint64),
+                    np.array([entry.phash for entry in values], dtype=np.uint64),
+                    np.array([entry.aspect for entry in values], dtype=np.float64),
+                )
+            digests, dhashes, phashes, aspects = self._arrays
+        distance = np.maximum(
+            hamming_distances(dhashes, hashes.dhash), hamming_distances(phashes, hashes.phash)
+        )
+        close = (distance <= max_distance) & (
+            np.abs(aspects / hashes.aspect - 1.0) <= aspect_tolerance
+        )
+        matches = np.flatnonzero(close)
+        return [digests[index] for index in matches[np.argsort(distance[matches], kind="stable")]]
@@ -0,0 +1,635 @@
+from __future__ import annotations
+
+import json
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ContextManager, Generic, Iterator, Mapping, TypeVar
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from app.core.config import Settings
+
+
+@dataclass
+class MaterialRecord:
+    material_id: str
+    original_path: Path
+    processed_path: Path
+    width: int
+    height: int
+    crop_box: tuple[int, int, int, int]
+    padding: int
+    created_at: float
+    last_access: float
+    size_bytes: int = 0
+    # Square sizes found in an uploaded .ico; empty for other formats.
+    source_icon_sizes: tuple[int, ...] = ()
+
+    @property
+    def raw_path(self) -> Path:
+        """Sidecar holding the processed frame as raw, row-major RGBA bytes."""
+
+        return self.processed_path.with_suffix(".rgba")
+
+    def to_json(self) -> str:
+        payload = asdict(self)
+        payload["original_path"] = str(self.original_path)
+        payload["processed_path"] = str(self.processed_path)
+        return json.dumps(payload)
+
+    @classmethod
+    def from_json(cls, raw: str | bytes) -> "MaterialRecord":
+        payload: dict[str, Any] = json.loads(raw)
+        payload["original_path"] = Path(payload["original_path"])
+        payload["processed_path"] = Path(payload["processed_path"])
+        payload["crop_box"] = tuple(payload["crop_box"])
+        payload["source_icon_sizes"] = tuple(payload.get("source_icon_sizes", ()))
+        return cls(**payload)
+
+
+class StateBackend(ABC):
+    """Index of live materials plus caches of outputs derived from them.
+
+    Material files live under ``settings.temp_dir``; the backend only decides
+    which materials exist. ``shared`` backends are visible to every worker
+    process pointing at the same store.
+
+    Pins and leases (:meth:`StorageManager.pin`) are process-local, whatever
+    the backend: eviction in one worker does not see reads in flight in
+    another, so a request racing a TTL or quota eviction elsewhere can fail
+    part-way instead of holding the material alive.
+    """
+
+    shared = False
+
+    @abstractmethod
+    def get_material(self, material_id: str) -> MaterialRecord | None: ...
+
+    @abstractmethod
+    def put_material(self, record: MaterialRecord) -> None: ...
+
+    @abstractmethod
+    def touch_material(self, material_id: str, timestamp: float) -> None: ...
+
+    @abstractmethod
+    def pop_material(self, material_id: str) -> MaterialRecord | None:
+        """Remove a material and the cache entries it owns.
+
+        Returns the record only to the caller that actually removed it, so
+        concurrent evictions never clean up the same files twice.
+        """
+
+    @abstractmethod
+    def expired_material_ids(self, cutoff: float) -> list[str]: ...
+
+    @abstractmethod
+    def material_ids(self) -> list[str]: ...
+
+    @abstractmethod
+    def get_cache(self, namespace: str, key: str) -> bytes | None: ...
+
+    @abstractmethod
+    def set_cache(
+        self,
+        namespace: str,
+        key: str,
+        data: bytes,
+        owner: str | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        """Store ``data``; entries with an ``owner`` are purged with that material.
+
+        Unowned entries may instead expire ``ttl`` seconds after they were
+        last written, whichever process wrote them.
+        """
+
+    @abstractmethod
+    def delete_cache(self, namespace: str, key: str) -> None: ...
+
+    def material_count(self) -> int:
+        return len(self.material_ids())
+
+    def records_by_last_access(self) -> list[MaterialRecord]:
+        """Return live materials, least recently used first."""
+
+        records = [self.get_material(material_id) for material_id in self.material_ids()]
+        return sorted(
+            (record for record in records if record is not None),
+            key=lambda record: record.last_access,
+        )
+
+    @property
+    def materials(self) -> Mapping[str, MaterialRecord]:
+        return MaterialsView(self)
+
+    def eviction_lock(self) -> ContextManager[bool]:
+        """Yield ``True`` when this caller may run an eviction sweep."""
+
+        return nullcontext(True)
+
+    def close(self) -> None:
+        pass
+
+
+class MaterialsView(Mapping[str, MaterialRecord]):
+    """Read-only mapping over the materials of a backend."""
+
+    def __init__(self, backend: StateBackend):
+        self._backend = backend
+
+    def __getitem__(self, material_id: str) -> MaterialRecord:
+        record = self._backend.get_material(material_id)
+        if record is None:
+            raise KeyError(material_id)
+        return record
+
+    def __contains__(self, material_id: object) -> bool:
+        return isinstance(material_id, str) and self._backend.get_material(material_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._backend.material_ids())
+
+    def __len__(self) -> int:
+        return self._backend.material_count()
+
+
+K = TypeVar("K", bound=tuple)
+V = TypeVar("V")
+
+
+class OwnedCache(Mapping[K, V], Generic[K, V]):
+    """Process-local cache whose keys start with the owning material id.
+
+    Lookups are plain dict reads without a lock, so cache hits never wait on
+    writers. Writers serialise on a lock, and dropping an owner swaps in a
+    rebuilt dict instead of deleting in place, so a concurrent reader never
+    sees the dict change size under it.
+    """
+
+    def __init__(self) -> None:
+        self._data: dict[K, V] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key: K) -> V:
+        return self._data[key]
+
+    def get(self, key: K, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __setitem__(self, key: K, value: V) -> None:
+        with self._lock:
+            self._data[key] = value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data = {}
+
+    def drop_owner(self, owner: str) -> int:
+        """Remove every entry of ``owner`` and return how many there were."""
+
+        with self._lock:
+            kept = {key: value for key, value in self._data.items() if key[0] != owner}
+            dropped = len(self._data) - len(kept)
+            if dropped:
+                self._data = kept
+        return dropped
+
+
+class MemoryStateBackend(StateBackend):
+    """Process-local state; the default for single-worker deployments.
+
+    Reads go straight to the dicts; writes (which may come from executor
+    threads during quota eviction) hold a lock, and scans work on a copy.
+    """
+
+    def __init__(self) -> None:
+        self._materials: dict[str, MaterialRecord] = {}
+        self._cache: dict[tuple[str, str], tuple[bytes, str | None]] = {}
+        self._expires: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def materials(self) -> dict[str, MaterialRecord]:
+        return self._materials
+
+    def get_material(self, material_id: str) -> MaterialRecord | None:
+        return self._materials.get(material_id)
+
+    def put_material(self, record: MaterialRecord) -> None:
+        with self._lock:
+            self._materials[record.material_id] = record
+
+    def touch_material(self, material_id: str, timestamp: float) -> None:
+        record = self._materials.get(material_id)
+        if record is not None:
+            record.last_access = timestamp
+
+    def pop_material(self, material_id: str) -> MaterialRecord | None:
+        with self._lock:
+            record = self._materials.pop(material_id, None)
+            if record is not None:
+                self._cache = {
+                    key: value for key, value in self._cache.items() if value[1] != material_id
+                }
+        return record
+
+    def expired_material_ids(self, cutoff: float) -> list[str]:
+        with self._lock:
+            records = list(self._materials.values())
+        return [record.material_id for record in records if record.last_access < cutoff]
+
+    def material_ids(self) -> list[str]:
+        with self._lock:
+            return list(self._materials)
+
+    def get_cache(self, namespace: str, key: str) -> bytes | None:
+        entry = self._cache.get((namespace, key))
+        expires = self._expires.get((namespace, key))
+        if expires is not None and expires <= time.time():
+            return None
+        return entry[0] if entry else None
+
+    def set_cache(
+        self,
+        namespace: str,
+        key: str,
+        data: bytes,
+        owner: str | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        with self._lock:
+            if owner is not None and owner not in self._materials:
+                return
+            self._cache[(namespace, key)] = (data, owner)
+            if ttl is None:
+                self._expires.pop((namespace, key), None)
+                return
+            now = time.time()
+            self._expires[(namespace, key)] = now + ttl
+            # Expiring entries are few (job snapshots): sweep them on write.
+            for expired in [entry for entry, at in self._expires.items() if at <= now]:
+                del self._expires[expired]
+                self._cache.pop(expired, None)
+
+    def delete_cache(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._cache.pop((namespace, key), None)
+            self._expires.pop((namespace, key), None)
+
+
+class SQLiteStateBackend(StateBackend):
+    """State shared by worker processes on one host through a SQLite index.
+
+    The database runs in WAL mode so readers never block the writer, and an
+    ``fcntl`` lock next to it ensures only one process sweeps at a time.
+    Index and cache updates are atomic across processes; material leases are
+    not (see :class:`StateBackend`).
+    """
+
+    shared = True
+
+    _SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS materials (
+            material_id TEXT PRIMARY KEY,
+            record TEXT NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS materials_last_access ON materials (last_access)",
+        """
+        CREATE TABLE IF NOT EXISTS cache (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            owner TEXT,
+            data BLOB NOT NULL,
+            expires_at REAL,
+            PRIMARY KEY (namespace, key)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS cache_owner ON cache (owner)",
+    )
+    # Columns that databases from older releases lack.
+    _MIGRATIONS = (
+        ("expires_at", "ALTER TABLE cache ADD COLUMN expires_at REAL"),
+    )
+
+    def __init__(self, path: Path, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._sweep_guard = threading.Lock()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in self._SCHEMA:
+            conn.execute(statement)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+        for column, statement in self._MIGRATIONS:
+            if column not in columns:
+                conn.execute(statement)
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_material(self, material_id: str) -> MaterialRecord | None:
+        row = self._connection().execute(
+            "SELECT record, last_access FROM materials WHERE material_id = ?", (material_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        record = MaterialRecord.from_json(row[0])
+        record.last_access = row[1]
+        return record
+
+    def put_material(self, record: MaterialRecord) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO materials (material_id, record, last_access) VALUES (?, ?, ?)",
+            (record.material_id, record.to_json(), record.last_access),
+        )
+
+    def touch_material(self, material_id: str, timestamp: float) -> None:
+        self._connection().execute(
+            "UPDATE materials SET last_access = MAX(last_access, ?) WHERE material_id = ?",
+            (timestamp, material_id),
+        )
+
+    def pop_material(self, material_id: str) -> MaterialRecord | None:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT record, last_access FROM materials WHERE material_id = ?",
+                (material_id,),
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM materials WHERE material_id = ?", (material_id,))
+                conn.execute("DELETE FROM cache WHERE owner = ?", (material_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        record = MaterialRecord.from_json(row[0])
+        record.last_access = row[1]
+        return record
+
+    def expired_material_ids(self, cutoff: float) -> list[str]:
+        rows = self._connection().execute(
+            "SELECT material_id FROM materials WHERE last_access < ?", (cutoff,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def material_ids(self) -> list[str]:
+        rows = self._connection().execute("SELECT material_id FROM materials").fetchall()
+        return [row[0] for row in rows]
+
+    def material_count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM materials").fetchone()[0]
+
+    def records_by_last_access(self) -> list[MaterialRecord]:
+        rows = self._connection().execute(
+            "SELECT record, last_access FROM materials ORDER BY last_access"
+        ).fetchall()
+        records = []
+        for raw, last_access in rows:
+            record = MaterialRecord.from_json(raw)
+            record.last_access = last_access
+            records.append(record)
+        return records
+
+    def get_cache(self, namespace: str, key: str) -> bytes | None:
+        row = self._connection().execute(
+            """
+            SELECT data FROM cache
+            WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)
+            """,
+            (namespace, key, time.time()),
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set_cache(
+        self,
+        namespace: str,
+        key: str,
+        data: bytes,
+        owner: str | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        if ttl is not None:
+            conn = self._connection()
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Whoever writes an expiring entry also sweeps the expired ones,
+                # so entries left by exited workers do not accumulate.
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO cache (namespace, key, owner, data, expires_at)
+                    VALUES (?, ?, NULL, ?, ?)
+                    """,
+                    (namespace, key, data, now + ttl),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return
+        # One statement is one transaction: the owner check and the insert
+        # cannot interleave with pop_material's delete of the owner's rows.
+        self._connection().execute(
+            """
+            INSERT OR REPLACE INTO cache (namespace, key, owner, data)
+            SELECT ?, ?, ?, ?
+            WHERE ? IS NULL OR EXISTS (SELECT 1 FROM materials WHERE material_id = ?)
+            """,
+            (namespace, key, owner, data, owner, owner),
+        )
+
+    def delete_cache(self, namespace: str, key: str) -> None:
+        self._connection().execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    @contextmanager
+    def eviction_lock(self) -> Iterator[bool]:
+        import fcntl
+
+        if not self._sweep_guard.acquire(blocking=False):
+            yield False
+            return
+        try:
+            with open(self.path.with_suffix(".evict.lock"), "a+") as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+        finally:
+            self._sweep_guard.release()
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RedisStateBackend(StateBackend):
+    """State shared through any server speaking the Redis protocol.
+
+    ``client`` is a ``redis.Redis``-compatible object. Material files still
+    live under ``settings.temp_dir``, which must be shared between workers.
+    Material leases stay process-local (see :class:`StateBackend`).
+    """
+
+    shared = True
+
+    # Owned cache writes and material removal each run as one script, so a
+    # write can never land between a pop's read of the owned set and its
+    # delete. Cache keys are derived inside the scripts, which is fine on a
+    # single server but not on Redis Cluster.
+    SET_OWNED_SCRIPT = """
+    if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then return 0 end
+    redis.call('SET', KEYS[2], ARGV[2])
+    redis.call('SADD', KEYS[3], KEYS[2])
+    return 1
+    """
+    POP_SCRIPT = """
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+    if not score then return false end
+    local record = redis.call('GET', KEYS[2]) or ''
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    for _, key in ipairs(redis.call('SMEMBERS', KEYS[3])) do redis.call('DEL', key) end
+    redis.call('DEL', KEYS[2], KEYS[3])
+    return {record, score}
+    """
+
+    def __init__(self, client: Any, prefix: str = "iconforge", lock_seconds: int = 30):
+        self.client = client
+        self.prefix = prefix
+        self.lock_seconds = lock_seconds
+        self._set_owned = client.register_script(self.SET_OWNED_SCRIPT)
+        self._pop = client.register_script(self.POP_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "iconforge") -> "RedisStateBackend":
+        try:
+            import redis
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("The redis state backend requires the 'redis' package") from exc
+        return cls(redis.Redis.from_url(url), prefix=prefix)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix, *parts))
+
+    @staticmethod
+    def _decode(value: Any) -> str:
+        return value.decode() if isinstance(value, bytes) else str(value)
+
+    def get_material(self, material_id: str) -> MaterialRecord | None:
+        raw = self.client.get(self._key("material", material_id))
+        if raw is None:
+            return None
+        record = MaterialRecord.from_json(raw)
+        last_access = self.client.zscore(self._key("materials"), material_id)
+        if last_access is not None:
+            record.last_access = float(last_access)
+        return record
+
+    def put_material(self, record: MaterialRecord) -> None:
+        self.client.set(self._key("material", record.material_id), record.to_json())
+        self.client.zadd(self._key("materials"), {record.material_id: record.last_access})
+
+    def touch_material(self, material_id: str, timestamp: float) -> None:
+        self.client.zadd(self._key("materials"), {material_id: timestamp}, xx=True, gt=True)
+
+    def pop_material(self, material_id: str) -> MaterialRecord | None:
+        keys = [
+            self._key("materials"),
+            self._key("material", material_id),
+            self._key("owned", material_id),
+        ]
+        popped = self._pop(keys=keys, args=[material_id])
+        if not popped or not popped[0]:
+            return None
+        record = MaterialRecord.from_json(popped[0])
+        record.last_access = float(popped[1])
+        return record
+
+    def expired_material_ids(self, cutoff: float) -> list[str]:
+        members = self.client.zrangebyscore(self._key("materials"), "-inf", f"({cutoff}")
+        return [self._decode(member) for member in members]
+
+    def material_ids(self) -> list[str]:
+        return [self._decode(member) for member in self.client.zrange(self._key("materials"), 0, -1)]
+
+    def material_count(self) -> int:
+        return int(self.client.zcard(self._key("materials")))
+
+    def get_cache(self, namespace: str, key: str) -> bytes | None:
+        return self.client.get(self._key("cache", namespace, key))
+
+    def set_cache(
+        self,
+        namespace: str,
+        key: str,
+        data: bytes,
+        owner: str | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        cache_key = self._key("cache", namespace, key)
+        if owner is None:
+            self.client.set(cache_key, data, ex=None if ttl is None else max(1, math.ceil(ttl)))
+            return
+        keys = [self._key("materials"), cache_key, self._key("owned", owner)]
+        self._set_owned(keys=keys, args=[owner, data])
+
+    def delete_cache(self, namespace: str, key: str) -> None:
+        self.client.delete(self._key("cache", namespace, key))
+
+    @contextmanager
+    def eviction_lock(self) -> Iterator[bool]:
+        lock_key = self._key("lock", "evict")
+        acquired = bool(self.client.set(lock_key, b"1", nx=True, ex=self.lock_seconds))
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.client.delete(lock_key)
+
+
+def create_state_backend(settings: "Settings") -> StateBackend:
+    """Build the backend selected by ``settings.state_backend``."""
+
+    if settings.state_backend == "sqlite":
+        path = settings.state_sqlite_path or settings.temp_dir / "state.sqlite3"
+        return SQLiteStateBackend(path)
+    if settings.state_backend == "redis":
+        return RedisStateBackend.from_url(
+            settings.state_redis_url, prefix=settings.state_redis_prefix
+        )
+    return MemoryStateBackend()
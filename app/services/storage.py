@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Hashable, Iterable, Iterator
+
+from app.services.state import MaterialRecord
+
+
+class StorageQuotaExceededError(RuntimeError):
+    """Raised when a new material cannot fit within the storage quota."""
+
+
+class MaterialNotFoundError(KeyError):
+    """Raised when a material id cannot be resolved."""
+
+
+@dataclass(frozen=True)
+class StorageUsage:
+    materials: int
+    used_bytes: int
+    reserved_bytes: int
+    quota_bytes: int | None
+    pinned_materials: int
+
+    @property
+    def available_bytes(self) -> int | None:
+        if self.quota_bytes is None:
+            return None
+        return max(0, self.quota_bytes - self.used_bytes - self.reserved_bytes)
+
+    def as_dict(self) -> dict[str, int | None]:
+        payload = asdict(self)
+        payload["available_bytes"] = self.available_bytes
+        return payload
+
+
+class StorageManager:
+    """Byte accounting, pinning and LRU victim selection for material storage.
+
+    Materials are charged the bytes they wrote, including their original
+    upload even when another material shares the same blob, so the quota
+    errs on the side of evicting early. Outputs cached for a material in
+    process memory can be charged to it as well (:meth:`charge`); they count
+    towards the quota from then on and are enforced at the next reservation.
+
+    Pins are reference counts of in-flight readers (a forge, a preview
+    render, a live-preview session). Pinned materials are never chosen as
+    victims, and deletion first claims the material with :meth:`evicting`,
+    which fails while it is pinned and makes new pins fail until the files
+    are gone. Both are local to this process.
+    """
+
+    def __init__(self, quota_bytes: int | None):
+        self.quota_bytes = quota_bytes
+        self._pins: Counter[str] = Counter()
+        self._evicting: set[str] = set()
+        self._charges: dict[str, dict[Hashable, int]] = {}
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def pin(self, material_id: str) -> Iterator[None]:
+        """Hold ``material_id`` against deletion; raise if it is being deleted."""
+
+        with self._lock:
+            if material_id in self._evicting:
+                raise MaterialNotFoundError(material_id)
+            self._pins[material_id] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[material_id] -= 1
+                if not self._pins[material_id]:
+                    del self._pins[material_id]
+
+    @contextmanager
+    def evicting(self, material_id: str) -> Iterator[bool]:
+        """Claim an unpinned material for deletion; yield ``False`` if it is in use."""
+
+        with self._lock:
+            claimed = material_id not in self._pins and material_id not in self._evicting
+            if claimed:
+                self._evicting.add(material_id)
+        try:
+            yield claimed
+        finally:
+            if claimed:
+                with self._lock:
+                    self._evicting.discard(material_id)
+
+    def charge(self, material_id: str, key: Hashable, size: int) -> None:
+        """Count ``size`` cached bytes under ``key`` against ``material_id``.
+
+        Charging the same key again replaces the earlier amount.
+        """
+
+        with self._lock:
+            self._charges.setdefault(material_id, {})[key] = size
+
+    def discharge(self, material_id: str) -> None:
+        with self._lock:
+            self._charges.pop(material_id, None)
+
+    def _footprint(self, record: MaterialRecord) -> int:
+        return record.size_bytes + sum(self._charges.get(record.material_id, {}).values())
+
+    def is_pinned(self, material_id: str) -> bool:
+        with self._lock:
+            return material_id in self._pins
+
+    def usage(self, records: Iterable[MaterialRecord]) -> StorageUsage:
+        records = list(records)
+        with self._lock:
+            return StorageUsage(
+                materials=len(records),
+                used_bytes=sum(self._footprint(record) for record in records),
+                reserved_bytes=self._reserved,
+                quota_bytes=self.quota_bytes,
+                pinned_materials=len(self._pins),
+            )
+
+    def reserve(self, records_by_last_access: list[MaterialRecord], size: int) -> list[str]:
+        """Reserve ``size`` bytes for a new material and return the ids to evict first.
+
+        Victims are the least recently used unpinned materials. The
+        reservation holds until :meth:`release`, so concurrent uploads cannot
+        both claim the same free space. Raises
+        :class:`StorageQuotaExceededError` when even evicting every unpinned
+        material would not make enough room.
+        """
+
+        with self._lock:
+            if self.quota_bytes is None:
+                self._reserved += size
+                return []
+            if size > self.quota_bytes:
+                raise StorageQuotaExceededError(
+                    f"Material needs {size} bytes but the storage quota is {self.quota_bytes}"
+                )
+            # Charges of materials that are gone (a cache filled as they were
+            # deleted) are dropped here instead of counting forever.
+            live = {record.material_id for record in records_by_last_access}
+            for material_id in [key for key in self._charges if key not in live]:
+                del self._charges[material_id]
+            used = sum(map(self._footprint, records_by_last_access)) + self._reserved
+            victims = []
+            for record in records_by_last_access:
+                if used + size <= self.quota_bytes:
+                    break
+                if record.material_id in self._pins:
+                    continue
+                victims.append(record.material_id)
+                used -= self._footprint(record)
+            if used + size > self.quota_bytes:
+                raise StorageQuotaExceededError(
+                    "Storage quota is exhausted by materials in use. Please retry later."
+                )
+            self._reserved += size
+            return victims
+
+    def release(self, size: int) -> None:
+        """Drop a reservation once its material is registered (or abandoned)."""
+
+        with self._lock:
+            self._reserved -= size
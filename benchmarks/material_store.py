@@ -0,0 +1,97 @@
+"""Compare the disk and memory material stores on the upload→preview→forge flow.
+
+Run from the repository root::
+
+    python -m benchmarks.material_store --iterations 50 --source-size 1024
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from app.core.config import settings
+from app.services.image_processing import ImagePipeline, ResampleAlgorithm
+from app.services.material_store import DiskMaterialStore, MaterialStore, MemoryMaterialStore
+
+
+def make_source(index: int, size: int) -> bytes:
+    image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    margin = size // 8
+    color = (index % 256, 80, 255 - index % 256, 255)
+    image.paste(color, (margin, margin, size - margin, size - margin))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_tiny() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGBA", (16, 16), (10, 20, 30, 255)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def run(store: MaterialStore, sources: list[bytes]) -> dict[str, list[float]]:
+    pipeline = ImagePipeline(background_removal_enabled=False, store=store)
+    tiny = make_tiny()
+    timings: dict[str, list[float]] = {
+        operation: [] for operation in ("upload", "material", "cold_preview", "forge")
+    }
+    for index, content in enumerate(sources):
+        start = time.perf_counter()
+        record = await pipeline.process_upload(content, f"bench-{index}.png")
+        timings["upload"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await pipeline.get_material_bytes(record.material_id)
+        timings["material"].append(time.perf_counter() - start)
+
+        pipeline.preview_cache.clear()
+        start = time.perf_counter()
+        await pipeline.get_preview_bytes(record.material_id, ResampleAlgorithm.BILINEAR, 48)
+        timings["cold_preview"].append(time.perf_counter() - start)
+
+        pipeline.preview_cache.clear()
+        start = time.perf_counter()
+        await pipeline.forge_icon(record.material_id, ResampleAlgorithm.LANCZOS, tiny)
+        timings["forge"].append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(name: str, timings: dict[str, list[float]]) -> None:
+    for operation, samples in timings.items():
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(
+            f"{name:<7} {operation:<13} mean {statistics.mean(samples) * 1000:8.3f} ms"
+            f"   p50 {statistics.median(samples) * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--source-size", type=int, default=512)
+    args = parser.parse_args()
+
+    sources = [make_source(index, args.source_size) for index in range(args.iterations)]
+    with tempfile.TemporaryDirectory(prefix="iconforge-bench-") as directory:
+        root = Path(directory)
+        settings.temp_dir = root
+        stores: dict[str, MaterialStore] = {
+            "disk": DiskMaterialStore(root / "disk"),
+            "memory": MemoryMaterialStore(root / "memory"),
+        }
+        for name, store in stores.items():
+            summarize(name, asyncio.run(run(store, sources)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Measure in-process requests per second for ``GET /api/v1/ping``.
+
+Requests go through the full middleware stack over an ASGI transport, so
+the number reflects framework and middleware overhead rather than the
+network. Run from the repository root::
+
+    python -m benchmarks.ping --requests 5000 --concurrency 32
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+
+from app.core.config import settings
+
+
+async def run(total: int, concurrency: int) -> float:
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        url = f"{settings.api_prefix}/ping"
+        remaining = 0
+
+        async def worker() -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.get(url)
+                response.raise_for_status()
+
+        remaining = min(total, 200)  # warm up
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        remaining = total
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--log-to", default="/dev/null", help="where the access log is written during the run"
+    )
+    args = parser.parse_args()
+
+    from app.core.logging import configure_logging
+
+    configure_logging(stream=open(args.log_to, "w"))
+    rate = asyncio.run(run(args.requests, args.concurrency))
+    logging.shutdown()
+    print(f"GET {settings.api_prefix}/ping: {rate:,.0f} req/s "
+          f"({args.requests} requests, concurrency {args.concurrency})")
+
+
+if __name__ == "__main__":
+    main()
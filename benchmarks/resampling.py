@@ -0,0 +1,76 @@
+"""Compare the NumPy resampling engine with Pillow for the 256→48/32/16 icon sizes.
+
+Run from the repository root::
+
+    python -m benchmarks.resampling --iterations 200 --materials 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from typing import Callable
+
+import numpy as np
+from PIL import Image
+
+from app.services import resampling
+
+SIZES = (48, 32, 16)
+KERNELS = {
+    "lanczos": Image.LANCZOS,
+    "bilinear": Image.BILINEAR,
+    "box": Image.BOX,
+    "mitchell": Image.BICUBIC,
+}
+
+
+def make_frame(seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (256, 256, 4), dtype=np.uint8), "RGBA")
+
+
+def measure(func: Callable[[], object], iterations: int) -> float:
+    func()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--materials", type=int, default=8)
+    args = parser.parse_args()
+
+    frame = make_frame(0)
+    frames = [make_frame(seed) for seed in range(args.materials)]
+    print(f"{'kernel':<9} {'pillow':>10} {'numpy':>10} {'batched':>10} {'materials':>10}")
+    for kernel, pillow_filter in KERNELS.items():
+        pillow = measure(
+            lambda: [frame.resize((size, size), pillow_filter) for size in SIZES], args.iterations
+        )
+        single = measure(
+            lambda: [resampling.resize(frame, size, kernel) for size in SIZES], args.iterations
+        )
+        batched = measure(lambda: resampling.resize_many(frame, SIZES, kernel), args.iterations)
+        # Per material, when every frame goes to 48/32/16 in one call.
+        stacked = measure(
+            lambda: resampling.resize_batch(frames, SIZES, kernel), args.iterations
+        ) / len(frames)
+        print(
+            f"{kernel:<9} {pillow:8.3f}ms {single:8.3f}ms {batched:8.3f}ms {stacked:8.3f}ms"
+        )
+    majority = measure(
+        lambda: [resampling.resize(frame, size, "majority") for size in SIZES],
+        max(1, args.iterations // 10),
+    )
+    print(f"{'majority':<9} {'-':>10} {majority:8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
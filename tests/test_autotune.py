@@ -0,0 +1,140 @@
+import pytest
+
+from app import cli
+from app.autotune import (
+    TuneConfig,
+    TuneResult,
+    Workload,
+    candidate_grid,
+    choose_best,
+    percentile,
+    write_profile,
+)
+from app.core.config import Settings
+from app.services import image_processing
+from app.services.image_processing import ImagePipeline
+
+
+def result(config: TuneConfig, throughput: float, p95_ms: float, errors: int = 0) -> TuneResult:
+    return TuneResult(
+        config=config,
+        requests=100,
+        errors=errors,
+        seconds=100 / throughput,
+        p50_ms=1.0,
+        p95_ms=p95_ms,
+    )
+
+
+def test_candidate_grid_skips_oversubscribed_and_unused_dimensions():
+    grid = candidate_grid(8, background_removal=True)
+
+    assert TuneConfig(1, 1, 1, 1) in grid
+    assert TuneConfig(1, 2, 2, 4) in grid
+    assert TuneConfig(2, 2, 2, 1) in grid
+    # Pre-forked workers share single-threaded sessions, as in app.server.
+    assert all(config.onnx_threads == 1 for config in grid if config.workers > 1)
+    assert all(
+        config.workers * config.executor_threads * config.onnx_threads <= 16 for config in grid
+    )
+    assert all(config.rembg_sessions <= config.executor_threads for config in grid)
+
+    without_rembg = candidate_grid(8, background_removal=False, workers=[1, 4])
+    assert {(config.rembg_sessions, config.onnx_threads) for config in without_rembg} == {(1, 1)}
+    assert {config.workers for config in without_rembg} == {1, 4}
+
+    explicit = candidate_grid(16, True, workers=[1, 2], executor_threads=[1], onnx_threads=[2, 4])
+    assert {(config.workers, config.onnx_threads) for config in explicit} == {
+        (1, 2),
+        (1, 4),
+        (2, 1),
+    }
+
+
+def test_choose_best_prefers_throughput_within_the_latency_budget():
+    fast = result(TuneConfig(4, 2), throughput=40, p95_ms=900)
+    balanced = result(TuneConfig(2, 2), throughput=30, p95_ms=300)
+    slow = result(TuneConfig(1, 1), throughput=10, p95_ms=200)
+    broken = result(TuneConfig(8, 8), throughput=90, p95_ms=100, errors=3)
+
+    assert choose_best([fast, balanced, slow, broken]) is fast
+    assert choose_best([fast, balanced, slow], max_p95_ms=500) is balanced
+    assert choose_best([fast, balanced], max_p95_ms=50) is balanced
+    # Near-ties go to the cheaper configuration.
+    cheap = result(TuneConfig(1, 2), throughput=39.5, p95_ms=950)
+    assert choose_best([fast, cheap]) is cheap
+    with pytest.raises(ValueError):
+        choose_best([broken])
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+
+    assert percentile(values, 0.95) == 95
+    assert percentile(values, 0.5) == 50
+    assert percentile([], 0.95) == 0.0
+
+
+def test_written_profile_loads_into_settings(tmp_path):
+    best = result(TuneConfig(4, 2, 2, 3), throughput=12, p95_ms=250)
+    path = tmp_path / "host.env"
+    workload = Workload(requests=100, clients=8, image_size=512, background_removal=True)
+
+    write_profile(path, best, [best], workload, cpu_count=16)
+    loaded = Settings(_env_file=path, temp_dir=tmp_path, model_cache_dir=tmp_path)
+
+    assert path.read_text().startswith("# IconForge autotune profile for a 16-core host")
+    assert loaded.workers == 4
+    assert loaded.heavy_max_concurrency == 2
+    assert loaded.rembg_sessions == 2
+    assert loaded.onnx_intra_op_threads == 3
+
+
+def test_autotune_command_measures_grid_and_writes_profile(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    output = tmp_path / "profile.env"
+
+    code = cli.main(
+        [
+            "autotune",
+            "--no-background-removal",
+            "--workers", "1,2",
+            "--executor-threads", "1",
+            "--requests", "4",
+            "--clients", "2",
+            "--image-size", "64",
+            "--output", str(output),
+        ]
+    )
+
+    assert code == 0
+    printed = capsys.readouterr().out
+    assert printed.count("uploads/s") == 2
+    assert "errors 0" in printed
+    loaded = Settings(_env_file=output, temp_dir=tmp_path, model_cache_dir=tmp_path)
+    assert loaded.workers in (1, 2)
+    assert loaded.heavy_max_concurrency == 1
+
+
+def test_autotune_command_rejects_bad_grid_values(capsys):
+    with pytest.raises(SystemExit):
+        cli.main(["autotune", "--no-background-removal", "--workers", "0,2"])
+    assert "positive integers" in capsys.readouterr().err
+
+
+def test_rembg_sessions_are_handed_out_in_turn(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.services.image_processing.settings.rembg_sessions", 2)
+    created = []
+
+    def fake_session(model_name: str = "u2net", index: int = 0):
+        created.append(index)
+        return f"session-{index}"
+
+    monkeypatch.setattr(image_processing, "load_rembg_session", fake_session)
+    pipeline = ImagePipeline(background_removal_enabled=True)
+
+    handed_out = [pipeline._get_rembg_session() for _ in range(4)]
+
+    assert created == [0, 1]
+    assert handed_out == ["session-0", "session-1", "session-0", "session-1"]
@@ -0,0 +1,97 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app.services import image_processing
+from app.services.blobs import BlobStore, content_digest
+from app.services.image_processing import ImagePipeline
+
+
+def create_png(size: int = 64) -> bytes:
+    image = Image.new("RGBA", (size, size), (200, 40, 40, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_identical_content_is_stored_once_and_reference_counted(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    digest = content_digest(b"payload")
+
+    first = store.put(b"payload", owner="a")
+    second = store.put(b"payload", owner="b")
+
+    assert first == second == store.path_for(digest)
+    assert first.read_bytes() == b"payload"
+    assert store.ref_count(digest) == 2
+
+    assert store.release(digest, "a") is False
+    assert first.exists()
+    assert store.release(digest, "b") is True
+    assert not first.exists()
+    assert store.ref_count(digest) == 0
+
+
+def test_derived_data_lives_and_dies_with_its_source(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    digest = content_digest(b"source")
+
+    assert store.put_derived(digest, "matte.png", b"mask") is None
+    store.put(b"source", owner="a")
+    store.put_derived(digest, "matte.png", b"mask")
+    assert store.get_derived(digest, "matte.png") == b"mask"
+
+    store.release(digest, "a")
+
+    assert store.get_derived(digest, "matte.png") is None
+
+
+@pytest.mark.asyncio
+async def test_upload_keeps_original_bytes_and_reuses_matte(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=True)
+    calls = []
+
+    def fake_matte(image):
+        calls.append(image.size)
+        mask = Image.new("L", image.size, 0)
+        mask.paste(255, (16, 16, 48, 48))
+        return mask
+
+    monkeypatch.setattr(pipeline, "_compute_matte", fake_matte)
+    content = create_png()
+
+    first = await pipeline.process_upload(content, "cat.png")
+    second = await pipeline.process_upload(content, "same-cat.png")
+
+    assert calls == [(64, 64)]
+    assert first.original_path == second.original_path
+    assert first.original_path.read_bytes() == content
+    assert first.crop_box == second.crop_box
+    assert first.processed_path.read_bytes() == second.processed_path.read_bytes()
+
+    digest = content_digest(content)
+    assert pipeline._delete_material(first.material_id)
+    assert first.original_path.exists()
+    assert pipeline._delete_material(second.material_id)
+    assert not first.original_path.exists()
+    assert pipeline.blobs.get_derived(digest, image_processing.MATTE_KIND) is None
+
+
+@pytest.mark.asyncio
+async def test_upload_skips_full_resolution_png_encode(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    encoded_sizes = []
+    original_encode = image_processing.encode_png
+
+    def recording_encode(image):
+        encoded_sizes.append(image.size)
+        return original_encode(image)
+
+    monkeypatch.setattr(image_processing, "encode_png", recording_encode)
+
+    await pipeline.process_upload(create_png(512), "large.png")
+
+    assert encoded_sizes == [(256, 256)]
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import io
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core import deps
+from app.core.cancellation import (
+    ClientDisconnectedError,
+    DeadlineExceededError,
+    run_cancellable,
+)
+from app.main import app
+from app.services.image_processing import ImagePipeline
+
+
+def create_png(size: int, color=(90, 90, 250, 255)) -> bytes:
+    image = Image.new("RGBA", (size, size), color)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeRequest:
+    def __init__(self, disconnect_after: int | None = None):
+        self.checks = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self) -> bool:
+        self.checks += 1
+        return self.disconnect_after is not None and self.checks > self.disconnect_after
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_work():
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(ClientDisconnectedError):
+        await run_cancellable(FakeRequest(disconnect_after=1), work(), None, poll_interval=0.01)
+
+    assert cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_deadline_cancels_work():
+    with pytest.raises(DeadlineExceededError, match="0.05s deadline"):
+        await run_cancellable(FakeRequest(), asyncio.sleep(10), 0.05, poll_interval=0.01)
+
+
+@pytest.mark.asyncio
+async def test_completed_work_returns_result():
+    async def work():
+        return 42
+
+    assert await run_cancellable(FakeRequest(), work(), 1.0) == 42
+
+
+@pytest.mark.asyncio
+async def test_cancelled_upload_removes_partial_material(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    original_write = pipeline._write_bytes
+    writes = []
+
+    def slow_write(path, data):
+        writes.append(path.name)
+        if path.name == "processed_256.png":
+            time.sleep(0.2)
+        original_write(path, data)
+
+    monkeypatch.setattr(pipeline, "_write_bytes", slow_write)
+
+    content = create_png(32)
+    with pytest.raises(DeadlineExceededError):
+        await run_cancellable(FakeRequest(), pipeline.process_upload(content, "slow.png"), 0.1)
+    await asyncio.sleep(0.3)  # let the abandoned thread finish its write attempt
+
+    assert "processed_256.png" in writes
+    assert [path.name for path in tmp_path.iterdir()] == ["blobs"]
+    assert pipeline.blobs.ref_count(hashlib.sha256(content).hexdigest()) == 0
+    leftovers = [path for path in (tmp_path / "blobs").rglob("*") if path.is_file()]
+    assert [path.name for path in leftovers] == [".lock"]
+    assert len(pipeline.materials) == 0
+
+
+def test_upload_deadline_returns_504(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.core.config.settings.enable_background_removal", False)
+    monkeypatch.setattr("app.core.config.settings.upload_deadline_seconds", 0.05)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    original_load = pipeline._load_image
+
+    def slow_load(content):
+        time.sleep(0.2)
+        return original_load(content)
+
+    monkeypatch.setattr(pipeline, "_load_image", slow_load)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    try:
+        response = TestClient(app).post(
+            "/api/v1/materials/upload",
+            files={"file": ("slow.png", create_png(16), "image/png")},
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 504
+    assert response.json()["title"] == "Deadline Exceeded"
+
+
+@pytest.mark.asyncio
+async def test_upload_cancelled_during_blob_put_releases_the_blob(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    original_put = pipeline.blobs.put
+    finished = []
+
+    def slow_put(data, owner, digest=None):
+        time.sleep(0.2)
+        path = original_put(data, owner, digest)
+        finished.append(owner)
+        return path
+
+    monkeypatch.setattr(pipeline.blobs, "put", slow_put)
+
+    content = create_png(32, color=(1, 200, 3, 255))
+    with pytest.raises(DeadlineExceededError):
+        await run_cancellable(FakeRequest(), pipeline.process_upload(content, "slow.png"), 0.1)
+    await asyncio.sleep(0.3)  # the abandoned put lands, then its reference is dropped
+
+    assert finished
+    assert pipeline.blobs.ref_count(hashlib.sha256(content).hexdigest()) == 0
+    leftovers = [path for path in (tmp_path / "blobs").rglob("*") if path.is_file()]
+    assert [path.name for path in leftovers] == [".lock"]
+    assert [path.name for path in tmp_path.iterdir()] == ["blobs"]
+    assert len(pipeline.materials) == 0
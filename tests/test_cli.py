@@ -0,0 +1,110 @@
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from app.cli import MANIFEST_NAME, ForgeOptions, forge_directory, load_manifest, main
+
+
+def write_png(path, color=(200, 40, 40, 255)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    image = Image.new("RGBA", (120, 80), (0, 0, 0, 0))
+    image.paste(color, (20, 10, 100, 70))
+    image.save(path, format="PNG")
+
+
+@pytest.fixture
+def input_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.temp_dir", tmp_path / "temp")
+    source = tmp_path / "in"
+    write_png(source / "a.png")
+    write_png(source / "nested" / "b.png", color=(10, 200, 90, 255))
+    (source / "broken.png").write_bytes(b"not an image")
+    (source / "notes.txt").write_text("ignored")
+    return source
+
+
+OPTIONS = ForgeOptions("LANCZOS", "AREA", background_removal=False)
+
+
+def test_forge_directory_writes_icons_and_manifest(input_dir, tmp_path):
+    output = tmp_path / "out"
+    log = io.StringIO()
+
+    counts = forge_directory(input_dir, output, OPTIONS, workers=1, out=log)
+
+    assert counts == {"ok": 2, "failed": 1, "skipped": 0}
+    with Image.open(output / "nested" / "b.ico") as icon:
+        assert set(icon.info["sizes"]) == {(256, 256), (48, 48), (32, 32), (16, 16)}
+    entries = load_manifest(output / MANIFEST_NAME)
+    assert entries["a.png"].status == "ok"
+    assert entries["a.png"].output == "a.ico"
+    assert {"decode", "smart_crop", "resize", "pack_ico"} <= set(entries["a.png"].timings_ms)
+    assert entries["broken.png"].status == "failed"
+    assert "a.png" in log.getvalue() and "ms" in log.getvalue()
+
+
+def test_rerun_resumes_from_manifest(input_dir, tmp_path):
+    output = tmp_path / "out"
+    forge_directory(input_dir, output, OPTIONS, workers=1, out=io.StringIO())
+    write_png(input_dir / "a.png", color=(0, 0, 255, 255))
+
+    counts = forge_directory(input_dir, output, OPTIONS, workers=1, out=io.StringIO())
+
+    # Only the changed image and the previously failed one are processed again.
+    assert counts == {"ok": 1, "failed": 1, "skipped": 1}
+    other = ForgeOptions("NEAREST", "AREA", background_removal=False)
+    assert forge_directory(input_dir, output, other, workers=1, out=io.StringIO())["ok"] == 2
+
+
+def test_unexpected_errors_fail_only_their_image(input_dir, tmp_path, monkeypatch):
+    from app.services import image_processing
+
+    output = tmp_path / "out"
+    Image.new("RGBA", (77, 77), (10, 10, 10, 255)).save(input_dir / "odd.png")
+    smart_crop = image_processing.smart_crop
+
+    def flaky_crop(image, *args, **kwargs):
+        if image.size == (77, 77):
+            raise RuntimeError("crop exploded")
+        return smart_crop(image, *args, **kwargs)
+
+    monkeypatch.setattr(image_processing, "smart_crop", flaky_crop)
+
+    counts = forge_directory(input_dir, output, OPTIONS, workers=1, out=io.StringIO())
+
+    assert counts == {"ok": 2, "failed": 2, "skipped": 0}
+    entries = load_manifest(output / MANIFEST_NAME)
+    assert entries["odd.png"].status == "failed"
+    assert entries["odd.png"].error == "RuntimeError: crop exploded"
+
+
+def test_output_directory_inside_the_input_is_not_forged_again(input_dir):
+    output = input_dir / "icons"
+    forge_directory(input_dir, output, OPTIONS, workers=1, out=io.StringIO())
+
+    counts = forge_directory(input_dir, output, OPTIONS, workers=1, out=io.StringIO())
+
+    assert counts == {"ok": 0, "failed": 1, "skipped": 2}
+    assert not any(source.startswith("icons/") for source in load_manifest(output / MANIFEST_NAME))
+
+
+def test_manifest_ignores_torn_lines(tmp_path):
+    manifest = tmp_path / MANIFEST_NAME
+    entry = {"source": "a.png", "digest": "d", "options": "o", "status": "ok", "output": "a.ico"}
+    manifest.write_text(json.dumps(entry) + "\n" + '{"source": "b.p')
+
+    assert list(load_manifest(manifest)) == ["a.png"]
+
+
+def test_cli_uses_a_process_pool(input_dir, tmp_path, capsys):
+    output = tmp_path / "out"
+
+    exit_code = main(
+        ["forge", str(input_dir), str(output), "--workers", "2", "--no-background-removal"]
+    )
+
+    assert exit_code == 1  # broken.png failed
+    assert (output / "a.ico").is_file() and (output / "nested" / "b.ico").is_file()
+    assert "forged 2, failed 1, skipped 0" in capsys.readouterr().out
@@ -0,0 +1,296 @@
+import asyncio
+import io
+import random
+import threading
+
+import httpx
+import pytest
+from PIL import Image
+
+from app.core import deps
+from app.main import app
+from app.services.image_processing import ImagePipeline, MaterialNotFoundError, ResampleAlgorithm
+from app.services.state import MaterialRecord, MemoryStateBackend, OwnedCache, SQLiteStateBackend
+from app.services.storage import StorageQuotaExceededError
+
+ALGORITHMS = list(ResampleAlgorithm)
+
+
+def create_png(size: int, color) -> bytes:
+    image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    image.paste(color, (size // 8, size // 8, size - size // 8, size - size // 8))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def record(material_id: str) -> MaterialRecord:
+    return MaterialRecord(
+        material_id=material_id,
+        original_path=None,
+        processed_path=None,
+        width=256,
+        height=256,
+        crop_box=(0, 0, 1, 1),
+        padding=0,
+        created_at=0.0,
+        last_access=0.0,
+    )
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.core.config.settings.enable_background_removal", False)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    deleted: set[str] = set()
+    original = pipeline._delete_material
+
+    def tracking(material_id: str) -> bool:
+        removed = original(material_id)
+        if removed:
+            deleted.add(material_id)
+        return removed
+
+    monkeypatch.setattr(pipeline, "_delete_material", tracking)
+    pipeline.deleted = deleted
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    yield pipeline
+    app.dependency_overrides.clear()
+
+
+def assert_consistent(pipeline: ImagePipeline, uploaded: set[str], tmp_path) -> None:
+    live = set(pipeline.materials)
+    # No lost records: every upload is either still live or was evicted on purpose.
+    assert uploaded == live | pipeline.deleted
+    assert not live & pipeline.deleted
+    # No half-deleted materials and no orphaned directories.
+    directories = {path.name for path in tmp_path.iterdir() if path.is_dir()}
+    assert directories - {"blobs"} == live
+    for material_id in live:
+        material = pipeline.materials[material_id]
+        assert pipeline.store.read(material.processed_path)
+        assert material.raw_path.exists()
+    assert {key[0] for key in pipeline.preview_cache} <= live
+    assert {key[0] for key in pipeline.data_url_cache} <= live
+    assert pipeline.storage_usage().pinned_materials == 0
+
+
+@pytest.mark.asyncio
+async def test_pipeline_survives_concurrent_upload_preview_forge_and_eviction(pipeline, tmp_path):
+    rng = random.Random(7)
+    uploaded: set[str] = set()
+    failures: list[BaseException] = []
+    not_found = rejected = 0
+    first = await pipeline.process_upload(create_png(48, (1, 2, 3, 255)), "seed.png")
+    uploaded.add(first.material_id)
+    # Room for a handful of materials, so uploads keep evicting from executor threads.
+    pipeline.storage.quota_bytes = first.size_bytes * 8
+    tiny = create_png(16, (0, 255, 0, 255))
+    done = asyncio.Event()
+
+    async def uploader(worker: int) -> None:
+        nonlocal rejected
+        for index in range(12):
+            color = (worker * 40 % 256, index * 20 % 256, 90, 255)
+            try:
+                material = await pipeline.process_upload(create_png(48, color), "a.png")
+            except StorageQuotaExceededError:
+                rejected += 1  # every remaining material is pinned by a reader: back-pressure
+            except BaseException as exc:  # noqa: BLE001 - collected for the assertion
+                failures.append(exc)
+            else:
+                uploaded.add(material.material_id)
+
+    async def reader() -> None:
+        nonlocal not_found
+        while not done.is_set():
+            material_id = rng.choice(sorted(uploaded))
+            algo = rng.choice(ALGORITHMS)
+            action = rng.randrange(4)
+            try:
+                if action == 0:
+                    await pipeline.get_previews(material_id, algo, (48, 32))
+                elif action == 1:
+                    await pipeline.get_material_data_url(material_id)
+                elif action == 2:
+                    await pipeline.get_preview_data_url(material_id, algo, 16)
+                else:
+                    await pipeline.forge_icon(material_id, algo, tiny)
+            except MaterialNotFoundError:
+                not_found += 1
+            except BaseException as exc:  # noqa: BLE001 - collected for the assertion
+                failures.append(exc)
+
+    async def expirer() -> None:
+        while not done.is_set():
+            live = list(pipeline.materials)
+            if live:
+                pipeline.state.touch_material(rng.choice(live), 0.0)
+            try:
+                await asyncio.to_thread(pipeline._evict_expired)
+            except BaseException as exc:  # noqa: BLE001 - collected for the assertion
+                failures.append(exc)
+            await asyncio.sleep(0.001)
+
+    background = [asyncio.create_task(reader()) for _ in range(6)]
+    background.append(asyncio.create_task(expirer()))
+    await asyncio.gather(*(uploader(worker) for worker in range(3)))
+    done.set()
+    await asyncio.gather(*background)
+
+    assert failures == []
+    assert len(uploaded) > rejected
+    assert pipeline.deleted
+    assert not_found > 0
+    assert_consistent(pipeline, uploaded, tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_endpoints_answer_404_not_500_while_materials_are_evicted(pipeline, tmp_path):
+    transport = httpx.ASGITransport(app=app)
+    uploaded: set[str] = set()
+    statuses: list[int] = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for index in range(6):
+            response = await client.post(
+                "/api/v1/materials/upload",
+                files={"file": ("a.png", create_png(48, (index * 30, 0, 0, 255)), "image/png")},
+            )
+            assert response.status_code == 201
+            uploaded.add(response.json()["material_id"])
+
+        async def request(material_id: str, index: int) -> None:
+            if index % 3 == 0:
+                response = await client.get(f"/api/v1/materials/{material_id}")
+            elif index % 3 == 1:
+                response = await client.get(
+                    f"/api/v1/materials/{material_id}/preview",
+                    params={"algo": ALGORITHMS[index % len(ALGORITHMS)].value, "size": 32},
+                )
+            else:
+                response = await client.post(
+                    "/api/v1/forge",
+                    data={"source_id": material_id, "mid_algo": "LANCZOS"},
+                    files={"tiny_icon": ("t.png", create_png(16, (0, 0, 255, 255)), "image/png")},
+                )
+            statuses.append(response.status_code)
+
+        async def evict() -> None:
+            for material_id in sorted(uploaded):
+                pipeline.state.touch_material(material_id, 0.0)
+                await asyncio.to_thread(pipeline._evict_expired)
+
+        await asyncio.gather(
+            evict(),
+            *(
+                request(material_id, index)
+                for index, material_id in enumerate(sorted(uploaded) * 4)
+            ),
+        )
+
+    assert set(statuses) <= {200, 404}
+    assert_consistent(pipeline, uploaded, tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_leased_material_is_never_deleted(pipeline, tmp_path):
+    material = await pipeline.process_upload(create_png(48, (9, 9, 9, 255)), "a.png")
+
+    with pipeline.lease(material.material_id) as leased:
+        pipeline.state.touch_material(material.material_id, 0.0)
+        pipeline._evict_expired()
+        assert pipeline._delete_material(material.material_id) is False
+        assert pipeline.store.read(leased.processed_path)
+
+    with pipeline.storage.evicting(material.material_id) as claimed:
+        assert claimed
+        with pytest.raises(MaterialNotFoundError):
+            with pipeline.lease(material.material_id):
+                pass
+
+    assert pipeline._delete_material(material.material_id) is True
+    with pytest.raises(MaterialNotFoundError):
+        with pipeline.lease(material.material_id):
+            pass
+    assert not material.processed_path.parent.exists()
+
+
+def run_threads(target, count: int = 4) -> list[BaseException]:
+    failures: list[BaseException] = []
+
+    def guarded(worker: int) -> None:
+        try:
+            target(worker)
+        except BaseException as exc:  # noqa: BLE001 - collected for the assertion
+            failures.append(exc)
+
+    threads = [threading.Thread(target=guarded, args=(worker,)) for worker in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return failures
+
+
+def test_owned_cache_tolerates_concurrent_writers_readers_and_drops():
+    cache: OwnedCache[tuple[str, int], bytes] = OwnedCache()
+
+    def hammer(worker: int) -> None:
+        for index in range(3000):
+            owner = f"m{index % 7}"
+            if worker == 0:
+                cache.drop_owner(owner)
+            elif worker == 1:
+                assert all(key[0].startswith("m") for key in cache)
+            else:
+                cache[(owner, index)] = b"x"
+                cache.get((owner, index - 1))
+
+    assert run_threads(hammer) == []
+
+
+def test_memory_state_backend_tolerates_concurrent_writers_and_scans():
+    backend = MemoryStateBackend()
+
+    def hammer(worker: int) -> None:
+        for index in range(3000):
+            material_id = f"{worker}-{index % 50}"
+            if worker % 2:
+                backend.put_material(record(material_id))
+                backend.set_cache("preview", material_id, b"x", owner=material_id)
+            else:
+                backend.pop_material(f"{worker + 1}-{index % 50}")
+                backend.expired_material_ids(1.0)
+                backend.records_by_last_access()
+
+    assert run_threads(hammer) == []
+    assert all(
+        backend.get_material(owner) is not None
+        for (_, _), (_, owner) in backend._cache.items()
+    )
+
+
+def test_sqlite_state_backend_never_keeps_cache_rows_of_popped_owners(tmp_path):
+    backend = SQLiteStateBackend(tmp_path / "state.sqlite3")
+
+    def hammer(worker: int) -> None:
+        try:
+            for index in range(300):
+                material_id = f"{worker}-{index % 10}"
+                if worker % 2:
+                    backend.put_material(record(material_id))
+                    backend.set_cache("preview", material_id, b"x", owner=material_id)
+                else:
+                    backend.pop_material(f"{worker + 1}-{index % 10}")
+        finally:
+            backend.close()  # connections are per thread
+
+    assert run_threads(hammer) == []
+    orphans = backend._connection().execute(
+        "SELECT COUNT(*) FROM cache WHERE owner NOT IN (SELECT material_id FROM materials)"
+    ).fetchone()[0]
+    backend.close()
+    assert orphans == 0
+    backend.set_cache("preview", "gone", b"x", owner="never-stored")
+    assert backend.get_cache("preview", "gone") is None
@@ -0,0 +1,103 @@
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core import deps
+from app.core.fastjson import json_object, json_string
+from app.main import app
+from app.models.responses import MaterialResponse, PreviewResponse
+from app.services import image_processing
+from app.services.image_processing import ImagePipeline, ResampleAlgorithm, encode_image_base64
+
+
+def create_png(size: int, color=(0, 128, 255, 255)) -> bytes:
+    image = Image.new("RGBA", (size, size), color)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client_pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.core.config.settings.enable_background_removal", False)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    yield pipeline
+    app.dependency_overrides.clear()
+
+
+def test_json_object_splices_raw_fragments():
+    body = json_object(
+        {"name": "café \"quoted\"", "sizes": [1, 2]}, {"image_base64": json_string(b"data:x")}
+    )
+
+    assert json.loads(body) == {
+        "name": "café \"quoted\"",
+        "sizes": [1, 2],
+        "image_base64": "data:x",
+    }
+    assert json.loads(json_object({}, {"a": b"1"})) == {"a": 1}
+    assert json.loads(json_object({"a": 1})) == {"a": 1}
+
+
+def test_material_response_matches_pydantic_model(client_pipeline):
+    with TestClient(app) as client:
+        upload = client.post(
+            "/api/v1/materials/upload",
+            files={"file": ("source.png", create_png(64), "image/png")},
+        )
+        material_id = upload.json()["material_id"]
+        fetched = client.get(f"/api/v1/materials/{material_id}")
+
+    assert upload.status_code == 201
+    assert upload.headers["content-type"] == "application/json"
+    assert fetched.json() == upload.json()
+    payload = MaterialResponse.model_validate(fetched.json())
+    image_bytes = client_pipeline.store.read(client_pipeline.materials[material_id].processed_path)
+    assert payload.image_base64 == encode_image_base64(image_bytes)
+
+
+def test_repeated_get_reuses_encoded_data_url(client_pipeline, monkeypatch):
+    calls = []
+    original = image_processing.encode_data_url
+
+    def counting(data: bytes) -> bytes:
+        calls.append(len(data))
+        return original(data)
+
+    monkeypatch.setattr(image_processing, "encode_data_url", counting)
+    with TestClient(app) as client:
+        upload = client.post(
+            "/api/v1/materials/upload",
+            files={"file": ("source.png", create_png(64), "image/png")},
+        )
+        material_id = upload.json()["material_id"]
+        bodies = {client.get(f"/api/v1/materials/{material_id}").content for _ in range(3)}
+        params = {"algo": ResampleAlgorithm.NEAREST.value, "size": 32}
+        previews = [
+            client.get(f"/api/v1/materials/{material_id}/preview", params=params)
+            for _ in range(2)
+        ]
+
+    assert len(bodies) == 1
+    assert len(calls) == 2  # one for the material, one for the preview
+    preview = PreviewResponse.model_validate(previews[1].json())
+    assert preview.size == 32 and preview.algorithm == "NEAREST"
+    assert previews[0].content == previews[1].content
+
+
+def test_deleting_material_drops_cached_data_urls(client_pipeline):
+    with TestClient(app) as client:
+        upload = client.post(
+            "/api/v1/materials/upload",
+            files={"file": ("source.png", create_png(64), "image/png")},
+        )
+        material_id = upload.json()["material_id"]
+
+    assert any(key[0] == material_id for key in client_pipeline.data_url_cache)
+    client_pipeline._drop_local_previews(material_id)
+    assert not any(key[0] == material_id for key in client_pipeline.data_url_cache)
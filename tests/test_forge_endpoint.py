@@ -77,3 +77,21 @@ def test_forge_endpoint_rejects_bad_tiny_icon(pipeline):
 
     assert response.status_code == 400
     assert "16px" in response.json()["detail"]
+
+
+def test_forge_keeps_one_cached_ico_per_material_and_algorithm(pipeline):
+    material = asyncio.run(pipeline.process_upload(create_png(64), "source.png"))
+    tinies = [create_png(16, color=(0, 0, level, 255)) for level in (10, 20, 30)]
+
+    icons = [
+        asyncio.run(pipeline.forge_icon(material.material_id, ResampleAlgorithm.NEAREST, tiny))
+        for tiny in tinies
+    ]
+    again = asyncio.run(
+        pipeline.forge_icon(material.material_id, ResampleAlgorithm.NEAREST, tinies[-1])
+    )
+
+    assert again == icons[-1]
+    assert len(set(icons)) == 3
+    cached = [key for namespace, key in pipeline.state._cache if namespace == "ico"]
+    assert cached == [f"{material.material_id}:NEAREST"]
@@ -0,0 +1,159 @@
+import asyncio
+import io
+import struct
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core import deps
+from app.main import app
+from app.services import pack_ico as ico
+from app.services.image_processing import ImagePipeline, ResampleAlgorithm
+from app.services.pack_ico import decode_entry, largest_entry, pack_ico, parse_ico
+
+
+def create_png(size: int, color=(128, 128, 128, 255)) -> bytes:
+    image = Image.new("RGBA", (size, size), color)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def create_ico(sizes=(64, 32, 16), bitmap_format="png") -> bytes:
+    image = Image.new("RGBA", (max(sizes), max(sizes)), (0, 0, 0, 0))
+    image.paste((200, 30, 30, 255), (4, 4, max(sizes) - 4, max(sizes) - 4))
+    buffer = io.BytesIO()
+    image.save(
+        buffer, format="ICO", sizes=[(size, size) for size in sizes], bitmap_format=bitmap_format
+    )
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.core.config.settings.enable_background_removal", False)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    yield pipeline
+    app.dependency_overrides.clear()
+
+
+def test_parse_ico_is_the_inverse_of_pack_ico():
+    icons = {size: create_png(size, color=(size, 0, 0, 255)) for size in ico.EXPECTED_ICON_SIZES}
+
+    entries = parse_ico(pack_ico(icons))
+
+    assert [entry.width for entry in entries] == [256, 48, 32, 16]
+    assert all(entry.is_png and entry.bit_count == 32 for entry in entries)
+    assert pack_ico({}, keep=entries) == pack_ico(icons)
+
+
+@pytest.mark.parametrize("bitmap_format", ["png", "bmp"])
+def test_decode_entry_reads_png_and_bitmap_entries(bitmap_format):
+    entries = parse_ico(create_ico(bitmap_format=bitmap_format))
+
+    image = decode_entry(largest_entry(entries))
+
+    assert image.mode == "RGBA"
+    assert image.size == (64, 64)
+    assert image.getpixel((0, 0))[3] == 0
+    assert image.getpixel((32, 32)) == (200, 30, 30, 255)
+
+
+def _entry(width, size, offset):
+    return struct.pack("<BBBBHHII", width, width, 0, 0, 1, 32, size, offset)
+
+
+@pytest.mark.parametrize(
+    "content, message",
+    [
+        (b"\x00\x00\x01", "truncated"),
+        (struct.pack("<HHH", 0, 2, 1) + _entry(16, 8, 22) + b"\x00" * 8, "not an ICO"),
+        (struct.pack("<HHH", 0, 1, 0), "between 1 and"),
+        (struct.pack("<HHH", 0, 1, 2) + _entry(16, 8, 38), "directory is truncated"),
+        (struct.pack("<HHH", 0, 1, 1) + _entry(16, 64, 22) + ico.PNG_SIGNATURE, "outside"),
+        (struct.pack("<HHH", 0, 1, 1) + _entry(16, 8, 2) + b"\x00" * 8, "outside"),
+        (struct.pack("<HHH", 0, 1, 1) + _entry(16, 8, 22) + b"GIF89a\x00\x00", "neither"),
+        (
+            struct.pack("<HHH", 0, 1, 2)
+            + _entry(16, 12, 38)
+            + _entry(8, 8, 38)
+            + ico.PNG_SIGNATURE
+            + b"\x00" * 4,
+            "overlap",
+        ),
+    ],
+)
+def test_parse_ico_rejects_malformed_directories(content, message):
+    with pytest.raises(ValueError, match=message):
+        parse_ico(content)
+
+
+def test_malformed_ico_upload_is_rejected_before_decoding(pipeline, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("decoded a malformed upload")
+
+    monkeypatch.setattr(ico.Image, "open", fail)
+    content = struct.pack("<HHH", 0, 1, 1) + _entry(16, 4096, 22) + ico.PNG_SIGNATURE
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1/materials/upload",
+            files={"file": ("app.ico", content, "image/x-icon")},
+        )
+
+    assert response.status_code == 400
+    assert "outside the file" in response.json()["detail"]
+
+
+def test_upload_decodes_only_the_largest_entry(pipeline, monkeypatch):
+    decoded = []
+    original = ico.decode_entry
+
+    def tracking(entry):
+        decoded.append(entry.width)
+        return original(entry)
+
+    monkeypatch.setattr("app.services.image_processing.decode_entry", tracking)
+
+    material = asyncio.run(pipeline.process_upload(create_ico(), "app.ico"))
+
+    assert decoded == [64]
+    assert material.source_icon_sizes == (64, 32, 16)
+    assert (material.width, material.height) == (256, 256)
+
+
+def test_forge_reuses_untouched_source_entries(pipeline):
+    source = create_ico(sizes=(64, 24, 16), bitmap_format="bmp")
+    source_entries = {entry.width: entry for entry in parse_ico(source)}
+    material = asyncio.run(pipeline.process_upload(source, "app.ico"))
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1/forge",
+            data={"source_id": material.material_id, "mid_algo": ResampleAlgorithm.NEAREST.value},
+        )
+
+    assert response.status_code == 200
+    forged = {entry.width: entry for entry in parse_ico(response.content)}
+    assert sorted(forged, reverse=True) == [256, 64, 48, 32, 24, 16]
+    # Sizes that were not regenerated are copied byte for byte, bitmaps included.
+    for size in (64, 24, 16):
+        assert forged[size].data == source_entries[size].data
+        assert not forged[size].is_png
+    assert all(forged[size].is_png for size in (256, 48, 32))
+
+
+def test_forge_still_requires_tiny_icon_for_non_ico_materials(pipeline):
+    material = asyncio.run(pipeline.process_upload(create_png(64), "source.png"))
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1/forge",
+            data={"source_id": material.material_id, "mid_algo": ResampleAlgorithm.NEAREST.value},
+        )
+
+    assert response.status_code == 400
+    assert "include 16" in response.json()["detail"]
@@ -8,8 +8,10 @@ from app.services.image_processing import (
     MaterialNotFoundError,
     ResampleAlgorithm,
     resize_image,
+    resize_images,
     smart_crop,
 )
+from app.services.material_store import open_raw_rgba, raw_rgba_array
 
 
 def create_alpha_image(width: int, height: int, box: tuple[int, int, int, int]) -> Image.Image:
@@ -80,7 +82,7 @@ async def test_pipeline_crops_without_background_removal(monkeypatch, tmp_path):
 
     monkeypatch.setattr(
         pipeline,
-        "_remove_background",
+        "_compute_matte",
         lambda image: (_ for _ in ()).throw(AssertionError("rembg should be skipped")),
     )
 
@@ -104,6 +106,27 @@ async def test_pipeline_rejects_non_image(monkeypatch, tmp_path):
         await pipeline.process_upload(b"not an image", "fake.png")
 
 
+def test_prepare_image_runs_the_upload_stages_synchronously(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=True)
+    monkeypatch.setattr(pipeline, "_compute_matte", lambda image: Image.new("L", image.size, 0))
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 10), (200, 10, 10)).save(buffer, format="PNG")
+    stages = []
+
+    def stage(name, func, *args):
+        stages.append(name)
+        return func(*args)
+
+    image = pipeline.prepare_image(buffer.getvalue(), "photo.png", stage)
+
+    assert stages == ["validate", "validate", "decode", "rembg", "apply_matte"]
+    assert image.mode == "RGBA" and image.size == (20, 10)
+    assert image.getextrema()[3] == (0, 0)
+    with pytest.raises(ValueError, match="valid image"):
+        pipeline.prepare_image(b"not an image", "fake.png")
+
+
 @pytest.mark.asyncio
 async def test_pipeline_rejects_oversized_upload(monkeypatch, tmp_path):
     monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
@@ -189,3 +212,83 @@ async def test_expired_materials_purge_preview_cache(monkeypatch, tmp_path):
     assert pipeline.preview_cache == {}
     assert record.material_id not in pipeline.materials
     assert not (tmp_path / record.material_id).exists()
+
+
+@pytest.mark.asyncio
+async def test_process_upload_writes_raw_rgba_sidecar(monkeypatch, tmp_path):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    buffer = io.BytesIO()
+    create_alpha_image(64, 64, (10, 10, 30, 30)).save(buffer, format="PNG")
+
+    record = await pipeline.process_upload(buffer.getvalue(), "raw.png")
+
+    assert record.raw_path.stat().st_size == 256 * 256 * 4
+    frame = open_raw_rgba(record.raw_path, record.width, record.height)
+    with Image.open(record.processed_path) as png:
+        assert frame.tobytes() == png.convert("RGBA").tobytes()
+    array = raw_rgba_array(record.raw_path, record.width, record.height)
+    assert array.shape == (256, 256, 4)
+    assert not array.flags.writeable
+
+
+@pytest.mark.asyncio
+async def test_cold_preview_reads_sidecar_without_decoding(monkeypatch, tmp_path):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    buffer = io.BytesIO()
+    create_alpha_image(64, 64, (10, 10, 30, 30)).save(buffer, format="PNG")
+    record = await pipeline.process_upload(buffer.getvalue(), "raw.png")
+
+    monkeypatch.setattr(
+        pipeline,
+        "_load_image",
+        lambda content: (_ for _ in ()).throw(AssertionError("PNG should not be decoded")),
+    )
+    preview = await pipeline.get_preview_bytes(record.material_id, ResampleAlgorithm.NEAREST, 32)
+
+    assert Image.open(io.BytesIO(preview)).size == (32, 32)
+
+
+@pytest.mark.asyncio
+async def test_preview_falls_back_to_png_without_sidecar(monkeypatch, tmp_path):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    buffer = io.BytesIO()
+    create_alpha_image(64, 64, (10, 10, 30, 30)).save(buffer, format="PNG")
+    record = await pipeline.process_upload(buffer.getvalue(), "raw.png")
+    record.raw_path.write_bytes(b"truncated")
+
+    preview = await pipeline.get_preview_bytes(record.material_id, ResampleAlgorithm.BILINEAR, 48)
+
+    assert open_raw_rgba(record.raw_path, record.width, record.height) is None
+    assert Image.open(io.BytesIO(preview)).size == (48, 48)
+
+
+@pytest.mark.asyncio
+async def test_previews_resize_all_cache_misses_in_one_pass(monkeypatch, tmp_path):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    buffer = io.BytesIO()
+    create_alpha_image(64, 64, (10, 10, 30, 30)).save(buffer, format="PNG")
+    record = await pipeline.process_upload(buffer.getvalue(), "batch.png")
+    calls = []
+    original = resize_images
+
+    def counting_resize(image, sizes, algo):
+        calls.append(tuple(sizes))
+        return original(image, sizes, algo)
+
+    monkeypatch.setattr("app.services.image_processing.resize_images", counting_resize)
+    single = await pipeline.get_preview_bytes(record.material_id, ResampleAlgorithm.MITCHELL, 48)
+    previews = await pipeline.get_previews(
+        record.material_id, ResampleAlgorithm.MITCHELL, (48, 32, 16)
+    )
+
+    assert calls == [(48,), (32, 16)]
+    assert previews[48] == single
+    assert {size: Image.open(io.BytesIO(data)).size[0] for size, data in previews.items()} == {
+        48: 48,
+        32: 32,
+        16: 16,
+    }
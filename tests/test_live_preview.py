@@ -0,0 +1,142 @@
+import asyncio
+import io
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.websockets import WebSocketDisconnect
+
+from app.core import deps
+from app.main import app
+from app.services.image_processing import ImagePipeline, ResampleAlgorithm
+from app.services.live_preview import LatestCommand, PreviewCommand, PreviewSession
+
+
+def create_png(size: int = 96) -> bytes:
+    image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    image.paste((255, 0, 0, 255), (size // 4, size // 4, size * 3 // 4, size * 3 // 4))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.core.config.settings.enable_background_removal", False)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    yield pipeline
+    app.dependency_overrides.clear()
+
+
+def test_live_preview_streams_png_frames(pipeline):
+    record = asyncio.run(pipeline.process_upload(create_png(), "live.png"))
+    client = TestClient(app)
+
+    with client.websocket_connect(f"/api/v1/materials/{record.material_id}/live") as ws:
+        ready = ws.receive_json()
+        assert ready["type"] == "ready"
+        assert "MAJORITY" in ready["algorithms"]
+        assert pipeline.storage.is_pinned(record.material_id)
+
+        frames = {}
+        commands = [("NEAREST", 32), ("LANCZOS", 48), ("NEAREST", 32)]
+        for request_id, (algo, size) in enumerate(commands):
+            ws.send_json({"id": request_id, "algo": algo, "size": size})
+            header = ws.receive_json()
+            data = ws.receive_bytes()
+            assert header["type"] == "frame" and header["id"] == request_id
+            assert header["bytes"] == len(data)
+            assert Image.open(io.BytesIO(data)).size == (size, size)
+            frames.setdefault((algo, size), set()).add(data)
+
+        assert len(frames[("NEAREST", 32)]) == 1  # toggling back is served from the session
+
+        ws.send_json({"algo": "NEAREST", "size": 32, "padding": 8})
+        ws.receive_json()
+        assert ws.receive_bytes() not in frames[("NEAREST", 32)]
+
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"algo": "LANCZOS", "size": 256})
+        assert "size" in ws.receive_json()["detail"]
+
+    deadline = time.monotonic() + 2
+    while pipeline.storage.is_pinned(record.material_id) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not pipeline.storage.is_pinned(record.material_id)
+
+
+def test_live_preview_closes_the_socket_when_sending_a_frame_fails(pipeline, monkeypatch):
+    record = asyncio.run(pipeline.process_upload(create_png(), "live.png"))
+    client = TestClient(app)
+
+    async def broken_send_bytes(self, data):
+        raise RuntimeError("send failed")
+
+    monkeypatch.setattr("starlette.websockets.WebSocket.send_bytes", broken_send_bytes)
+
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        with client.websocket_connect(f"/api/v1/materials/{record.material_id}/live") as ws:
+            assert ws.receive_json()["type"] == "ready"
+            ws.send_json({"id": 1, "algo": "NEAREST", "size": 32})
+            assert ws.receive_json()["type"] == "frame"
+            ws.receive_bytes()
+
+    assert excinfo.value.code == 1011
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        {"size": 48.0},
+        {"size": True},
+        {"padding": True},
+        {"padding": 2.0},
+        {"id": False},
+        {"id": 1.5},
+    ],
+)
+def test_preview_command_rejects_non_integer_fields(command):
+    with pytest.raises(ValueError):
+        PreviewCommand.parse(json.dumps(command))
+
+
+def test_live_preview_rejects_unknown_material(pipeline):
+    client = TestClient(app)
+
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        with client.websocket_connect("/api/v1/materials/missing/live") as ws:
+            ws.receive_json()
+
+    assert excinfo.value.code == 4404
+
+
+@pytest.mark.asyncio
+async def test_newer_commands_supersede_pending_ones():
+    mailbox = LatestCommand()
+    for size in (48, 32, 16):
+        mailbox.put(PreviewCommand(request_id=size, algo=ResampleAlgorithm.NEAREST, size=size))
+
+    command = await mailbox.get()
+
+    assert command.size == 16
+    assert mailbox.superseded == 2
+    assert not mailbox.pending()
+
+
+@pytest.mark.asyncio
+async def test_session_keeps_material_from_expiring(pipeline, monkeypatch):
+    record = await pipeline.process_upload(create_png(), "pinned.png")
+    session = await PreviewSession.open(pipeline, record.material_id)
+    monkeypatch.setattr("app.services.image_processing.settings.material_ttl_seconds", -1)
+
+    pipeline._evict_expired()
+    assert record.material_id in pipeline.materials
+    session.close()
+    pipeline._evict_expired()
+
+    assert record.material_id not in pipeline.materials
@@ -0,0 +1,133 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.services.image_processing import ImagePipeline
+from app.services.perceptual import PerceptualIndex, compute_hashes, hamming_distances
+
+
+def textured_logo(size: int = 256, seed: int = 90) -> Image.Image:
+    base = Image.effect_noise((size, size), seed).filter(ImageFilter.GaussianBlur(size // 64))
+    logo = base.convert("RGBA")
+    mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(mask).ellipse((size // 8, size // 8, size * 7 // 8, size * 7 // 8), fill=255)
+    logo.putalpha(mask)
+    return logo
+
+
+def encode(image: Image.Image, fmt: str = "PNG", **params) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        flattened = Image.new("RGB", image.size, (255, 255, 255))
+        flattened.paste(image, mask=image.getchannel("A"))
+        image = flattened
+    image.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+
+def hash_distance(first, second) -> int:
+    return max(
+        bin(first.dhash ^ second.dhash).count("1"), bin(first.phash ^ second.phash).count("1")
+    )
+
+
+def test_hashes_survive_reencoding_and_resizing_but_not_new_content():
+    logo = textured_logo()
+    reference = compute_hashes(logo)
+    jpeg = compute_hashes(Image.open(io.BytesIO(encode(logo, "JPEG", quality=70))))
+    resized = compute_hashes(logo.resize((180, 180)))
+    other = compute_hashes(textured_logo(seed=40).rotate(90))
+
+    assert hash_distance(reference, jpeg) <= 10
+    assert hash_distance(reference, resized) <= 10
+    assert hash_distance(reference, other) > 10
+
+
+def test_index_matches_vectorised_and_respects_aspect_ratio():
+    import numpy as np
+
+    assert list(hamming_distances(np.array([0b1011, 0], dtype=np.uint64), 0b0001)) == [2, 1]
+    index = PerceptualIndex(capacity=2)
+    square = compute_hashes(textured_logo())
+    index.add("a", square)
+    index.add("b", compute_hashes(textured_logo(seed=40)))
+
+    assert index.closest(square, max_distance=0) == ["a"]
+    wide = type(square)(dhash=square.dhash, phash=square.phash, aspect=2.0)
+    assert index.closest(wide, max_distance=64) == []
+
+    index.add("c", square)
+    assert len(index) == 2  # capacity evicts the oldest entry
+    assert index.closest(square, max_distance=0) == ["c"]
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=True)
+    pipeline.matte_calls = []
+
+    def fake_matte(image):
+        pipeline.matte_calls.append(image.size)
+        mask = Image.new("L", image.size, 0)
+        width, height = image.size
+        box = (width // 8, height // 8, width * 7 // 8, height * 7 // 8)
+        ImageDraw.Draw(mask).ellipse(box, fill=255)
+        return mask
+
+    monkeypatch.setattr(pipeline, "_compute_matte", fake_matte)
+    return pipeline
+
+
+@pytest.mark.asyncio
+async def test_near_duplicates_reuse_the_rescaled_matte(pipeline):
+    logo = textured_logo()
+    first = await pipeline.process_upload(encode(logo), "logo.png")
+    resaved = await pipeline.process_upload(
+        encode(logo.resize((200, 200)), "JPEG", quality=80), "logo.jpg"
+    )
+
+    assert pipeline.matte_calls == [(256, 256)]
+    assert abs(resaved.crop_box[2] / 200 - first.crop_box[2] / 256) < 0.02
+
+    await pipeline.process_upload(encode(textured_logo(seed=40).rotate(90)), "other.png")
+    assert len(pipeline.matte_calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_matte_reuse_can_be_disabled_or_tightened(pipeline, monkeypatch):
+    logo = textured_logo()
+    await pipeline.process_upload(encode(logo), "logo.png")
+
+    monkeypatch.setattr("app.services.image_processing.settings.enable_matte_reuse", False)
+    await pipeline.process_upload(encode(logo, "JPEG", quality=60), "opt-out.jpg")
+    monkeypatch.setattr("app.services.image_processing.settings.enable_matte_reuse", True)
+    monkeypatch.setattr("app.services.image_processing.settings.matte_reuse_max_distance", 0)
+    await pipeline.process_upload(encode(logo.resize((150, 150)), "JPEG", quality=40), "strict.jpg")
+
+    assert len(pipeline.matte_calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_evicted_sources_are_dropped_from_the_index(pipeline):
+    logo = textured_logo()
+    record = await pipeline.process_upload(encode(logo), "logo.png")
+    assert pipeline._delete_material(record.material_id)
+
+    await pipeline.process_upload(encode(logo, "JPEG", quality=80), "logo.jpg")
+
+    assert len(pipeline.matte_calls) == 2
+    assert len(pipeline.perceptual_index) == 1  # only the fresh upload
+
+
+@pytest.mark.asyncio
+async def test_stored_matte_is_charged_to_the_material(pipeline):
+    from app.services.image_processing import MATTE_KIND, content_digest
+
+    content = encode(textured_logo())
+    record = await pipeline.process_upload(content, "logo.png")
+
+    matte = pipeline.blobs.get_derived(content_digest(content), MATTE_KIND)
+    processed = record.processed_path.read_bytes()
+    assert record.size_bytes == len(content) + len(processed) + 256 * 256 * 4 + len(matte)
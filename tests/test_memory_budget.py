@@ -0,0 +1,139 @@
+"""Allocation budgets for the hot paths, measured with tracemalloc.
+
+tracemalloc sees Python objects and NumPy buffers but not Pillow's internal
+image memory, so these budgets catch extra copies, byte round trips and
+array materialisation rather than the decode itself.
+"""
+
+import io
+import tracemalloc
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core import deps
+from app.core.metrics import REGISTRY, StageTimings, stage_timings_ctx_var, track_stage
+from app.main import app
+from app.services.image_processing import ImagePipeline, ResampleAlgorithm, smart_crop
+from app.services.pack_ico import pack_ico
+
+KiB = 1024
+MiB = 1024 * KiB
+
+
+@contextmanager
+def traced_peak():
+    result = {}
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    try:
+        yield result
+    finally:
+        result["peak"] = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+
+
+def source_png(size: int) -> bytes:
+    image = Image.linear_gradient("L").resize((size, size)).convert("RGBA")
+    image.putalpha(0)
+    margin = size // 8
+    image.paste((40, 120, 220, 255), (margin, margin, size - margin, size - margin))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def icon_png(size: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.effect_noise((size, size), 64).convert("RGBA").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    return ImagePipeline(background_removal_enabled=False)
+
+
+def test_smart_crop_does_not_materialise_the_frame():
+    image = Image.open(io.BytesIO(source_png(2048))).convert("RGBA")
+
+    with traced_peak() as traced:
+        smart_crop(image)
+
+    # A NumPy copy of this frame alone would be 16 MiB.
+    assert traced["peak"] < 256 * KiB
+
+
+@pytest.mark.asyncio
+async def test_process_upload_budget(pipeline):
+    content = source_png(2048)
+    await pipeline.process_upload(source_png(64), "warm.png")
+
+    with traced_peak() as traced:
+        await pipeline.process_upload(content, "large.png")
+
+    # The 256px PNG and raw sidecar (256 KiB) are the only frame-sized allocations.
+    assert traced["peak"] < 2 * MiB
+
+
+@pytest.mark.asyncio
+async def test_cold_preview_budget(pipeline):
+    record = await pipeline.process_upload(source_png(512), "preview.png")
+
+    for algo in (ResampleAlgorithm.LANCZOS, ResampleAlgorithm.NEAREST):
+        pipeline.preview_cache.clear()
+        with traced_peak() as traced:
+            await pipeline.get_preview_bytes(record.material_id, algo, 48)
+        assert traced["peak"] < 1 * MiB, algo
+
+
+def test_pack_ico_budget():
+    icons = {size: icon_png(size) for size in (256, 48, 32, 16)}
+
+    with traced_peak() as traced:
+        ico = pack_ico(icons)
+
+    assert traced["peak"] < 4 * len(ico) + 1 * MiB
+
+
+def test_track_stage_records_allocation_peaks():
+    timings = StageTimings()
+    token = stage_timings_ctx_var.set(timings)
+    try:
+        tracemalloc.start()
+        timings.base_bytes = tracemalloc.get_traced_memory()[0]
+        held = bytearray(2 * MiB)
+        with track_stage("alloc_test"):
+            scratch = bytearray(4 * MiB)
+            del scratch
+    finally:
+        tracemalloc.stop()
+        stage_timings_ctx_var.reset(token)
+
+    assert 4 * MiB <= timings.allocation_peaks()["alloc_test"] < 5 * MiB
+    assert timings.peak_bytes >= 6 * MiB
+    del held
+
+
+def test_requests_report_peaks_when_tracing_is_enabled(pipeline, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.enable_memory_tracing", True)
+    monkeypatch.setattr("app.core.config.settings.enable_warmup", False)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    try:
+        with TestClient(app) as client:
+            assert tracemalloc.is_tracing()
+            response = client.post(
+                "/api/v1/materials/upload",
+                files={"file": ("traced.png", source_png(128), "image/png")},
+            )
+            assert response.status_code == 201
+        assert not tracemalloc.is_tracing()
+    finally:
+        app.dependency_overrides.clear()
+
+    rendered = REGISTRY.render()
+    assert 'iconforge_stage_peak_allocation_bytes_count{stage="decode"}' in rendered
+    assert "iconforge_request_peak_allocation_bytes_count" in rendered
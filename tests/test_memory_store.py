@@ -0,0 +1,133 @@
+import builtins
+import io
+import os
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from app.core.config import Settings
+from app.services.image_processing import (
+    ImagePipeline,
+    MaterialNotFoundError,
+    ResampleAlgorithm,
+)
+from app.services.material_store import (
+    DiskMaterialStore,
+    MemoryMaterialStore,
+    create_material_store,
+)
+
+
+def create_png(color=(30, 120, 220, 255)) -> bytes:
+    image = Image.new("RGBA", (64, 64), (0, 0, 0, 0))
+    image.paste(color, (8, 8, 56, 56))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def tiny_png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGBA", (16, 16), (1, 2, 3, 255)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def forbid_filesystem(monkeypatch):
+    def forbidden(*args, **kwargs):
+        raise AssertionError("filesystem access in memory mode")
+
+    for name in ("mkdir", "write_bytes", "read_bytes", "exists", "iterdir", "touch", "unlink"):
+        monkeypatch.setattr(Path, name, forbidden)
+    monkeypatch.setattr(builtins, "open", forbidden)
+    monkeypatch.setattr(os, "scandir", forbidden)
+    monkeypatch.setattr(os, "replace", forbidden)
+
+
+@pytest.mark.asyncio
+async def test_memory_store_runs_upload_preview_forge_without_filesystem(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path / "unused")
+    pipeline = ImagePipeline(
+        background_removal_enabled=False,
+        store=MemoryMaterialStore(tmp_path / "unused", capacity_bytes=64 * 1024 * 1024),
+    )
+
+    with pytest.MonkeyPatch.context() as patch:
+        forbid_filesystem(patch)
+        record = await pipeline.process_upload(create_png(), "memory.png")
+        base = await pipeline.get_material_bytes(record.material_id)
+        preview = await pipeline.get_preview_bytes(
+            record.material_id, ResampleAlgorithm.BILINEAR, 48
+        )
+        ico = await pipeline.forge_icon(record.material_id, ResampleAlgorithm.LANCZOS, tiny_png())
+        pipeline.collect_metrics()
+
+    assert Image.open(io.BytesIO(base)).size == (256, 256)
+    assert Image.open(io.BytesIO(preview)).size == (48, 48)
+    assert ico[:4] == b"\x00\x00\x01\x00"
+    assert not (tmp_path / "unused").exists()
+
+
+@pytest.mark.asyncio
+async def test_memory_store_enforces_cap_and_ttl(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    store = MemoryMaterialStore(tmp_path, capacity_bytes=None)
+    pipeline = ImagePipeline(background_removal_enabled=False, store=store)
+
+    first = await pipeline.process_upload(create_png((255, 0, 0, 255)), "a.png")
+    pipeline.storage.quota_bytes = int(first.size_bytes * 1.5)
+    second = await pipeline.process_upload(create_png((0, 255, 0, 255)), "b.png")
+
+    with pytest.raises(MaterialNotFoundError):
+        await pipeline.get_material(first.material_id)
+    assert store.usage_bytes() <= first.size_bytes * 1.5
+
+    monkeypatch.setattr("app.services.image_processing.settings.material_ttl_seconds", -1)
+    with pytest.raises(MaterialNotFoundError):
+        await pipeline.get_material(second.material_id)
+    assert store.usage_bytes() == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_memory_store_cap_counts_cached_outputs(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(
+        background_removal_enabled=False, store=MemoryMaterialStore(tmp_path, capacity_bytes=None)
+    )
+    first = await pipeline.process_upload(create_png(), "a.png")
+    for algo in ResampleAlgorithm:
+        await pipeline.get_preview_data_url(first.material_id, algo, 48)
+    await pipeline.get_material_data_url(first.material_id)
+    ico = await pipeline.forge_icon(first.material_id, ResampleAlgorithm.NEAREST, tiny_png())
+
+    cached = pipeline.storage_usage().used_bytes - first.size_bytes
+    previews = sum(len(data) for data in pipeline.preview_cache._data.values())
+    data_urls = sum(len(data) for data in pipeline.data_url_cache._data.values())
+    assert cached == previews + data_urls + 32 + len(ico)
+
+    # Room for two bare materials, but not once the first one's caches count.
+    pipeline.storage.quota_bytes = 2 * first.size_bytes + cached // 2
+    await pipeline.process_upload(create_png(), "b.png")
+
+    with pytest.raises(MaterialNotFoundError):
+        await pipeline.get_material(first.material_id)
+    usage = pipeline.storage_usage()
+    assert usage.used_bytes <= usage.quota_bytes
+    assert pipeline.data_url_cache._data == {}
+
+
+def test_create_material_store_from_settings(tmp_path):
+    disk = create_material_store(Settings(temp_dir=tmp_path, storage_quota_bytes=10))
+    memory = create_material_store(
+        Settings(temp_dir=tmp_path, material_store="memory", memory_store_max_bytes=1024)
+    )
+
+    assert isinstance(disk, DiskMaterialStore) and disk.capacity_bytes == 10
+    assert isinstance(memory, MemoryMaterialStore) and memory.capacity_bytes == 1024
+    with pytest.raises(ValueError, match="STATE_BACKEND=memory"):
+        create_material_store(
+            Settings(temp_dir=tmp_path, material_store="memory", state_backend="sqlite")
+        )
@@ -0,0 +1,107 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core import deps
+from app.core.metrics import MetricsRegistry, STAGE_DURATION
+from app.main import app
+from app.services.image_processing import ImagePipeline, ResampleAlgorithm
+
+
+def create_png(size: int, color=(255, 0, 0, 255)) -> bytes:
+    image = Image.new("RGBA", (size, size), color)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client_pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.core.config.settings.enable_background_removal", False)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    yield pipeline
+    app.dependency_overrides.clear()
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter("demo_total", "Demo counter.", ("kind",))
+    histogram = registry.histogram("demo_seconds", "Demo histogram.", buckets=(0.1, 1.0))
+
+    counter.inc(kind="a")
+    counter.inc(2, kind="a")
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+
+    text = registry.render()
+
+    assert "# TYPE demo_total counter" in text
+    assert 'demo_total{kind="a"} 3' in text
+    assert 'demo_seconds_bucket{le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{le="1"} 2' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 2' in text
+    assert "demo_seconds_count 2" in text
+
+
+def test_metric_rejects_unknown_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("demo_total", "Demo counter.", ("kind",))
+
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+
+def test_metrics_endpoint_reports_stages_and_cache(client_pipeline):
+    decode_before = STAGE_DURATION.count(stage="decode")
+
+    with TestClient(app) as client:
+        upload = client.post(
+            "/api/v1/materials/upload",
+            files={"file": ("source.png", create_png(64), "image/png")},
+        )
+        material_id = upload.json()["material_id"]
+        for _ in range(2):
+            client.get(
+                f"/api/v1/materials/{material_id}/preview",
+                params={"algo": ResampleAlgorithm.NEAREST.value, "size": 32},
+            )
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    for stage in ("validate", "decode", "smart_crop", "resize", "png_encode", "disk_write", "disk_read"):
+        assert f'iconforge_stage_duration_seconds_count{{stage="{stage}"}}' in body
+    assert 'iconforge_cache_hits_total{cache="preview"}' in body
+    assert 'iconforge_cache_misses_total{cache="preview"}' in body
+    assert "iconforge_materials_live 1" in body
+    assert 'iconforge_executor_queue_depth{lane="interactive"} 0' in body
+    assert 'iconforge_executor_queue_depth{lane="heavy"} 0' in body
+    assert STAGE_DURATION.count(stage="decode") > decode_before
+
+
+def test_metrics_endpoint_can_be_disabled(client_pipeline, monkeypatch):
+    monkeypatch.setattr("app.main.settings.enable_metrics", False)
+
+    with TestClient(app) as client:
+        response = client.get("/metrics")
+
+    assert response.status_code == 404
+
+
+def test_metrics_endpoint_requires_the_configured_api_key(client_pipeline, monkeypatch):
+    monkeypatch.setattr("app.core.security.settings.require_api_key", "secret")
+
+    with TestClient(app) as client:
+        missing = client.get("/metrics")
+        wrong = client.get("/metrics", headers={"X-API-Key": "nope"})
+        allowed = client.get("/metrics", headers={"X-API-Key": "secret"})
+
+    assert missing.status_code == 401
+    assert wrong.status_code == 401
+    assert allowed.status_code == 200
+    assert "iconforge_stage_duration_seconds" in allowed.text
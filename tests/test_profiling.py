@@ -0,0 +1,155 @@
+import asyncio
+import io
+import os
+import pstats
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core import deps
+from app.core.profiling import RequestProfile, prune_profiles
+from app.main import ProfilingMiddleware, app
+from app.services.image_processing import ImagePipeline
+
+
+def create_png(size: int, color=(255, 128, 0, 255)) -> bytes:
+    image = Image.new("RGBA", (size, size), color)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def profiled_client(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path / "temp")
+    monkeypatch.setattr("app.core.config.settings.enable_background_removal", False)
+    monkeypatch.setattr("app.main.settings.enable_profiling", True)
+    monkeypatch.setattr("app.main.settings.require_api_key", "secret")
+    monkeypatch.setattr("app.main.settings.profile_dir", tmp_path / "profiles")
+    (tmp_path / "temp").mkdir()
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    yield TestClient(app), tmp_path / "profiles"
+    app.dependency_overrides.clear()
+
+
+def test_profile_header_writes_profile(profiled_client):
+    client, profile_dir = profiled_client
+
+    response = client.post(
+        "/api/v1/materials/upload",
+        files={"file": ("source.png", create_png(64), "image/png")},
+        headers={"X-IconForge-Profile": "1", "X-API-Key": "secret"},
+    )
+
+    assert response.status_code == 201
+    profile_id = response.headers["X-Profile-ID"]
+    path = profile_dir / f"{profile_id}.prof"
+    assert path.exists()
+
+    stats = pstats.Stats(str(path))
+    functions = {name for _, _, name in stats.stats}
+    assert "smart_crop" in functions
+
+
+@pytest.mark.asyncio
+async def test_profiled_streaming_responses_are_passed_through(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.main.settings.enable_profiling", True)
+    monkeypatch.setattr("app.main.settings.require_api_key", "secret")
+    monkeypatch.setattr("app.main.settings.profile_dir", tmp_path)
+    first_event_delivered = asyncio.Event()
+    sent = []
+
+    async def event_stream(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"data: 1\n\n", "more_body": True})
+        # A buffering middleware would only deliver the event after we return.
+        await asyncio.wait_for(first_event_delivered.wait(), timeout=2)
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def send(message):
+        sent.append(message)
+        if message.get("body"):
+            first_event_delivered.set()
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/api/v1/jobs/x/events",
+        "query_string": b"",
+        "headers": [(b"x-iconforge-profile", b"1"), (b"x-api-key", b"secret")],
+    }
+    await ProfilingMiddleware(event_stream)(scope, receive, send)
+
+    assert [message["type"] for message in sent] == [
+        "http.response.start",
+        "http.response.body",
+        "http.response.body",
+    ]
+    profile_id = dict(sent[0]["headers"])[b"x-profile-id"].decode()
+    assert (tmp_path / f"{profile_id}.prof").exists()
+
+
+def test_profile_header_requires_valid_api_key(profiled_client):
+    client, profile_dir = profiled_client
+
+    response = client.get(
+        "/api/v1/ping", headers={"X-IconForge-Profile": "1", "X-API-Key": "wrong"}
+    )
+
+    assert response.status_code == 403
+    assert "X-Profile-ID" not in response.headers
+    assert not profile_dir.exists()
+
+
+def test_requests_without_header_are_not_profiled(profiled_client):
+    client, profile_dir = profiled_client
+
+    response = client.get("/api/v1/ping", headers={"X-API-Key": "secret"})
+
+    assert response.status_code == 200
+    assert "X-Profile-ID" not in response.headers
+
+
+def _executor_stage_marker():
+    return sum(range(100))
+
+
+def test_executor_work_is_profiled_alongside_the_loop_profiler(tmp_path):
+    # On Python 3.12+ a second cProfile cannot start while the loop's runs.
+    profile = RequestProfile()
+    assert profile.start_loop()
+    results, errors = [], []
+
+    def executor_thread():
+        try:
+            results.append(profile.call(_executor_stage_marker))
+        except Exception as exc:  # noqa: BLE001 - asserted below
+            errors.append(exc)
+
+    try:
+        thread = threading.Thread(target=executor_thread)
+        thread.start()
+        thread.join()
+    finally:
+        profile.stop_loop()
+
+    assert errors == [] and results == [4950]
+    stats = pstats.Stats(str(profile.dump(tmp_path, max_files=5)))
+    assert "_executor_stage_marker" in {name for _, _, name in stats.stats}
+
+
+def test_prune_profiles_keeps_most_recent(tmp_path):
+    for index in range(5):
+        path = tmp_path / f"{index}.prof"
+        path.write_bytes(b"x")
+        os.utime(path, (index, index))
+
+    prune_profiles(tmp_path, 2)
+
+    assert sorted(p.name for p in tmp_path.glob("*.prof")) == ["3.prof", "4.prof"]
@@ -0,0 +1,113 @@
+import math
+import threading
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import security
+from app.core.security import TokenBucketRateLimiter, enforce_rate_limit
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    limiter = TokenBucketRateLimiter(limit=3, window_seconds=60, clock=clock)
+
+    assert [limiter.allow("client") for _ in range(4)] == [True, True, True, False]
+
+    clock.now += 20  # one token refilled
+    assert limiter.allow("client")
+    assert not limiter.allow("client")
+
+
+def test_costs_consume_more_budget():
+    clock = FakeClock()
+    limiter = TokenBucketRateLimiter(limit=10, window_seconds=60, clock=clock)
+
+    assert limiter.allow("client", cost=8)
+    wait = limiter.consume("client", cost=5)
+    assert wait == pytest.approx(18.0)
+    assert limiter.allow("client", cost=2)
+    assert math.isinf(limiter.consume("other", cost=11))
+
+
+def test_clients_are_isolated():
+    clock = FakeClock()
+    limiter = TokenBucketRateLimiter(limit=1, window_seconds=60, clock=clock)
+
+    assert limiter.allow("a")
+    assert not limiter.allow("a")
+    assert limiter.allow("b")
+
+
+def test_idle_keys_are_evicted():
+    clock = FakeClock()
+    limiter = TokenBucketRateLimiter(
+        limit=2, window_seconds=60, sweep_interval_seconds=10, clock=clock
+    )
+    for index in range(100):
+        limiter.allow(f"client-{index}")
+    assert len(limiter) == 100
+
+    clock.now += 61
+    limiter.allow("fresh")
+
+    assert len(limiter) == 1
+
+
+def test_concurrent_requests_never_exceed_limit():
+    clock = FakeClock()
+    limiter = TokenBucketRateLimiter(limit=50, window_seconds=60, stripes=4, clock=clock)
+    admitted = []
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        count = 0
+        for _ in range(100):
+            if limiter.allow("shared"):
+                count += 1
+        admitted.append(count)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(admitted) == 50
+
+
+def test_enforce_rate_limit_applies_route_costs(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(security.settings, "enable_rate_limit", True)
+    monkeypatch.setattr(security.settings, "rate_limit_costs", {"/heavy": 3.0})
+    monkeypatch.setattr(
+        security, "_rate_limiter", TokenBucketRateLimiter(limit=4, window_seconds=60, clock=clock)
+    )
+
+    app = FastAPI()
+
+    @app.get(security.settings.api_prefix + "/heavy", dependencies=[Depends(enforce_rate_limit)])
+    async def heavy() -> dict[str, str]:
+        return {"ok": "heavy"}
+
+    @app.get(security.settings.api_prefix + "/light", dependencies=[Depends(enforce_rate_limit)])
+    async def light() -> dict[str, str]:
+        return {"ok": "light"}
+
+    client = TestClient(app)
+    assert client.get(security.settings.api_prefix + "/heavy").status_code == 200
+    assert client.get(security.settings.api_prefix + "/light").status_code == 200
+
+    response = client.get(security.settings.api_prefix + "/heavy")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "45"
@@ -0,0 +1,147 @@
+import asyncio
+import subprocess
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import deps
+from app.core.readiness import Readiness, WarmupStatus
+from app.main import app
+from app.services.image_processing import ImagePipeline
+
+
+def test_importing_app_does_not_load_model_runtime():
+    code = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('rembg', 'onnxruntime') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
+
+
+@pytest.mark.asyncio
+async def test_readiness_records_success_and_timing():
+    state = Readiness(started_at=time.perf_counter())
+
+    async def warm_up():
+        await asyncio.sleep(0.01)
+
+    await state.run(warm_up)
+
+    assert state.status is WarmupStatus.READY
+    assert state.warmup_seconds >= 0.01
+    assert state.startup_seconds >= state.warmup_seconds
+
+
+@pytest.mark.asyncio
+async def test_readiness_records_failure():
+    state = Readiness()
+
+    async def warm_up():
+        raise RuntimeError("model missing")
+
+    await state.run(warm_up, retry_delay=0, max_attempts=2)
+
+    assert state.status is WarmupStatus.FAILED
+    assert state.error == "RuntimeError: model missing"
+    assert state.attempts == 2
+    assert not state.ready
+
+
+@pytest.mark.asyncio
+async def test_readiness_retries_a_failed_warm_up_with_capped_backoff(monkeypatch):
+    state = Readiness()
+    delays = []
+    observed = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+        observed.append((state.status, state.ready))
+
+    monkeypatch.setattr("app.core.readiness.asyncio.sleep", fake_sleep)
+
+    async def warm_up():
+        if state.attempts < 4:
+            raise RuntimeError("model not downloaded yet")
+
+    await state.run(warm_up, retry_delay=1.0, max_retry_delay=3.0)
+
+    assert delays == [1.0, 2.0, 3.0]
+    assert observed == [(WarmupStatus.FAILED, False)] * 3
+    assert state.ready
+    assert state.error is None
+    assert state.as_dict()["attempts"] == 4
+
+
+def _client(tmp_path, monkeypatch, warm_up):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.core.config.settings.enable_background_removal", False)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    monkeypatch.setattr(pipeline, "warm_up", warm_up)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    return TestClient(app)
+
+
+def test_livez_answers_while_warm_up_is_running(tmp_path, monkeypatch):
+    started = []
+
+    def slow_warm_up():
+        started.append(True)
+        time.sleep(0.3)
+
+    try:
+        with _client(tmp_path, monkeypatch, slow_warm_up) as client:
+            assert client.get("/livez").json() == {"status": "ok"}
+            pending = client.get("/readyz")
+            assert pending.status_code == 503
+            assert pending.json()["warmup"]["status"] in ("pending", "running")
+
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                ready = client.get("/readyz")
+                if ready.status_code == 200:
+                    break
+                time.sleep(0.05)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert started == [True]
+    assert ready.status_code == 200
+    body = ready.json()
+    assert body["status"] == "ready"
+    assert body["executor"] == "ok"
+    assert body["warmup"]["warmup_seconds"] >= 0.3
+
+
+def test_readyz_reports_failed_warm_up(tmp_path, monkeypatch):
+    def broken_warm_up():
+        raise RuntimeError("no model")
+
+    try:
+        with _client(tmp_path, monkeypatch, broken_warm_up) as client:
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                body = client.get("/readyz").json()
+                if body["warmup"]["status"] == "failed":
+                    break
+                time.sleep(0.05)
+            response = client.get("/readyz")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 503
+    assert response.json()["warmup"]["error"] == "RuntimeError: no model"
+    assert client.get("/livez").status_code == 200
+
+
+def test_warm_up_skips_model_when_background_removal_is_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+
+    pipeline.warm_up()
+
+    assert pipeline._rembg_sessions == []
@@ -0,0 +1,155 @@
+import io
+import json
+import logging
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core import deps
+from app.core import logging as app_logging
+from app.core.logging import (
+    JsonFormatter,
+    RequestIdFilter,
+    configure_logging,
+    request_id_ctx_var,
+    stop_logging,
+)
+from app.core.metrics import StageTimings
+from app.main import app
+from app.services.image_processing import ImagePipeline, ResampleAlgorithm
+
+
+def create_png(size: int, color=(0, 128, 255, 255)) -> bytes:
+    image = Image.new("RGBA", (size, size), color)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client_pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.core.config.settings.enable_background_removal", False)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    yield pipeline
+    app.dependency_overrides.clear()
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    entries = {}
+    for entry in header.split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        entries[name] = float(duration)
+    return entries
+
+
+def test_stage_timings_render_server_timing_header():
+    timings = StageTimings()
+    timings.add("decode", 0.002)
+    timings.add("decode", 0.001)
+    timings.add("resize", 0.0005)
+
+    header = timings.server_timing(0.01)
+
+    assert parse_server_timing(header) == {"decode": 3.0, "resize": 0.5, "total": 10.0}
+
+
+def test_upload_response_carries_stage_breakdown(client_pipeline):
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1/materials/upload",
+            files={"file": ("source.png", create_png(64), "image/png")},
+        )
+
+    assert response.status_code == 201
+    stages = parse_server_timing(response.headers["Server-Timing"])
+    for stage in ("validate", "decode", "smart_crop", "resize", "png_encode", "disk_write", "total"):
+        assert stage in stages
+
+
+def test_preview_cache_hit_reports_cache_lookup(client_pipeline):
+    with TestClient(app) as client:
+        upload = client.post(
+            "/api/v1/materials/upload",
+            files={"file": ("source.png", create_png(64), "image/png")},
+        )
+        material_id = upload.json()["material_id"]
+        params = {"algo": ResampleAlgorithm.NEAREST.value, "size": 32}
+        client.get(f"/api/v1/materials/{material_id}/preview", params=params)
+        cached = client.get(f"/api/v1/materials/{material_id}/preview", params=params)
+
+    stages = parse_server_timing(cached.headers["Server-Timing"])
+    assert "cache_lookup" in stages
+    assert "resize" not in stages
+
+
+def test_access_log_includes_request_id_and_timings(client_pipeline, caplog):
+    # Skip the lifespan so configure_logging does not replace caplog's handler.
+    client = TestClient(app)
+    caplog.handler.addFilter(RequestIdFilter())
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        response = client.get("/api/v1/ping", headers={"X-Request-ID": "trace-me"})
+
+    assert response.status_code == 200
+    record = next(r for r in caplog.records if r.name == "app.access")
+    payload = json.loads(JsonFormatter().format(record))
+    assert payload["request_id"] == "trace-me"
+    assert payload["path"] == "/api/v1/ping"
+    assert payload["status"] == 200
+    assert "timings_ms" in payload
+    assert payload["duration_ms"] >= 0
+
+
+def test_access_log_sampling_skips_successful_requests(client_pipeline, caplog, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.access_log_sample_rate", 0.0)
+    client = TestClient(app)
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        response = client.get("/api/v1/ping")
+
+    assert response.status_code == 200
+    assert "X-Request-ID" in response.headers
+    assert not [r for r in caplog.records if r.name == "app.access"]
+
+
+@pytest.fixture
+def restore_root_logging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    stop_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_queued_logging_writes_json_from_background_thread(restore_root_logging):
+    stream = io.StringIO()
+    configure_logging(stream=stream)
+    token = request_id_ctx_var.set("queued-req")
+    try:
+        logging.getLogger("app.test").info("hello %s", "world", extra={"fields": {"n": 1}})
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            logging.getLogger("app.test").exception("failed")
+    finally:
+        request_id_ctx_var.reset(token)
+    stop_logging()
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["message"] == "hello world"
+    assert first["request_id"] == "queued-req"
+    assert first["n"] == 1
+    assert second["level"] == "ERROR"
+    assert "RuntimeError: boom" in second["exc_info"]
+
+
+def test_json_encoding_falls_back_to_stdlib(monkeypatch):
+    payload = {"message": "ünïcode", "path": Path("/tmp/x"), "n": 1.5}
+    fast = json.loads(app_logging.dumps_json(payload))
+    monkeypatch.setattr(app_logging, "orjson", None)
+
+    assert json.loads(app_logging.dumps_json(payload)) == fast
+    assert "ünïcode" in app_logging.dumps_json(payload)
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services import resampling
+from app.services.image_processing import ResampleAlgorithm, resize_image, resize_images
+
+
+def checkerboard(size: int, cell: int) -> Image.Image:
+    y, x = np.indices((size, size))
+    on = ((x // cell + y // cell) % 2).astype(bool)
+    rgba = np.zeros((size, size, 4), dtype=np.uint8)
+    rgba[on] = (255, 255, 255, 255)
+    rgba[~on] = (0, 0, 0, 255)
+    return Image.fromarray(rgba, "RGBA")
+
+
+def test_weight_matrices_are_cached_and_normalized():
+    resampling.weight_matrix.cache_clear()
+    first = resampling.weight_matrix(256, 48, "lanczos")
+    second = resampling.weight_matrix(256, 48, "lanczos")
+
+    assert first is second
+    assert first.shape == (48, 256)
+    assert not first.flags.writeable
+    assert np.allclose(first.sum(axis=1), 1.0)
+    assert resampling.weight_matrix.cache_info().hits == 1
+
+
+@pytest.mark.parametrize("kernel", ["box", "bilinear", "lanczos"])
+def test_filtering_kernels_track_pillow(kernel):
+    pillow_filter = {"box": Image.BOX, "bilinear": Image.BILINEAR, "lanczos": Image.LANCZOS}[kernel]
+    rng = np.random.default_rng(1)
+    rgba = rng.integers(0, 256, (64, 64, 4), dtype=np.uint8)
+    rgba[..., 3] = 255  # unpremultiplying amplifies rounding at low alpha
+    image = Image.fromarray(rgba, "RGBA")
+
+    ours = np.asarray(resampling.resize(image, 24, kernel)).astype(int)
+    theirs = np.asarray(image.resize((24, 24), pillow_filter)).astype(int)
+
+    assert np.abs(ours - theirs).max() <= 6
+
+
+def test_mitchell_is_softer_than_pillow_bicubic_on_edges():
+    image = checkerboard(64, 8)
+
+    mitchell = np.asarray(resampling.resize(image, 24, "mitchell"))[..., :3].astype(int)
+    bicubic = np.asarray(image.resize((24, 24), Image.BICUBIC))[..., :3].astype(int)
+
+    # Mitchell (B = C = 1/3) rings less than Pillow's Catmull-Rom style bicubic.
+    assert np.abs(mitchell - 127.5).max() <= np.abs(bicubic - 127.5).max()
+    assert np.abs(mitchell.mean() - bicubic.mean()) < 4
+
+
+def test_area_downscale_averages_exact_blocks():
+    image = checkerboard(64, 1)
+
+    area = np.asarray(resampling.resize(image, 32, "box"))
+
+    assert np.all(np.abs(area[..., :3].astype(int) - 128) <= 1)
+    assert np.all(area[..., 3] == 255)
+
+
+def test_premultiplied_resize_does_not_bleed_transparent_color():
+    image = Image.new("RGBA", (32, 32), (0, 255, 0, 0))
+    image.paste((255, 0, 0, 255), (0, 0, 16, 32))
+
+    resized = np.asarray(resampling.resize(image, 8, "lanczos"))
+    edge = resized[:, 3:5]
+
+    assert edge[..., 3].max() > 0
+    assert edge[edge[..., 3] > 0][:, 1].max() == 0  # no green from hidden pixels
+
+
+def test_majority_keeps_the_dominant_palette_color():
+    rgba = np.zeros((6, 6, 4), dtype=np.uint8)
+    rgba[...] = (10, 20, 30, 255)
+    rgba[0, 0] = (200, 0, 0, 255)
+    rgba[3:, 3:] = (0, 0, 0, 0)
+    rgba[5, 5] = (50, 50, 50, 255)
+
+    result = resampling.majority_downscale(rgba, (2, 2))
+
+    assert result.shape == (2, 2, 4)
+    assert tuple(result[0, 0]) == (10, 20, 30, 255)
+    assert tuple(result[1, 1]) == (0, 0, 0, 0)
+    colors = {tuple(pixel) for pixel in resampling.resize_array(rgba, 3, "majority").reshape(-1, 4)}
+    assert colors <= {(10, 20, 30, 255), (0, 0, 0, 0), (200, 0, 0, 255), (50, 50, 50, 255)}
+
+
+def test_resize_many_matches_single_resizes():
+    image = checkerboard(256, 3)
+
+    many = resampling.resize_many(image, (48, 32, 16), "mitchell")
+
+    for size in (48, 32, 16):
+        assert many[size].size == (size, size)
+        assert many[size].tobytes() == resampling.resize(image, size, "mitchell").tobytes()
+
+
+@pytest.mark.parametrize("kernel", ["bilinear", "lanczos", "nearest", "majority"])
+def test_resize_batch_matches_resizing_one_material_at_a_time(kernel):
+    # Two equal-sized frames are stacked; the odd one out goes alone.
+    images = [checkerboard(64, 2), checkerboard(48, 3), checkerboard(64, 4)]
+
+    batches = resampling.resize_batch(images, (16, 8), kernel)
+
+    assert [sorted(batch) for batch in batches] == [[8, 16]] * 3
+    for image, batch in zip(images, batches):
+        for size in (16, 8):
+            assert batch[size].tobytes() == resampling.resize(image, size, kernel).tobytes()
+
+
+def test_resize_batch_stacks_equal_sized_frames(monkeypatch):
+    calls = []
+    original = resampling._resize_premultiplied
+
+    def spy(premultiplied, size, kernel):
+        calls.append(premultiplied.shape)
+        return original(premultiplied, size, kernel)
+
+    monkeypatch.setattr(resampling, "_resize_premultiplied", spy)
+
+    resampling.resize_batch([checkerboard(64, 2)] * 3, (16,), "bilinear")
+
+    assert calls == [(3, 64, 64, 4)]
+
+
+@pytest.mark.parametrize("algo", list(ResampleAlgorithm))
+def test_every_algorithm_resizes_through_the_pipeline_helpers(algo):
+    image = checkerboard(256, 8)
+
+    resized = resize_images(image, (48, 32), algo)
+
+    assert {size: frame.size for size, frame in resized.items()} == {48: (48, 48), 32: (32, 32)}
+    assert resize_image(image, 32, algo).tobytes() == resized[32].tobytes()
@@ -0,0 +1,129 @@
+import asyncio
+import io
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core import deps
+from app.main import app
+from app.services import executor as executor_module
+from app.services.executor import Lane, OverloadedError, StageScheduler, run_stage
+from app.services.image_processing import ImagePipeline
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scheduler = StageScheduler(heavy_concurrency=1, heavy_max_queue=1, interactive_concurrency=2)
+    monkeypatch.setattr(executor_module, "get_scheduler", lambda: scheduler)
+    yield scheduler
+    scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_heavy_admission_sheds_when_queue_is_full(scheduler):
+    release = asyncio.Event()
+
+    async def hold():
+        async with scheduler.admit(Lane.HEAVY):
+            await release.wait()
+
+    running = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert scheduler.heavy_waiting == 1
+
+    with pytest.raises(OverloadedError) as excinfo:
+        async with scheduler.admit(Lane.HEAVY):
+            pass
+    assert excinfo.value.retry_after == scheduler.retry_after_seconds
+
+    release.set()
+    await asyncio.gather(running, waiting)
+    assert scheduler.heavy_waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_unshed_admission_waits_for_slot(scheduler):
+    order = []
+    release = asyncio.Event()
+
+    async def hold():
+        async with scheduler.admit(Lane.HEAVY):
+            order.append("first")
+            await release.wait()
+
+    async def queued(name):
+        async with scheduler.admit(Lane.HEAVY, shed=False):
+            order.append(name)
+
+    tasks = [asyncio.create_task(hold())]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(queued(f"job-{index}")) for index in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert order == ["first", "job-0", "job-1", "job-2"]
+
+
+@pytest.mark.asyncio
+async def test_stages_run_on_the_admitted_lane(scheduler):
+    async with scheduler.admit(Lane.HEAVY):
+        heavy_thread = await run_stage("decode", lambda: threading.current_thread().name)
+    interactive_thread = await run_stage("resize", lambda: threading.current_thread().name)
+
+    assert heavy_thread.startswith("iconforge-heavy")
+    assert interactive_thread.startswith("iconforge-interactive")
+
+
+@pytest.mark.asyncio
+async def test_interactive_work_is_not_starved_by_heavy_work(scheduler):
+    async def upload():
+        async with scheduler.admit(Lane.HEAVY, shed=False):
+            await run_stage("rembg", time.sleep, 0.3)
+
+    uploads = [asyncio.create_task(upload()) for _ in range(3)]
+    await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    await run_stage("resize", lambda: None)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.1
+    await asyncio.gather(*uploads)
+
+
+def test_overloaded_upload_returns_503_with_retry_after(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.core.config.settings.enable_background_removal", False)
+
+    class BusyScheduler:
+        @asynccontextmanager
+        async def admit(self, lane, shed=True):
+            raise OverloadedError("Server is busy processing uploads.", retry_after=7)
+            yield
+
+    monkeypatch.setattr(
+        "app.api.v1.endpoints.materials.get_scheduler", lambda: BusyScheduler()
+    )
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    buffer = io.BytesIO()
+    Image.new("RGBA", (8, 8), (1, 2, 3, 255)).save(buffer, format="PNG")
+
+    try:
+        response = TestClient(app).post(
+            "/api/v1/materials/upload",
+            files={"file": ("busy.png", buffer.getvalue(), "image/png")},
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    assert response.json()["title"] == "Service Unavailable"
@@ -0,0 +1,140 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.core.memory import parse_smaps_rollup, read_process_memory
+
+SMAPS_ROLLUP = """\
+5560faef7000-7ffddaab1000 ---p 00000000 00:00 0                          [rollup]
+Rss:                1304 kB
+Pss:                 406 kB
+Shared_Clean:       1148 kB
+Shared_Dirty:          0 kB
+Private_Clean:        52 kB
+Private_Dirty:       104 kB
+"""
+
+linux_only = pytest.mark.skipif(
+    not Path("/proc/self/smaps_rollup").exists() or not hasattr(os, "fork"),
+    reason="requires Linux /proc smaps_rollup and fork",
+)
+
+
+def test_parse_smaps_rollup_splits_shared_and_unique():
+    usage = parse_smaps_rollup(42, SMAPS_ROLLUP)
+
+    assert usage.pid == 42
+    assert usage.rss == 1304 * 1024
+    assert usage.pss == 406 * 1024
+    assert usage.shared == 1148 * 1024
+    assert usage.unique == 156 * 1024
+
+
+def test_read_process_memory_of_missing_process_is_none():
+    assert read_process_memory(2**22 + 1) is None
+
+
+@linux_only
+def test_read_process_memory_of_current_process():
+    usage = read_process_memory()
+
+    assert usage is not None
+    assert usage.pid == os.getpid()
+    assert 0 < usage.unique <= usage.rss
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@linux_only
+def test_prefork_launcher_serves_and_reports_worker_memory(tmp_path):
+    port = _free_port()
+    env = {
+        **os.environ,
+        "ICONFORGE_ENABLE_BACKGROUND_REMOVAL": "false",
+        "ICONFORGE_TEMP_DIR": str(tmp_path),
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "app.server",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", "2", "--memory-report-interval", "0",
+        ],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    try:
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/readyz").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            assert time.monotonic() < deadline, "launcher did not become ready"
+            time.sleep(0.1)
+        process.send_signal(signal.SIGUSR1)
+        time.sleep(0.5)
+        process.send_signal(signal.SIGTERM)
+        output, _ = process.communicate(timeout=20)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.communicate()
+
+    assert process.returncode == 0
+    records = [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+    workers = [record for record in records if record.get("role") == "worker"]
+    assert len({record["pid"] for record in workers}) == 2
+    assert all(record["unique"] > 0 and record["shared"] > 0 for record in workers)
+    assert any(record["message"].startswith("Preloaded application") for record in records)
+
+
+def test_onnx_threads_are_rejected_only_for_several_workers(monkeypatch):
+    from app.server import check_onnx_threads
+
+    monkeypatch.setattr("app.server.settings.enable_background_removal", True)
+    monkeypatch.setattr("app.server.settings.onnx_intra_op_threads", 4)
+
+    assert check_onnx_threads(1) is None
+    assert "cannot be combined with 2 pre-forked workers" in check_onnx_threads(2)
+    monkeypatch.setattr("app.server.settings.onnx_intra_op_threads", 1)
+    assert check_onnx_threads(8) is None
+
+
+def test_preload_forces_single_threaded_sessions_only_for_several_workers(monkeypatch):
+    from app import server
+    from app.services import image_processing
+
+    loaded = []
+    monkeypatch.setattr("app.server.settings.enable_background_removal", True)
+    monkeypatch.setattr("app.server.settings.onnx_intra_op_threads", None)
+    monkeypatch.setattr(
+        image_processing.ImagePipeline,
+        "warm_up",
+        lambda self: loaded.append(self.background_removal_enabled),
+    )
+    monkeypatch.setattr(server.gc, "freeze", lambda: None)
+    monkeypatch.delenv("OMP_NUM_THREADS", raising=False)
+
+    server.preload(1)
+    assert "OMP_NUM_THREADS" not in os.environ
+    assert loaded == [False]  # the single worker loads the model after fork
+
+    server.preload(4)
+    assert os.environ["OMP_NUM_THREADS"] == "1"
+    assert server.settings.onnx_intra_op_threads == 1
+    assert loaded == [False, True]
@@ -0,0 +1,313 @@
+import io
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from app.services.image_processing import (
+    ImagePipeline,
+    MaterialNotFoundError,
+    ResampleAlgorithm,
+)
+from app.services.state import (
+    MaterialRecord,
+    MemoryStateBackend,
+    RedisStateBackend,
+    SQLiteStateBackend,
+)
+
+
+class FakeRedis:
+    """Tiny in-process stand-in for the subset of Redis the backend uses."""
+
+    def __init__(self):
+        self.strings: dict[str, bytes] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.sets: dict[str, set[bytes]] = {}
+        self.expiry: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, name):
+        if self.expiry.get(name, float("inf")) <= time.time():
+            self.strings.pop(name, None)
+        return self.strings.get(name)
+
+    def set(self, name, value, nx=False, ex=None):
+        with self._lock:
+            if nx and name in self.strings:
+                return None
+            self.strings[name] = self._bytes(value)
+            if ex is None:
+                self.expiry.pop(name, None)
+            else:
+                self.expiry[name] = time.time() + ex
+            return True
+
+    def delete(self, *names):
+        removed = 0
+        for name in names:
+            for store in (self.strings, self.zsets, self.sets):
+                if store.pop(name, None) is not None:
+                    removed += 1
+        return removed
+
+    def zadd(self, name, mapping, xx=False, gt=False):
+        zset = self.zsets.setdefault(name, {})
+        for member, score in mapping.items():
+            if xx and member not in zset:
+                continue
+            if gt and member in zset and score <= zset[member]:
+                continue
+            zset[member] = float(score)
+
+    def zscore(self, name, member):
+        return self.zsets.get(name, {}).get(member)
+
+    def zrem(self, name, member):
+        with self._lock:
+            return 1 if self.zsets.get(name, {}).pop(member, None) is not None else 0
+
+    def zrangebyscore(self, name, minimum, maximum):
+        assert minimum == "-inf" and maximum.startswith("(")
+        cutoff = float(maximum[1:])
+        members = self.zsets.get(name, {})
+        return [m.encode() for m, score in sorted(members.items(), key=lambda i: i[1]) if score < cutoff]
+
+    def zrange(self, name, start, end):
+        members = self.zsets.get(name, {})
+        return [m.encode() for m, _ in sorted(members.items(), key=lambda i: i[1])]
+
+    def zcard(self, name):
+        return len(self.zsets.get(name, {}))
+
+    def sadd(self, name, value):
+        self.sets.setdefault(name, set()).add(self._bytes(value))
+
+    def smembers(self, name):
+        return set(self.sets.get(name, set()))
+
+    def register_script(self, source):
+        # No Lua here: run a Python equivalent of each backend script atomically.
+        scripts = {
+            RedisStateBackend.SET_OWNED_SCRIPT: self._set_owned,
+            RedisStateBackend.POP_SCRIPT: self._pop,
+        }
+        run = scripts[source]
+
+        def script(keys, args):
+            with self._lock:
+                return run(keys, args)
+
+        return script
+
+    def _set_owned(self, keys, args):
+        materials, cache_key, owned = keys
+        owner, data = args
+        if self.zscore(materials, owner) is None:
+            return 0
+        self.strings[cache_key] = self._bytes(data)
+        self.sadd(owned, cache_key)
+        return 1
+
+    def _pop(self, keys, args):
+        materials, material_key, owned = keys
+        score = self.zsets.get(materials, {}).pop(args[0], None)
+        if score is None:
+            return None
+        record = self.strings.get(material_key) or b""
+        self.delete(material_key, owned, *(key.decode() for key in self.smembers(owned)))
+        return [record, str(score).encode()]
+
+
+def make_record(material_id: str, last_access: float = 100.0) -> MaterialRecord:
+    return MaterialRecord(
+        material_id=material_id,
+        original_path=Path(f"/tmp/{material_id}/source.png"),
+        processed_path=Path(f"/tmp/{material_id}/processed_256.png"),
+        width=256,
+        height=256,
+        crop_box=(1, 2, 3, 4),
+        padding=2,
+        created_at=last_access,
+        last_access=last_access,
+    )
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryStateBackend()
+    elif request.param == "sqlite":
+        backend = SQLiteStateBackend(tmp_path / "state.sqlite3")
+        yield backend
+        backend.close()
+    else:
+        yield RedisStateBackend(FakeRedis())
+
+
+def create_png(size: int, color=(10, 200, 30, 255)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGBA", (size, size), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_backend_round_trips_records(backend):
+    backend.put_material(make_record("a"))
+    backend.touch_material("a", 150.0)
+
+    record = backend.get_material("a")
+
+    assert record.crop_box == (1, 2, 3, 4)
+    assert record.processed_path == Path("/tmp/a/processed_256.png")
+    assert record.last_access == 150.0
+    assert "a" in backend.materials
+    assert len(backend.materials) == 1
+    assert backend.get_material("missing") is None
+
+
+def test_backend_pop_purges_owned_cache_once(backend):
+    backend.put_material(make_record("a"))
+    backend.set_cache("preview", "a:NEAREST:32", b"owned", owner="a")
+    backend.set_cache("job", "unowned", b"kept")
+
+    assert backend.pop_material("a").material_id == "a"
+    assert backend.pop_material("a") is None
+    assert backend.get_cache("preview", "a:NEAREST:32") is None
+    assert backend.get_cache("job", "unowned") == b"kept"
+
+
+def test_backend_drops_cache_writes_for_popped_owners(backend):
+    backend.put_material(make_record("a"))
+    assert backend.pop_material("a") is not None
+
+    # A render that started before the pop finishes afterwards.
+    backend.set_cache("preview", "a:NEAREST:32", b"late", owner="a")
+
+    assert backend.get_cache("preview", "a:NEAREST:32") is None
+    if isinstance(backend, RedisStateBackend):
+        assert backend.client.strings == {}
+        assert backend.client.sets == {}
+
+
+def test_backend_expires_cache_entries_written_with_a_ttl(backend, monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr("app.services.state.time.time", lambda: clock["now"])
+    monkeypatch.setattr(time, "time", lambda: clock["now"])  # FakeRedis' clock
+    backend.set_cache("job", "old", b"queued", ttl=60)
+    backend.set_cache("job", "kept", b"forever")
+
+    clock["now"] = 1030.0
+    assert backend.get_cache("job", "old") == b"queued"
+    clock["now"] = 1061.0
+    backend.set_cache("job", "new", b"queued", ttl=60)
+
+    assert backend.get_cache("job", "old") is None
+    assert backend.get_cache("job", "new") == b"queued"
+    assert backend.get_cache("job", "kept") == b"forever"
+    if isinstance(backend, SQLiteStateBackend):
+        # Expired rows are deleted, not just hidden.
+        rows = backend._connection().execute("SELECT key FROM cache").fetchall()
+        assert sorted(row[0] for row in rows) == ["kept", "new"]
+
+
+def test_backend_lists_expired_materials(backend):
+    backend.put_material(make_record("old", last_access=10.0))
+    backend.put_material(make_record("new", last_access=500.0))
+
+    assert backend.expired_material_ids(cutoff=100.0) == ["old"]
+
+
+def test_sqlite_eviction_lock_is_exclusive(tmp_path):
+    first = SQLiteStateBackend(tmp_path / "state.sqlite3")
+    second = SQLiteStateBackend(tmp_path / "state.sqlite3")
+
+    with first.eviction_lock() as acquired:
+        assert acquired
+        with second.eviction_lock() as contended:
+            assert not contended
+    with second.eviction_lock() as acquired:
+        assert acquired
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def worker_pair(request, tmp_path, monkeypatch):
+    """Two pipelines standing in for two uvicorn workers sharing one store."""
+
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    if request.param == "sqlite":
+        states = [SQLiteStateBackend(tmp_path / "state.sqlite3") for _ in range(2)]
+    else:
+        server = FakeRedis()
+        states = [RedisStateBackend(server) for _ in range(2)]
+    return [ImagePipeline(background_removal_enabled=False, state=state) for state in states]
+
+
+@pytest.mark.asyncio
+async def test_material_uploaded_on_one_worker_is_served_by_another(worker_pair):
+    first, second = worker_pair
+
+    record = await first.process_upload(create_png(64), "shared.png")
+
+    preview = await second.get_preview_bytes(record.material_id, ResampleAlgorithm.NEAREST, 32)
+    assert preview == await first.get_preview_bytes(record.material_id, ResampleAlgorithm.NEAREST, 32)
+    assert (await second.get_material(record.material_id)).crop_box == record.crop_box
+
+    ico = await second.forge_icon(record.material_id, ResampleAlgorithm.NEAREST, create_png(16))
+    assert ico[:4] == b"\x00\x00\x01\x00"
+
+
+@pytest.mark.asyncio
+async def test_eviction_on_one_worker_is_seen_by_another(worker_pair, tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.material_ttl_seconds", 1)
+    clock = {"now": 1000.0}
+    monkeypatch.setattr("app.services.image_processing.time.time", lambda: clock["now"])
+    first, second = worker_pair
+
+    record = await first.process_upload(create_png(32), "expiring.png")
+    await first.get_preview_bytes(record.material_id, ResampleAlgorithm.LANCZOS, 32)
+
+    clock["now"] = 1005.0
+    second._evict_expired()
+
+    assert not (tmp_path / record.material_id).exists()
+    with pytest.raises(MaterialNotFoundError):
+        await first.get_preview_bytes(record.material_id, ResampleAlgorithm.LANCZOS, 32)
+    assert first.preview_cache == {}
+
+
+@pytest.mark.asyncio
+async def test_material_reads_stay_off_the_loop_and_throttle_shared_touches(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.services.image_processing.settings.material_ttl_seconds", 100)
+    clock = {"now": 1000.0}
+    monkeypatch.setattr("app.services.image_processing.time.time", lambda: clock["now"])
+    state = SQLiteStateBackend(tmp_path / "state.sqlite3")
+    pipeline = ImagePipeline(background_removal_enabled=False, state=state)
+    record = await pipeline.process_upload(create_png(32), "shared.png")
+
+    loop_thread = threading.get_ident()
+    touches = []
+    touch = state.touch_material
+
+    def spy(material_id, timestamp):
+        touches.append((timestamp, threading.get_ident() != loop_thread))
+        touch(material_id, timestamp)
+
+    monkeypatch.setattr(state, "touch_material", spy)
+
+    clock["now"] = 1001.0
+    await pipeline.get_material(record.material_id)
+    clock["now"] = 1010.0  # 5% of the TTL has passed since upload
+    await pipeline.get_material(record.material_id)
+
+    assert touches == [(1010.0, True)]
+    assert state.get_material(record.material_id).last_access == 1010.0
+    state.close()
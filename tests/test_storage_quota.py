@@ -0,0 +1,127 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core import deps
+from app.main import app
+from app.services.image_processing import ImagePipeline, MaterialNotFoundError
+from app.services.state import MaterialRecord
+from app.services.storage import StorageManager, StorageQuotaExceededError
+
+
+def create_png(color) -> bytes:
+    image = Image.new("RGBA", (64, 64), (0, 0, 0, 0))
+    image.paste(color, (8, 8, 56, 56))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def record(material_id: str, size_bytes: int, last_access: float) -> MaterialRecord:
+    return MaterialRecord(
+        material_id=material_id,
+        original_path=None,
+        processed_path=None,
+        width=256,
+        height=256,
+        crop_box=(0, 0, 1, 1),
+        padding=2,
+        created_at=0.0,
+        last_access=last_access,
+        size_bytes=size_bytes,
+    )
+
+
+def test_reserve_evicts_least_recently_used_unpinned_materials():
+    manager = StorageManager(quota_bytes=100)
+    records = [record("old", 40, 1.0), record("pinned", 40, 2.0), record("new", 20, 3.0)]
+
+    with manager.pin("pinned"):
+        victims = manager.reserve(records, 30)
+
+    assert victims == ["old"]
+    assert manager.usage(records).reserved_bytes == 30
+    manager.release(30)
+    assert manager.usage(records).reserved_bytes == 0
+
+
+def test_reserve_rejects_when_only_pinned_materials_remain():
+    manager = StorageManager(quota_bytes=100)
+    records = [record("a", 50, 1.0), record("b", 50, 2.0)]
+
+    with manager.pin("a"), manager.pin("b"):
+        with pytest.raises(StorageQuotaExceededError):
+            manager.reserve(records, 10)
+    with pytest.raises(StorageQuotaExceededError):
+        manager.reserve([], 101)
+
+
+@pytest.mark.asyncio
+async def test_uploads_evict_least_recently_used_material(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+
+    first = await pipeline.process_upload(create_png((255, 0, 0, 255)), "a.png")
+    assert first.size_bytes > 256 * 256 * 4
+    pipeline.storage.quota_bytes = int(first.size_bytes * 2.5)
+    second = await pipeline.process_upload(create_png((0, 255, 0, 255)), "b.png")
+    await pipeline.get_material(first.material_id)  # first is now the most recent
+
+    third = await pipeline.process_upload(create_png((0, 0, 255, 255)), "c.png")
+
+    with pytest.raises(MaterialNotFoundError):
+        await pipeline.get_material(second.material_id)
+    assert not second.processed_path.parent.exists()
+    assert (await pipeline.get_material(first.material_id)).material_id == first.material_id
+    usage = pipeline.storage_usage()
+    assert usage.materials == 2
+    assert usage.used_bytes == first.size_bytes + third.size_bytes
+    assert usage.used_bytes <= usage.quota_bytes
+
+
+@pytest.mark.asyncio
+async def test_in_use_materials_are_not_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    first = await pipeline.process_upload(create_png((255, 0, 0, 255)), "a.png")
+    pipeline.storage.quota_bytes = int(first.size_bytes * 1.5)
+
+    with pipeline.storage.pin(first.material_id):
+        with pytest.raises(StorageQuotaExceededError):
+            await pipeline.process_upload(create_png((0, 255, 0, 255)), "b.png")
+
+    assert first.processed_path.exists()
+    assert [path.name for path in tmp_path.iterdir() if path.name != "blobs"] == [
+        first.material_id
+    ]
+
+
+def test_storage_endpoint_reports_usage(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.services.image_processing.settings.storage_quota_bytes", 10_000_000)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    client = TestClient(app)
+    try:
+        upload = client.post(
+            "/api/v1/materials/upload",
+            files={"file": ("a.png", create_png((9, 9, 9, 255)), "image/png")},
+        )
+        usage = client.get("/api/v1/storage").json()
+        pipeline.storage.quota_bytes = 10
+        rejected = client.post(
+            "/api/v1/materials/upload",
+            files={"file": ("b.png", create_png((1, 1, 1, 255)), "image/png")},
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert upload.status_code == 201
+    assert usage["materials"] == 1
+    assert 0 < usage["used_bytes"] == 10_000_000 - usage["available_bytes"]
+    assert usage["quota_bytes"] == 10_000_000
+    assert usage["pinned_materials"] == 0
+    assert rejected.status_code == 507
+    assert rejected.json()["title"] == "Insufficient Storage"
@@ -0,0 +1,162 @@
+import asyncio
+import io
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core import deps
+from app.main import app
+from app.services.image_processing import ImagePipeline
+from app.services.jobs import JobManager, JobQueueFullError
+
+
+def create_png(size: int, color=(200, 20, 90, 255)) -> bytes:
+    image = Image.new("RGBA", (size, size), color)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def job_client(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    monkeypatch.setattr("app.core.config.settings.enable_background_removal", False)
+    monkeypatch.setattr("app.core.config.settings.job_poll_interval_seconds", 0.05)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    manager = JobManager(workers=1, max_queue=10, ttl_seconds=60)
+    app.dependency_overrides[deps.get_image_pipeline] = lambda: pipeline
+    app.dependency_overrides[deps.get_job_manager] = lambda: manager
+    with TestClient(app) as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+def wait_for_job(client: TestClient, location: str) -> dict:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        payload = client.get(location).json()
+        if payload["status"] in {"succeeded", "failed"}:
+            return payload
+        time.sleep(0.02)
+    raise AssertionError("job did not finish")
+
+
+def test_async_upload_returns_202_and_completes(job_client):
+    response = job_client.post(
+        "/api/v1/materials/upload",
+        params={"mode": "async"},
+        files={"file": ("source.png", create_png(64), "image/png")},
+    )
+
+    assert response.status_code == 202
+    body = response.json()
+    assert body["status"] in {"queued", "running"}
+    assert response.headers["Location"] == f"/api/v1/jobs/{body['job_id']}"
+
+    result = wait_for_job(job_client, response.headers["Location"])
+
+    assert result["status"] == "succeeded"
+    assert result["progress"] == 1.0
+    material = result["material"]
+    assert material["width"] == 256
+    assert material["image_base64"].startswith("data:image/png;base64,")
+    assert job_client.get(f"/api/v1/materials/{material['material_id']}").status_code == 200
+
+
+def test_async_upload_reports_validation_failure(job_client):
+    response = job_client.post(
+        "/api/v1/materials/upload",
+        params={"mode": "async"},
+        files={"file": ("fake.png", b"not an image", "image/png")},
+    )
+
+    result = wait_for_job(job_client, response.headers["Location"])
+
+    assert result["status"] == "failed"
+    assert "valid image" in result["error"]
+    assert result["material"] is None
+
+
+def test_job_events_stream_progress_until_done(job_client):
+    response = job_client.post(
+        "/api/v1/materials/upload",
+        params={"mode": "async"},
+        files={"file": ("source.png", create_png(48), "image/png")},
+    )
+    job_id = response.json()["job_id"]
+
+    with job_client.stream("GET", f"/api/v1/jobs/{job_id}/events") as stream:
+        assert stream.headers["content-type"].startswith("text/event-stream")
+        events = [
+            json.loads(line[len("data: ") :])
+            for line in stream.iter_lines()
+            if line.startswith("data: ")
+        ]
+
+    assert events[-1]["status"] == "succeeded"
+    assert events[-1]["material"]["material_id"]
+    progress = [event["progress"] for event in events]
+    assert progress == sorted(progress)
+
+
+def test_unknown_job_returns_404(job_client):
+    assert job_client.get("/api/v1/jobs/missing").status_code == 404
+    assert job_client.get("/api/v1/jobs/missing/events").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_new_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    manager = JobManager(workers=0, max_queue=1, ttl_seconds=60)
+
+    job = await manager.submit(pipeline, create_png(8), "one.png")
+    with pytest.raises(JobQueueFullError):
+        await manager.submit(pipeline, create_png(8), "two.png")
+
+    assert manager.get(pipeline, job.job_id).status.value == "queued"
+    await manager.shutdown()
+
+    # A job that never ran is not left claiming to be queued.
+    abandoned = manager.get(pipeline, job.job_id)
+    assert abandoned.status.value == "failed"
+    assert "shut down" in abandoned.error
+
+
+@pytest.mark.asyncio
+async def test_job_snapshots_expire_without_their_manager(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    clock = {"now": 1000.0}
+    monkeypatch.setattr("app.services.state.time.time", lambda: clock["now"])
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    manager = JobManager(workers=0, max_queue=1, ttl_seconds=60)
+    job = await manager.submit(pipeline, create_png(8), "one.png")
+
+    clock["now"] = 1061.0  # the submitting process never runs another submit
+
+    assert manager.get(pipeline, job.job_id) is None
+
+
+@pytest.mark.asyncio
+async def test_shutdown_fails_jobs_cancelled_mid_run(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.image_processing.settings.temp_dir", tmp_path)
+    pipeline = ImagePipeline(background_removal_enabled=False)
+    started = asyncio.Event()
+
+    async def stuck_upload(content, filename, progress=None):
+        progress("decode")
+        started.set()
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(pipeline, "process_upload", stuck_upload)
+    manager = JobManager(workers=1, max_queue=1, ttl_seconds=60)
+    job = await manager.submit(pipeline, create_png(8), "stuck.png")
+    await asyncio.wait_for(started.wait(), timeout=2)
+    assert manager.get(pipeline, job.job_id).status.value == "running"
+
+    await manager.shutdown()
+
+    assert manager.get(pipeline, job.job_id).status.value == "failed"